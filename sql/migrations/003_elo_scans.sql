@@ -0,0 +1,26 @@
+-- 003_elo_scans.sql
+--
+-- One row per elo_check run, for ELO_HISTORY_MODE=changes.
+--
+-- In change-only mode a player whose standing did not move gets no elo_history
+-- row, so "the two most recent rows" no longer means "this scan and the one
+-- before". elo_tracker instead treats a player as scanned this run only when
+-- their newest row carries the newest scanned_at here; everyone else is
+-- unchanged by definition. Without this table a quiet hour (nothing written at
+-- all) would leave the previous scan looking current and its changes would be
+-- posted again.
+--
+-- elo_check.py records every run in both modes, so switching modes later needs
+-- nothing further.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.elo_scans (
+    scanned_at   TIMESTAMP PRIMARY KEY,
+    rows_scanned INTEGER NOT NULL,   -- ranked (player, queue) rows Riot returned
+    rows_written INTEGER NOT NULL    -- of those, how many reached elo_history
+);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- 004_player_scan_state.sql
+--
+-- When each player was last scanned, for SCAN_SCHEDULE=adaptive.
+--
+-- elo_history cannot answer this on its own: in change-only mode (003) a scan
+-- that found nothing new writes no row, and an unranked player never has one.
+-- scan_scheduler.py reads activity from elo_history and the last scan from here,
+-- and backs idle players off to every 6/12/24 hours.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.player_scan_state (
+    player_key      INTEGER PRIMARY KEY REFERENCES public.players (id) ON DELETE CASCADE,
+    last_scanned_at TIMESTAMP NOT NULL
+);
+
+COMMIT;
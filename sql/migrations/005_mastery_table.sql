@@ -0,0 +1,27 @@
+-- 005_mastery_table.sql
+--
+-- Creates public.mastery up front.
+--
+-- mastery.py used to let DataFrame.to_sql(if_exists='replace') drop and
+-- recreate the table on every run. It now bulk-loads with COPY into a table
+-- that has to exist already. The column names and types are exactly what
+-- to_sql produced, so an existing table is left as it is.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.mastery (
+    "puuid"                        TEXT,
+    "championId"                   BIGINT,
+    "championLevel"                BIGINT,
+    "championPoints"               BIGINT,
+    "lastPlayTime"                 TIMESTAMP,
+    "championPointsSinceLastLevel" BIGINT,
+    "championPointsUntilNextLevel" BIGINT,
+    "markRequiredForNextLevel"     BIGINT,
+    "tokensEarned"                 BIGINT,
+    "championSeasonMilestone"      BIGINT
+);
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- 006_elo_history_covering_index.sql
+--
+-- Lets "a series' latest rows" be answered from the index alone.
+--
+-- elo_tracker and elo_check used to rank every elo_history row with
+-- ROW_NUMBER() and throw all but the newest one or two away, so each run read
+-- all of history. They now read current_standings (007, see standings.py),
+-- which a trigger keeps up to date, and touch history not at all. This index
+-- serves what still probes history per player and queue: the trigger's
+-- rebuild_current_standings(), and scan_scheduler's last row before its
+-- activity window. Each costs an index probe per series, whatever the size of
+-- the table.
+--
+-- 001 already created (player_key, queue_type, timestamp DESC). This replaces
+-- it with the same key plus the standing columns in INCLUDE, so those probes
+-- never have to visit the heap. Built CONCURRENTLY so elo_check can keep
+-- writing -- which is also why there is no BEGIN/COMMIT: CREATE INDEX
+-- CONCURRENTLY refuses to run inside a transaction.
+--
+-- Safe to re-run. If a concurrent build is interrupted it leaves an INVALID
+-- index behind; drop idx_elo_history_latest and run this again.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_elo_history_latest
+    ON public.elo_history (player_key, queue_type, timestamp DESC)
+    INCLUDE (tier, rank, league_points, wins, losses);
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_elo_history_player_queue_ts;
+
+ANALYZE public.elo_history;
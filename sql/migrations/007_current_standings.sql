@@ -0,0 +1,133 @@
+-- 007_current_standings.sql
+--
+-- Keeps each player's latest and previous elo_history row per queue in one
+-- small table, so elo_tracker and elo_check read O(players) rows instead of
+-- finding them in history on every run.
+--
+-- Maintained by a trigger on elo_history rather than by elo_check itself, so
+-- every writer -- elo_check's COPY, a manual INSERT, a backfill -- keeps it in
+-- step without knowing it exists. Row triggers fire for COPY too.
+--
+-- The trigger only sees inserts. After deleting or rewriting history by hand
+-- (as 002 does when merging players), run
+--     SELECT public.rebuild_current_standings();
+-- to rebuild the table from elo_history.
+--
+-- Safe to re-run: the table is rebuilt from history every time.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.current_standings (
+    player_key          INTEGER   NOT NULL REFERENCES public.players (id) ON DELETE CASCADE,
+    queue_type          TEXT      NOT NULL,
+    tier                TEXT,
+    rank                TEXT,
+    league_points       INTEGER,
+    wins                INTEGER,
+    losses              INTEGER,
+    timestamp           TIMESTAMP NOT NULL,
+    -- The row before it; all NULL until a second row arrives.
+    prev_tier           TEXT,
+    prev_rank           TEXT,
+    prev_league_points  INTEGER,
+    prev_wins           INTEGER,
+    prev_losses         INTEGER,
+    prev_timestamp      TIMESTAMP,
+    PRIMARY KEY (player_key, queue_type)
+);
+
+
+CREATE OR REPLACE FUNCTION public.track_current_standing()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Newer than the latest row: it becomes the latest, the latest the previous.
+    INSERT INTO public.current_standings AS cs (
+        player_key, queue_type, tier, rank, league_points, wins, losses, timestamp
+    )
+    VALUES (
+        NEW.player_key, NEW.queue_type, NEW.tier, NEW.rank,
+        NEW.league_points, NEW.wins, NEW.losses, NEW.timestamp
+    )
+    ON CONFLICT (player_key, queue_type) DO UPDATE SET
+        prev_tier          = cs.tier,
+        prev_rank          = cs.rank,
+        prev_league_points = cs.league_points,
+        prev_wins          = cs.wins,
+        prev_losses        = cs.losses,
+        prev_timestamp     = cs.timestamp,
+        tier               = EXCLUDED.tier,
+        rank               = EXCLUDED.rank,
+        league_points      = EXCLUDED.league_points,
+        wins               = EXCLUDED.wins,
+        losses             = EXCLUDED.losses,
+        timestamp          = EXCLUDED.timestamp
+    WHERE EXCLUDED.timestamp > cs.timestamp;
+
+    -- Older than the latest but newer than the previous (a late backfill):
+    -- it only displaces the previous row. Anything older changes neither.
+    UPDATE public.current_standings
+    SET prev_tier          = NEW.tier,
+        prev_rank          = NEW.rank,
+        prev_league_points = NEW.league_points,
+        prev_wins          = NEW.wins,
+        prev_losses        = NEW.losses,
+        prev_timestamp     = NEW.timestamp
+    WHERE player_key = NEW.player_key
+      AND queue_type = NEW.queue_type
+      AND NEW.timestamp < timestamp
+      AND (prev_timestamp IS NULL OR NEW.timestamp > prev_timestamp);
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS elo_history_current_standings ON public.elo_history;
+CREATE TRIGGER elo_history_current_standings
+    AFTER INSERT ON public.elo_history
+    FOR EACH ROW
+    WHEN (NEW.player_key IS NOT NULL)
+    EXECUTE FUNCTION public.track_current_standing();
+
+
+-- Rebuild from history: the newest two rows per player and queue, found
+-- through 006's index rather than by ranking the whole table.
+CREATE OR REPLACE FUNCTION public.rebuild_current_standings()
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    DELETE FROM public.current_standings;
+
+    INSERT INTO public.current_standings (
+        player_key, queue_type, tier, rank, league_points, wins, losses, timestamp,
+        prev_tier, prev_rank, prev_league_points, prev_wins, prev_losses, prev_timestamp
+    )
+    SELECT
+        p.id, q.queue_type,
+        latest.tier, latest.rank, latest.league_points,
+        latest.wins, latest.losses, latest.timestamp,
+        prev.tier, prev.rank, prev.league_points,
+        prev.wins, prev.losses, prev.timestamp
+    FROM public.players p
+    CROSS JOIN (SELECT DISTINCT queue_type FROM public.elo_history) q
+    CROSS JOIN LATERAL (
+        SELECT tier, rank, league_points, wins, losses, timestamp
+        FROM public.elo_history
+        WHERE player_key = p.id AND queue_type = q.queue_type
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ) latest
+    LEFT JOIN LATERAL (
+        SELECT tier, rank, league_points, wins, losses, timestamp
+        FROM public.elo_history
+        WHERE player_key = p.id AND queue_type = q.queue_type
+          AND timestamp < latest.timestamp
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ) prev ON TRUE;
+$$;
+
+SELECT public.rebuild_current_standings();
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- 008_puuid_resolution_attempts.sql
+--
+-- Remembers Riot IDs generate_puuid.py could not resolve, so they are not
+-- retried every hour forever.
+--
+-- A player whose Riot ID 404s stays puuid IS NULL, and used to be looked up
+-- again on every run. Each failed attempt is now recorded here, and a Riot ID
+-- that Riot does not know is only retried after an exponentially growing wait
+-- (PUUID_RETRY_BASE_HOURS, doubling, capped at PUUID_RETRY_MAX_HOURS).
+--
+-- summ_id/player_tag are the Riot ID that was tried. A row no longer applies
+-- once the player's Riot ID differs from it, and fetch_google_forms_data.py
+-- deletes a row as soon as the player's form response is edited.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.puuid_resolution_attempts (
+    player_key      INTEGER PRIMARY KEY REFERENCES public.players (id) ON DELETE CASCADE,
+    summ_id         TEXT NOT NULL,
+    player_tag      TEXT NOT NULL,
+    status          TEXT NOT NULL,       -- not_found | error
+    attempts        INTEGER NOT NULL,
+    last_attempt_at TIMESTAMP NOT NULL,
+    next_attempt_at TIMESTAMP NOT NULL
+);
+
+COMMIT;
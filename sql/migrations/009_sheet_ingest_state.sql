@@ -0,0 +1,26 @@
+-- 009_sheet_ingest_state.sql
+--
+-- Where fetch_google_forms_data.py got to in the form sheet.
+--
+-- The stage used to download the whole response range every hour and send
+-- every row to Postgres, only for ON CONFLICT DO NOTHING to discard all but the
+-- new ones. It now reads just the rows after rows_ingested. last_row_hash is
+-- the hash of the last row it ingested; if that row no longer matches, rows
+-- were deleted or edited and the stage reads the whole sheet again, as it also
+-- does once last_full_sync_at is SHEET_FULL_RESYNC_HOURS old.
+--
+-- Deleting a row here forces a full read on the next run.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.sheet_ingest_state (
+    source            TEXT PRIMARY KEY,    -- <sheet id>/<range>
+    rows_ingested     INTEGER NOT NULL,    -- data rows, not counting the header
+    last_row_hash     TEXT,
+    last_full_sync_at TIMESTAMP NOT NULL,
+    updated_at        TIMESTAMP NOT NULL DEFAULT now()
+);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- 010_sheet_content_fingerprint.sql
+--
+-- Lets fetch_google_forms_data.py tell an unchanged sheet from a changed one
+-- without touching players.
+--
+-- row_hashes holds a short digest of every normalised form response ingested
+-- so far, and fingerprint the hash of that set. A full read of the sheet whose
+-- fingerprint matches changes nothing; otherwise only responses whose digest
+-- is not in row_hashes are merged into players.
+--
+-- Needs 009. Safe to re-run.
+
+BEGIN;
+
+ALTER TABLE public.sheet_ingest_state
+    ADD COLUMN IF NOT EXISTS fingerprint TEXT,
+    ADD COLUMN IF NOT EXISTS row_hashes  TEXT[] NOT NULL DEFAULT '{}';
+
+COMMIT;
@@ -0,0 +1,47 @@
+-- 011_mastery_upsert.sql
+--
+-- Keys public.mastery on (puuid, championId), so mastery.py can upsert the
+-- rows that changed instead of replacing the whole table every run, and adds
+-- public.mastery_history for tracking mastery gains over time.
+--
+-- Existing duplicates (there should be none: each run replaced everything)
+-- are collapsed to the row with the most points before the key is added.
+--
+-- mastery_history is only written when MASTERY_HISTORY=true. Each row is a
+-- champion's mastery at a moment it changed, so gains over a window are the
+-- difference between the last row before it and the last row inside it.
+--
+-- Needs 005. Safe to re-run.
+
+BEGIN;
+
+DELETE FROM public.mastery m
+USING public.mastery better
+WHERE better."puuid" = m."puuid"
+  AND better."championId" = m."championId"
+  AND (COALESCE(better."championPoints", -1), better.ctid)
+    > (COALESCE(m."championPoints", -1), m.ctid);
+
+DELETE FROM public.mastery WHERE "puuid" IS NULL OR "championId" IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.mastery'::regclass AND contype = 'p'
+    ) THEN
+        ALTER TABLE public.mastery ADD PRIMARY KEY ("puuid", "championId");
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS public.mastery_history (
+    "puuid"          TEXT      NOT NULL,
+    "championId"     BIGINT    NOT NULL,
+    recorded_at      TIMESTAMP NOT NULL,
+    "championLevel"  BIGINT,
+    "championPoints" BIGINT,
+    "lastPlayTime"   TIMESTAMP,
+    PRIMARY KEY ("puuid", "championId", recorded_at)
+);
+
+COMMIT;
@@ -0,0 +1,22 @@
+-- 012_mastery_slice_cursor.sql
+--
+-- Which slice of the roster mastery.py refreshes next.
+--
+-- The slice used to be picked from the hour since the epoch, which skipped a
+-- slice whenever a run was missed or late and repeated one when two runs fell
+-- in the same hour. The stage now takes next_slice and, once that slice has
+-- been written, moves it on by one.
+--
+-- Keyed by MASTERY_SLICES, so changing it starts a fresh rotation at slice 0.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.mastery_slice_state (
+    slices     INTEGER PRIMARY KEY,
+    next_slice INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- 013_players_registered_at_utc.sql
+--
+-- Converts players.registered_at from the form sheet's time zone to UTC.
+--
+-- fetch_google_forms_data.py used to store the sheet's Timestamp column as
+-- it read it: wall-clock time in the sheet's own time zone. It now converts
+-- from SHEET_TIMEZONE to UTC first, like every other TIMESTAMP column, so
+-- rows registered before that change are converted here to match. Pass the
+-- same zone SHEET_TIMEZONE is set to:
+--
+--     psql "$NEON_URL" -v sheet_timezone=Europe/London \
+--         -f sql/migrations/013_players_registered_at_utc.sql
+--
+-- Safe to re-run: the column is marked with a comment once converted, and a
+-- marked column is left alone.
+
+BEGIN;
+
+SELECT set_config('elo_snitch.sheet_timezone', :'sheet_timezone', true);
+
+DO $$
+BEGIN
+    IF col_description('public.players'::regclass, (
+        SELECT attnum FROM pg_attribute
+        WHERE attrelid = 'public.players'::regclass AND attname = 'registered_at'
+    )) IS DISTINCT FROM 'UTC' THEN
+        UPDATE public.players
+        SET registered_at = (registered_at AT TIME ZONE current_setting('elo_snitch.sheet_timezone'))
+                            AT TIME ZONE 'UTC'
+        WHERE registered_at IS NOT NULL;
+        COMMENT ON COLUMN public.players.registered_at IS 'UTC';
+    END IF;
+END $$;
+
+COMMIT;
@@ -30,6 +30,28 @@ const COMMANDS = {
     },
 };
 
+// Rendered replies, per snapshot object: readLatest hands back the same object
+// until latest.json changes, so a burst of the same command formats once. The
+// age in the footer is the one part of a reply that moves without the snapshot
+// changing, so a cached reply is only reused while that text is still the same.
+const replies = new WeakMap();
+
+function render(name, command, data, now) {
+    let rendered = replies.get(data);
+    if (!rendered) {
+        rendered = new Map();
+        replies.set(data, rendered);
+    }
+    const age = format.formatAge(data.timestamp, now);
+    const cached = rendered.get(name);
+    if (cached && cached.age === age) {
+        return cached.reply;
+    }
+    const reply = command.render(data, now);
+    rendered.set(name, { age, reply });
+    return reply;
+}
+
 /**
  * Render a command's reply, or null if the name is not a command.
  *
@@ -48,7 +70,7 @@ async function runCommand(name, { read = readLatest, now = new Date() } = {}) {
     if (!data) {
         return command.missing;
     }
-    return command.render(data, now);
+    return render(name, command, data, now);
 }
 
 /**
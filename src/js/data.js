@@ -1,38 +1,129 @@
 /**
  * Reading the pipeline's output.
  *
- * elo_tracker.py mirrors every snapshot to <folder>/latest.json (see
- * write_snapshot), so there is exactly one file to read. The previous version
+ * The pipeline mirrors every snapshot to <folder>/latest.json (see
+ * snapshots.write_snapshot) with an atomic rename, so there is exactly one file
+ * to read, and it is never seen half-written. The previous version
  * predated that mirror and walked the dated folders, sorting directory names and
  * then filenames to rediscover what the pipeline already points at -- along with
  * a five-minute cache whose only purpose was to avoid repeating that walk.
+ *
+ * The parsed snapshot is kept in memory until latest.json changes, so a burst of
+ * commands after a pipeline run reads and parses it once. Changes are noticed
+ * with fs.watch on the folder -- not the file, because the pipeline replaces
+ * latest.json by renaming over it, and a watch on the old file would never fire
+ * again. Where the folder cannot be watched (it does not exist yet, or the
+ * platform refuses), each read falls back to comparing the file's mtime and size.
  */
 
+const fsSync = require('fs');
 const fs = require('fs').promises;
 const path = require('path');
 
 const DATA_DIR = path.resolve(__dirname, '../..', 'data');
 
+const LATEST = 'latest.json';
+
 /**
- * Read the newest snapshot for a data folder, or null if the pipeline has not
- * written one yet.
- *
- * Throws on malformed JSON rather than swallowing it: an unreadable file means
- * something is wrong with the pipeline, and the caller reports that distinctly
- * from "no data yet".
+ * A reader with its own cache and watchers. `watch: false` skips fs.watch and
+ * always validates by mtime.
  */
-async function readLatest(folder) {
-    const file = path.join(DATA_DIR, folder, 'latest.json');
-    let contents;
-    try {
-        contents = await fs.readFile(file, 'utf8');
-    } catch (error) {
-        if (error.code === 'ENOENT') {
-            return null;
+function createSnapshotReader({ dataDir = DATA_DIR, watch = true } = {}) {
+    const cache = new Map();    // folder -> { data, mtimeMs, size }
+    const watchers = new Map(); // folder -> fs.FSWatcher
+    // Bumped on every change event, so a read that raced a rewrite does not
+    // cache what it read.
+    const generations = new Map();
+
+    const invalidate = (folder) => {
+        cache.delete(folder);
+        generations.set(folder, (generations.get(folder) || 0) + 1);
+    };
+
+    function watching(folder) {
+        if (!watch) {
+            return false;
         }
-        throw error;
+        if (watchers.has(folder)) {
+            return true;
+        }
+        let watcher;
+        try {
+            watcher = fsSync.watch(path.join(dataDir, folder), (event, filename) => {
+                if (!filename || filename === LATEST) {
+                    invalidate(folder);
+                }
+            });
+        } catch (error) {
+            return false;
+        }
+        // A watch must not keep the process alive on its own.
+        watcher.unref();
+        watcher.on('error', () => {
+            watcher.close();
+            watchers.delete(folder);
+            invalidate(folder);
+        });
+        watchers.set(folder, watcher);
+        // Anything cached before the watch began was never covered by it.
+        invalidate(folder);
+        return true;
     }
-    return JSON.parse(contents);
+
+    /**
+     * Read the newest snapshot for a data folder, or null if the pipeline has
+     * not written one yet.
+     *
+     * Throws on malformed JSON rather than swallowing it: an unreadable file
+     * means something is wrong with the pipeline, and the caller reports that
+     * distinctly from "no data yet". Nothing is cached in that case.
+     *
+     * The returned object is shared between callers and must not be modified.
+     */
+    async function read(folder) {
+        const watched = watching(folder);
+        const cached = cache.get(folder);
+        if (cached && watched) {
+            return cached.data;
+        }
+
+        const generation = generations.get(folder) || 0;
+        const file = path.join(dataDir, folder, LATEST);
+        let stat;
+        let contents;
+        try {
+            stat = await fs.stat(file);
+            if (cached && cached.mtimeMs === stat.mtimeMs && cached.size === stat.size) {
+                return cached.data;
+            }
+            contents = await fs.readFile(file, 'utf8');
+        } catch (error) {
+            if (error.code === 'ENOENT') {
+                cache.delete(folder);
+                return null;
+            }
+            throw error;
+        }
+        const data = JSON.parse(contents);
+        if ((generations.get(folder) || 0) === generation) {
+            cache.set(folder, { data, mtimeMs: stat.mtimeMs, size: stat.size });
+        }
+        return data;
+    }
+
+    function close() {
+        for (const watcher of watchers.values()) {
+            watcher.close();
+        }
+        watchers.clear();
+        cache.clear();
+    }
+
+    return { read, close };
 }
 
-module.exports = { DATA_DIR, readLatest };
+const defaultReader = createSnapshotReader();
+
+const readLatest = defaultReader.read;
+
+module.exports = { DATA_DIR, createSnapshotReader, readLatest };
@@ -7,12 +7,14 @@ lower_case ones already present in existing .env files.
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
 
 PROJECT_ROOT: Path = Path(__file__).resolve().parents[2]
 CONFIG_DIR: Path = PROJECT_ROOT / "config"
@@ -20,6 +22,8 @@ DATA_DIR: Path = PROJECT_ROOT / "data"
 LOGS_DIR: Path = PROJECT_ROOT / "logs"
 ENV_PATH: Path = CONFIG_DIR / ".env"
 GOOGLE_CREDENTIALS_PATH: Path = PROJECT_ROOT / ".google" / "credentials.json"
+# The service account's current access token, reused until it expires.
+GOOGLE_TOKEN_CACHE_PATH: Path = PROJECT_ROOT / ".google" / "token.json"
 
 if ENV_PATH.exists():
     load_dotenv(dotenv_path=ENV_PATH, override=True)
@@ -64,11 +68,77 @@ DATABASE_URL: str = _env("DATABASE_URL") or (
 # league-v4 and champion-mastery-v4 are platform (euw1/na1/...).
 RIOT_REGION: str = _env("RIOT_REGION", default="europe")
 RIOT_PLATFORM: str = _env("RIOT_PLATFORM", default="euw1")
-RIOT_ACCOUNT_BASE_URL: str = f"https://{RIOT_REGION}.api.riotgames.com"
-RIOT_PLATFORM_BASE_URL: str = f"https://{RIOT_PLATFORM}.api.riotgames.com"
+# Both overridable, so the pipeline can be pointed at riot_stub_server.py.
+RIOT_ACCOUNT_BASE_URL: str = _env(
+    "RIOT_ACCOUNT_BASE_URL", default=f"https://{RIOT_REGION}.api.riotgames.com"
+).rstrip("/")
+RIOT_PLATFORM_BASE_URL: str = _env(
+    "RIOT_PLATFORM_BASE_URL", default=f"https://{RIOT_PLATFORM}.api.riotgames.com"
+).rstrip("/")
+
+# Requests elo_check keeps in flight at once. The rate limiter, not this number,
+# is what keeps the key inside its quota; 1 scans strictly one player at a time.
+ELO_CHECK_CONCURRENCY: int = int(_env("ELO_CHECK_CONCURRENCY", default="8"))
+# The same, for generate_puuid's account-v1 lookups.
+PUUID_CONCURRENCY: int = int(_env("PUUID_CONCURRENCY", default="4"))
+
+# Shared by every Riot caller through riot_client. Stages can run side by side
+# (run_pipeline), so the pool should cover the concurrency settings combined, or
+# threads queue for a connection.
+RIOT_POOL_SIZE: int = int(_env("RIOT_POOL_SIZE", default="16"))
+RIOT_TIMEOUT_SECONDS: float = float(_env("RIOT_TIMEOUT_SECONDS", default="30"))
+
+# --- elo_history storage ----------------------------------------------------
+# "append" writes every player's standing on every scan. "changes" writes a row
+# only when tier/rank/LP/wins/losses moved, plus a heartbeat row once a player's
+# last stored row is ELO_HEARTBEAT_HOURS old. Both need sql/migrations/003.
+ELO_HISTORY_MODE: str = _env("ELO_HISTORY_MODE", default="append").lower()
+ELO_HEARTBEAT_HOURS: float = float(_env("ELO_HEARTBEAT_HOURS", default="24"))
+
+# "all" rescans every player every run. "adaptive" backs idle players off to
+# every 6/12/24 hours (see scan_scheduler), never beyond SCAN_MAX_STALENESS_HOURS.
+# Needs sql/migrations/004.
+SCAN_SCHEDULE: str = _env("SCAN_SCHEDULE", default="all").lower()
+SCAN_MAX_STALENESS_HOURS: float = float(_env("SCAN_MAX_STALENESS_HOURS", default="24"))
+
+# A Riot ID account-v1 does not know is retried after PUUID_RETRY_BASE_HOURS,
+# then twice as long after each further miss, up to PUUID_RETRY_MAX_HOURS.
+# Needs sql/migrations/008.
+PUUID_RETRY_BASE_HOURS: float = float(_env("PUUID_RETRY_BASE_HOURS", default="1"))
+PUUID_RETRY_MAX_HOURS: float = float(_env("PUUID_RETRY_MAX_HOURS", default="168"))
+
+# mastery.py refreshes 1/MASTERY_SLICES of the roster per run, so with hourly
+# runs every player's mastery is fetched once every MASTERY_SLICES hours.
+MASTERY_SLICES: int = int(_env("MASTERY_SLICES", default="24"))
+MASTERY_CONCURRENCY: int = int(_env("MASTERY_CONCURRENCY", default="4"))
+# Also append every changed mastery row to mastery_history, for computing
+# mastery gains over time. Needs sql/migrations/011.
+MASTERY_HISTORY: bool = _env("MASTERY_HISTORY", default="false").lower() in ("1", "true", "yes")
+
+# elo_tracker writes its JSON snapshots compact; set to indent them for reading
+# by hand.
+SNAPSHOT_PRETTY: bool = _env("SNAPSHOT_PRETTY", default="false").lower() in ("1", "true", "yes")
+
+# --- Metrics ----------------------------------------------------------------
+# run_pipeline writes each run's metrics as JSON under METRICS_DIR, and as a
+# Prometheus textfile too when METRICS_TEXTFILE names one (point it into
+# node_exporter's --collector.textfile.directory).
+METRICS_DIR: Path = Path(_env("METRICS_DIR", default=str(DATA_DIR / "metrics")))
+METRICS_TEXTFILE: Optional[str] = _env("METRICS_TEXTFILE")
 
 # --- Google -----------------------------------------------------------------
 GOOGLE_SHEET_RANGE: str = _env("GOOGLE_SHEET_RANGE", default="Form Responses 1!A:D")
+# The time zone the form sheet's Timestamp column is in (File > Settings in the
+# sheet). Responses are converted from it to UTC, like every TIMESTAMP column.
+SHEET_TIMEZONE: str = _env("SHEET_TIMEZONE", default="UTC")
+# fetch_google_forms_data reads only rows added since its last run, and the
+# whole sheet this often, to pick up edits to older responses. Needs
+# sql/migrations/009.
+SHEET_FULL_RESYNC_HOURS: float = float(_env("SHEET_FULL_RESYNC_HOURS", default="24"))
+# Probe Google's hosts before every sheet fetch, not only after one fails.
+GOOGLE_CONNECTIVITY_CHECK: bool = (
+    _env("GOOGLE_CONNECTIVITY_CHECK", default="false").lower() in ("1", "true", "yes")
+)
 
 
 def riot_api_key() -> str:
@@ -86,13 +156,22 @@ def riot_headers() -> dict:
     return {"X-Riot-Token": riot_api_key()}
 
 
-_engine: Optional[Engine] = None
+_engine: Optional["Engine"] = None
+_engine_lock = threading.Lock()
 
 
-def get_engine() -> Engine:
+def get_engine() -> "Engine":
     """Process-wide SQLAlchemy engine. pool_pre_ping avoids stale connections
-    when the Postgres container restarts between hourly runs."""
+    when the Postgres container restarts between hourly runs.
+
+    Built on first call, never at import: modules call this where they query,
+    so importing a stage for one helper costs no engine and no DB driver.
+    The lock matters since stages run concurrently: two first calls must not
+    each build a pool.
+    """
     global _engine
-    if _engine is None:
-        _engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-    return _engine
+    with _engine_lock:
+        if _engine is None:
+            from sqlalchemy import create_engine
+            _engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+        return _engine
@@ -1,40 +1,42 @@
-import time
-from typing import List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
 
 import pandas as pd
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from sqlalchemy import text
 
 import config
+import metrics
+import scan_scheduler
+from bulk_load import copy_records
 from logger_config import setup_logger
+from riot_client import RiotClient, get_client
+from standings import latest_scans_sql
 
 logger = setup_logger(__name__, 'elo_check.log')
 
-engine = config.get_engine()
-
 QUEUE_TYPES = ("RANKED_SOLO_5x5", "RANKED_FLEX_SR")
 
+LEAGUE_METHOD = "league-v4.entries.by-puuid"
+
+# The order scan rows are built in, and the order COPY sends them.
+ELO_HISTORY_COLUMNS = (
+    "timestamp", "player_key", "queue_type", "tier", "rank",
+    "league_points", "wins", "losses",
+)
 
-def create_session_with_retries() -> requests.Session:
-    """Create a requests session with retry strategy"""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"]
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+# What counts as a player's standing having changed, for ELO_HISTORY_MODE=changes.
+STANDING_FIELDS = ("tier", "rank", "league_points", "wins", "losses")
 
 
-def fetch_players(db_connection=engine) -> pd.DataFrame:
+def fetch_players(db_connection=None) -> pd.DataFrame:
     """Players that have a resolved puuid. Anyone without one is skipped --
     generate_puuid.py is responsible for filling those in."""
     logger.info("Fetching players from database")
+    if db_connection is None:
+        db_connection = config.get_engine()
     with db_connection.connect() as connection:
         df: pd.DataFrame = pd.read_sql(
             """
@@ -53,57 +55,69 @@ def fetch_players(db_connection=engine) -> pd.DataFrame:
     return df
 
 
-def fetch_entries(session: requests.Session, puuid: str) -> Optional[list]:
+def fetch_entries(client: RiotClient, puuid: str) -> Optional[list]:
     """Return the raw league entries for a puuid, or None if the call failed."""
     url = f"{config.RIOT_PLATFORM_BASE_URL}/lol/league/v4/entries/by-puuid/{puuid}"
-    headers = config.riot_headers()
-
-    response = session.get(url, headers=headers, timeout=30)
+    response = client.get(url, LEAGUE_METHOD)
 
     if response.status_code == 200:
         return response.json()
 
-    if response.status_code == 429:
-        retry_after = int(response.headers.get("Retry-After", 60))
-        logger.warning(f"Rate limited. Waiting {retry_after}s before retry...")
-        time.sleep(retry_after)
-        response = session.get(url, headers=headers, timeout=30)
-        if response.status_code == 200:
-            return response.json()
-
     logger.error(f"Riot API returned {response.status_code}: {response.text[:200]}")
     return None
 
 
-def elo_check() -> List[dict]:
-    """Fetch current ranked standings for every player with a puuid.
-
-    Returns one row per player per queue they are ranked in. Players who are
-    unranked in a queue simply produce no row for it.
-    """
-    players_df = fetch_players()
-    if players_df.empty:
-        return []
-
-    session = create_session_with_retries()
-    scanned_at = pd.Timestamp.now()
-    rows: List[dict] = []
+def scan_player(
+    client: RiotClient,
+    summ_id: str,
+    puuid: str,
+    position: int,
+    total: int,
+) -> Optional[list]:
+    """One worker's unit of work: fetch a player's entries, logging any failure."""
+    logger.info(f"Processing {summ_id} ({position}/{total})")
+    try:
+        return fetch_entries(client, puuid)
+    except requests.exceptions.Timeout:
+        logger.error(f"Timeout for {summ_id}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error for {summ_id}: {e}")
+    return None
 
-    total = len(players_df)
-    for position, (player_key, player) in enumerate(players_df.iterrows(), start=1):
-        logger.info(f"Processing {player['summ_id']} ({position}/{total})")
 
-        try:
-            entries = fetch_entries(session, player['puuid'])
-        except requests.exceptions.Timeout:
-            logger.error(f"Timeout for {player['summ_id']}")
-            entries = None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error for {player['summ_id']}: {e}")
-            entries = None
+def scan_roster(
+    players_df: pd.DataFrame,
+    concurrency: Optional[int] = None,
+    scanned_at: Optional[pd.Timestamp] = None,
+) -> Tuple[List[dict], List[int]]:
+    """Fetch standings for `players_df` (indexed by player key).
 
+    Returns the scan rows and the keys of every player whose call succeeded,
+    ranked or not -- the scheduler needs the latter, since an unranked player
+    produces no rows but was still scanned.
+    """
+    concurrency = max(1, concurrency or config.ELO_CHECK_CONCURRENCY)
+    client = get_client()
+    scanned_at = scanned_at if scanned_at is not None else pd.Timestamp.now()
+    rows: List[dict] = []
+    scanned_keys: List[int] = []
+
+    players = list(players_df.iterrows())
+    total = len(players)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(
+                scan_player, client, player['summ_id'], player['puuid'], position, total
+            )
+            for position, (_, player) in enumerate(players, start=1)
+        ]
+        scanned = [future.result() for future in futures]
+
+    for (player_key, player), entries in zip(players, scanned):
         if entries is None:
+            metrics.inc("players_skipped", reason="fetch_failed")
             continue
+        scanned_keys.append(player_key)
 
         for queue_type in QUEUE_TYPES:
             entry = next((item for item in entries if item.get("queueType") == queue_type), None)
@@ -120,27 +134,169 @@ def elo_check() -> List[dict]:
                 "losses": entry["losses"],
             })
 
-        # Riot allows 20 req/s on a dev key; 0.1s keeps us well inside that.
-        time.sleep(0.1)
+    return rows, scanned_keys
+
 
+def elo_check(
+    concurrency: Optional[int] = None,
+    scanned_at: Optional[pd.Timestamp] = None,
+) -> List[dict]:
+    """Fetch current ranked standings for every player with a puuid.
+
+    Returns one row per player per queue they are ranked in. Players who are
+    unranked in a queue simply produce no row for it.
+
+    Up to `concurrency` requests are in flight at once (ELO_CHECK_CONCURRENCY
+    by default), all drawing on the shared Riot client's quota. Rows come back
+    in player order regardless, so the output matches a sequential scan.
+
+    Every row carries the same `scanned_at` (now, by default); elo_tracker
+    recognises the latest scan by it.
+    """
+    players_df = fetch_players()
+    if players_df.empty:
+        return []
+    rows, _ = scan_roster(players_df, concurrency, scanned_at)
     return rows
 
 
-def main():
-    logger.info("Starting ELO check process")
-    rows = elo_check()
+def fetch_latest_standings(db_connection=None) -> Dict[Tuple[int, str], dict]:
+    """The most recent stored row per (player_key, queue_type)."""
+    query = text(f"""
+        SELECT player_key, queue_type, tier, rank, league_points, wins, losses, timestamp
+        FROM ({latest_scans_sql(1)}) latest
+    """)
+    if db_connection is None:
+        db_connection = config.get_engine()
+    with db_connection.connect() as connection:
+        return {
+            (row["player_key"], row["queue_type"]): dict(row)
+            for row in connection.execute(query).mappings()
+        }
+
+
+def select_rows_to_store(
+    rows: List[dict],
+    latest: Dict[Tuple[int, str], dict],
+    heartbeat: timedelta,
+) -> List[dict]:
+    """The subset of a scan that change-only mode writes.
+
+    A row is kept when the player is new to the queue, when any of
+    STANDING_FIELDS moved since their last stored row, or as a heartbeat once
+    that row is `heartbeat` old. Everything else would be an exact copy of the
+    row before it, which is what the tracker already diffs against.
+    """
+    kept = []
+    for row in rows:
+        previous = latest.get((row["player_key"], row["queue_type"]))
+        if (
+            previous is None
+            or any(row[field] != previous[field] for field in STANDING_FIELDS)
+            or row["timestamp"] - previous["timestamp"] >= heartbeat
+        ):
+            kept.append(row)
+    return kept
+
+
+def store_scan(rows: List[dict], scanned_at: pd.Timestamp, rows_scanned: int) -> None:
+    """COPY a scan's rows into elo_history and record the scan, in one transaction.
+
+    The elo_scans entry is written even when no rows are: in change-only mode
+    a quiet hour stores nothing in elo_history, and elo_tracker still has to
+    know a scan happened so it does not re-report the previous one. A second
+    pass at the same scanned_at (see scan_new_players) adds to its counts.
+    """
+    with config.get_engine().begin() as connection:
+        if rows:
+            copy_records(connection, "public.elo_history", ELO_HISTORY_COLUMNS, rows)
+        connection.execute(
+            text("""
+                INSERT INTO public.elo_scans (scanned_at, rows_scanned, rows_written)
+                VALUES (:scanned_at, :rows_scanned, :rows_written)
+                ON CONFLICT (scanned_at) DO UPDATE
+                SET rows_scanned = elo_scans.rows_scanned + EXCLUDED.rows_scanned,
+                    rows_written = elo_scans.rows_written + EXCLUDED.rows_written
+            """),
+            {
+                "scanned_at": scanned_at.to_pydatetime(),
+                "rows_scanned": rows_scanned,
+                "rows_written": len(rows),
+            },
+        )
+    metrics.inc("elo_history_rows_written", len(rows))
+
+
+def run_scan(players_df: pd.DataFrame, scanned_at: pd.Timestamp) -> None:
+    """Scan `players_df` and store the result as part of the scan at `scanned_at`."""
+    adaptive = config.SCAN_SCHEDULE == "adaptive"
 
+    if adaptive and not players_df.empty:
+        roster_size = len(players_df)
+        players_df = scan_scheduler.due_players(players_df, scanned_at.to_pydatetime())
+        metrics.inc("players_skipped", roster_size - len(players_df), reason="not_due")
+    rows, scanned_keys = scan_roster(players_df, scanned_at=scanned_at)
+
+    to_store = rows
     if not rows:
+        # Still recorded, so the tracker does not mistake the previous scan for
+        # this one and post its changes a second time.
         logger.warning("No ranked data to load.")
+    else:
+        for queue_type, count in Counter(row["queue_type"] for row in rows).most_common():
+            logger.info(f"  {queue_type}: {count} players")
+
+        if config.ELO_HISTORY_MODE == "changes":
+            heartbeat = timedelta(hours=config.ELO_HEARTBEAT_HOURS)
+            to_store = select_rows_to_store(rows, fetch_latest_standings(), heartbeat)
+            logger.info(
+                f"Change-only mode: {len(to_store)} of {len(rows)} rows changed or due a heartbeat"
+            )
+        logger.info(f"Loading {len(to_store)} scan rows to database")
+
+    store_scan(to_store, scanned_at, rows_scanned=len(rows))
+    if adaptive:
+        scan_scheduler.record_scans(scanned_keys, scanned_at.to_pydatetime())
+    logger.info("Scan data loaded successfully into the database.")
+
+
+class ScanPass(NamedTuple):
+    scanned_at: pd.Timestamp
+    player_keys: FrozenSet[int]
+
+
+# run_pipeline splits one run's scan into two passes so the roster can be
+# scanned while the sheet fetch and puuid resolution are still going: everyone
+# who already has a puuid first, then whoever generate_puuid resolved since.
+# Both passes write under the same scanned_at, so elo_tracker sees one scan;
+# the runner hands the first pass's ScanPass to the second.
+def scan_existing_players() -> ScanPass:
+    """First pass: every player with a puuid right now."""
+    logger.info("Starting ELO check of the existing roster")
+    scanned_at = pd.Timestamp.now()
+    players_df = fetch_players()
+    first_pass = ScanPass(scanned_at, frozenset(players_df.index))
+    run_scan(players_df, scanned_at)
+    return first_pass
+
+
+def scan_new_players(first_pass: Optional[ScanPass] = None) -> None:
+    """Follow-up pass: players whose puuid appeared after `first_pass` began."""
+    if first_pass is None:
+        logger.warning("No first scan pass to follow up; skipping the new-player scan")
+        return
+    players_df = fetch_players()
+    new_players = players_df[~players_df.index.isin(first_pass.player_keys)]
+    if new_players.empty:
+        logger.info("No newly resolved players to scan")
         return
+    logger.info(f"Scanning {len(new_players)} newly resolved players")
+    run_scan(new_players, first_pass.scanned_at)
 
-    df = pd.DataFrame(rows)
-    logger.info(f"Loading {len(df)} scan rows to database")
-    df.to_sql(name="elo_history", con=engine, if_exists='append', index=False)
 
-    for queue_type, count in df['queue_type'].value_counts().items():
-        logger.info(f"  {queue_type}: {count} players")
-    logger.info("Scan data loaded successfully into the database.")
+def main():
+    logger.info("Starting ELO check process")
+    run_scan(fetch_players(), pd.Timestamp.now())
 
 
 if __name__ == "__main__":
@@ -1,16 +1,17 @@
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import json
-from typing import Tuple, Dict, List
+from typing import NamedTuple, Tuple, Dict, List
 
 import config
+import metrics
 from logger_config import setup_logger
+from snapshots import write_snapshot
+from standings import latest_scans_sql
 
 logger = setup_logger(__name__, 'elo_tracker.log')
 
-engine = config.get_engine()
-
 # Constants for message formatting
 MESSAGE_HEADER = "*ELO CHANGES UPDATE*\n\n"
 QUEUE_TYPES = {
@@ -58,17 +59,6 @@ def create_daily_directory(folder: str)-> Tuple[str, str]:
     os.makedirs(daily_dir, exist_ok=True)
     return data_dir, daily_dir
     
-def write_snapshot(daily_path: str, latest_path: str, payload: Dict[str, any])-> None:
-    """Write a snapshot to its dated file and mirror it to latest.json.
-
-    latest.json is a plain copy rather than a symlink: os.symlink needs the
-    SeCreateSymbolicLink privilege on Windows, so the symlink always failed and
-    latest.json never actually existed.
-    """
-    for path in (daily_path, latest_path):
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(payload, f, indent=2)
-
 def get_tier_index(tier: str)-> int:
     if tier not in TIER_ORDER:
         raise ValueError(f"Unknown tier: {tier!r}. Expected one of {TIER_ORDER}")
@@ -235,6 +225,110 @@ def calculate_elo_change(
         "total_change": " - ".join(change_parts)
     }
 
+# --- array kernel -------------------------------------------------------------
+# ladder_points and calculate_elo_change over whole columns. The scalar
+# functions above stay the reference; these must agree with them exactly, and
+# tests/test_ladder_kernel.py checks every reachable rank against them.
+
+CHANGE_DEMOTED: int = -1
+CHANGE_NONE: int = 0
+CHANGE_PROMOTED: int = 1
+
+_TIER_INDEX = pd.Index(TIER_ORDER)
+_DIVISION_INDEX = pd.Index(DIVISION_ORDER)
+_APEX_TIER_CODES = np.array(sorted(TIER_ORDER.index(tier) for tier in APEX_TIERS))
+_APEX_BASE: int = TIER_ORDER.index("MASTER") * LP_PER_TIER
+
+class EloChangeArrays(NamedTuple):
+    """calculate_elo_change's lp_change, tier_change and division_change, one
+    element per row, with the two changes as CHANGE_* codes."""
+    lp_change: np.ndarray
+    tier_change: np.ndarray
+    division_change: np.ndarray
+
+def _missing(values: np.ndarray) -> np.ndarray:
+    # pandas stores a missing string as None or NaN depending on dtype; both
+    # mean "no division" here, as None does to get_division_index.
+    return pd.isna(values)
+
+def _tier_codes(tiers: np.ndarray) -> np.ndarray:
+    codes = _TIER_INDEX.get_indexer(tiers)
+    if (codes < 0).any():
+        get_tier_index(tiers[np.argmax(codes < 0)])  # raises, with the scalar message
+    return codes
+
+def _division_codes(divisions: np.ndarray, checked: np.ndarray) -> np.ndarray:
+    """Division indices, 0 where missing. Only rows in `checked` may raise,
+    as the scalar functions only look at the division in those cases."""
+    codes = _DIVISION_INDEX.get_indexer(divisions)
+    missing = _missing(divisions)
+    unknown = checked & (codes < 0) & ~missing
+    if unknown.any():
+        get_division_index(divisions[np.argmax(unknown)])
+    return np.where(missing, 0, codes)
+
+def _ladder_points_from_codes(tier_codes, divisions, lps) -> np.ndarray:
+    apex = np.isin(tier_codes, _APEX_TIER_CODES)
+    division_codes = _division_codes(divisions, checked=~apex)
+    lps = np.nan_to_num(np.asarray(lps, dtype=float)).astype(np.int64)
+    return np.where(
+        apex,
+        _APEX_BASE + lps,
+        tier_codes * LP_PER_TIER + division_codes * LP_PER_DIVISION + lps,
+    )
+
+def ladder_points_array(tiers, divisions, lps) -> np.ndarray:
+    """ladder_points for every element of three equal-length columns.
+
+    Missing LP counts as 0, as in the scalar `lp or 0`.
+    """
+    tiers = np.asarray(tiers, dtype=object)
+    divisions = np.asarray(divisions, dtype=object)
+    return _ladder_points_from_codes(_tier_codes(tiers), divisions, lps)
+
+def calculate_elo_change_array(
+    old_tiers, old_divisions, old_lps,
+    new_tiers, new_divisions, new_lps
+    ) -> EloChangeArrays:
+    """
+    calculate_elo_change for whole columns, minus the message text.
+
+    Rows with no old tier get zeros throughout, as the scalar reports no change
+    for a player with nothing to diff against. Building total_change strings is
+    left to the scalar function, for the rows that turn out to have moved.
+    """
+    old_tiers = np.asarray(old_tiers, dtype=object)
+    old_divisions = np.asarray(old_divisions, dtype=object)
+    new_tiers = np.asarray(new_tiers, dtype=object)
+    new_divisions = np.asarray(new_divisions, dtype=object)
+
+    known = ~_missing(old_tiers)
+    old_codes = np.full(len(old_tiers), -1)
+    new_codes = np.full(len(new_tiers), -1)
+    old_codes[known] = _tier_codes(old_tiers[known])
+    new_codes[known] = _tier_codes(new_tiers[known])
+
+    lp_change = np.zeros(len(old_tiers), dtype=np.int64)
+    lp_change[known] = (
+        _ladder_points_from_codes(new_codes[known], new_divisions[known], np.asarray(new_lps)[known])
+        - _ladder_points_from_codes(old_codes[known], old_divisions[known], np.asarray(old_lps)[known])
+    )
+
+    tier_change = np.sign(new_codes - old_codes)
+
+    # The scalar compares divisions only inside one tier, and only when both
+    # sides have a (non-empty) division -- which skips the apex tiers.
+    has_old = ~_missing(old_divisions) & (old_divisions != "")
+    has_new = ~_missing(new_divisions) & (new_divisions != "")
+    compared = known & (old_codes == new_codes) & has_old & has_new
+    division_change = np.sign(
+        _division_codes(new_divisions, checked=compared)
+        - _division_codes(old_divisions, checked=compared)
+    )
+    division_change = np.where(compared, division_change, CHANGE_NONE)
+
+    return EloChangeArrays(lp_change, tier_change, division_change)
+
 def fetch_players(db_connection: object)-> pd.DataFrame:
     with db_connection.connect() as connection:
         df = pd.read_sql("""
@@ -246,26 +340,39 @@ def fetch_players(db_connection: object)-> pd.DataFrame:
 
 def fetch_previous_elo(db_connection: object)-> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     with db_connection.connect() as connection:
-        # Fetch the last two scans from elo_history
-        query = """
+        # Fetch the last two rows per player and queue from elo_history, along
+        # with when the latest scan ran (falling back to the newest row for
+        # history written before elo_scans existed).
+        query = f"""
+        WITH latest_scan AS (
+            SELECT COALESCE(
+                (SELECT max(scanned_at) FROM public.elo_scans),
+                (SELECT max(timestamp) FROM public.elo_history)
+            ) AS scanned_at
+        ),
+        latest_rows AS ({latest_scans_sql(2)})
         SELECT
-            p.summ_id,
-            eh.queue_type,
-            eh.tier,
-            eh.rank,
-            eh.league_points,
-            eh.wins,
-            eh.losses,
-            eh.timestamp,
-            ROW_NUMBER() OVER (PARTITION BY eh.player_key, eh.queue_type ORDER BY eh.timestamp DESC) as scan_number
-        FROM public.elo_history eh
-        JOIN public.players p ON eh.player_key = p.id
+            lr.summ_id,
+            lr.queue_type,
+            lr.tier,
+            lr.rank,
+            lr.league_points,
+            lr.wins,
+            lr.losses,
+            lr.timestamp,
+            lr.scan_number,
+            ls.scanned_at AS latest_scan
+        FROM latest_rows lr
+        CROSS JOIN latest_scan ls
         """
         
         df = pd.read_sql(query, connection)
         
-        # Separate into current and previous scans
-        current_df = df[df['scan_number'] == 1]
+        # Separate into current and previous scans. A newest row older than the
+        # latest scan means that scan stored nothing for the player -- in
+        # change-only mode, because nothing moved -- so there is no change to
+        # report, whatever the two rows before it say.
+        current_df = df[(df['scan_number'] == 1) & (df['timestamp'] >= df['latest_scan'])]
         previous_df = df[df['scan_number'] == 2]
         
         # Separate by queue type
@@ -337,6 +444,76 @@ def process_queue_changes(
         "change": change_info["total_change"]
     }]
 
+def diff_queues(
+    puuid_df: pd.DataFrame,
+    queue_data: Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]
+) -> List[Dict[str, any]]:
+    """
+    process_queue_changes for every player and queue, one join per queue.
+
+    Calling process_queue_changes per player filters both frames each time,
+    which is O(players x rows). Here each queue's current and previous scans
+    are joined to the roster once and compared column-wise; only the players
+    who moved are passed through calculate_elo_change for their message.
+
+    Returns exactly what the per-player loop would, in the same order: players
+    in puuid_df order, queues in queue_data order within each player.
+    """
+    columns = ['summ_id', 'tier', 'rank', 'league_points']
+    roster = puuid_df[['summ_id']].assign(_position=range(len(puuid_df)))
+
+    moved_frames = []
+    for queue_position, (queue_name, (current_df, previous_df)) in enumerate(queue_data.items()):
+        if current_df.empty or previous_df.empty:
+            continue
+        # iloc[0] in process_queue_changes: the first row per player wins.
+        current = current_df[columns].drop_duplicates('summ_id')
+        previous = previous_df[columns].drop_duplicates('summ_id')
+        merged = roster.merge(current, on='summ_id').merge(
+            previous, on='summ_id', suffixes=('', '_old')
+        )
+        # No previous tier means nothing to diff against: calculate_elo_change
+        # reports a zero change, which is never stored.
+        merged = merged[merged['tier_old'].notna()]
+        if merged.empty:
+            continue
+
+        change = calculate_elo_change_array(
+            merged['tier_old'], merged['rank_old'], merged['league_points_old'],
+            merged['tier'], merged['rank'], merged['league_points']
+        )
+        moved = merged[
+            (change.lp_change != 0)
+            | (change.tier_change != CHANGE_NONE)
+            | (change.division_change != CHANGE_NONE)
+        ]
+        moved_frames.append(moved.assign(queue=queue_name, _queue_position=queue_position))
+
+    if not moved_frames:
+        return []
+
+    moved = pd.concat(moved_frames).sort_values(['_position', '_queue_position'], kind='stable')
+
+    changes = []
+    for row in moved.itertuples(index=False):
+        change_info = calculate_elo_change(
+            old_tier=row.tier_old,
+            old_division=row.rank_old,
+            old_lp=row.league_points_old,
+            new_tier=row.tier,
+            new_division=row.rank,
+            new_lp=row.league_points
+        )
+        changes.append({
+            "summ_id": row.summ_id,
+            "queue": row.queue,
+            "tier": format_tier_rank(row.tier, row.rank),
+            "lp": row.league_points,
+            "lp_change": change_info["lp_change"],
+            "change": change_info["total_change"]
+        })
+    return changes
+
 # -----------------------------
 
 def get_queue_data() -> Tuple[pd.DataFrame, Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]]:
@@ -347,11 +524,11 @@ def get_queue_data() -> Tuple[pd.DataFrame, Dict[str, Tuple[pd.DataFrame, pd.Dat
         Tuple of (puuid_df, queue_data_dict) where queue_data_dict contains
         current and previous dataframes for each queue type
     """
-    puuid_df = fetch_players(engine)
+    puuid_df = fetch_players(config.get_engine())
     if puuid_df.empty:
         return puuid_df, {}
     
-    current_solo, current_flex, previous_solo, previous_flex = fetch_previous_elo(engine)
+    current_solo, current_flex, previous_solo, previous_flex = fetch_previous_elo(config.get_engine())
     
     queue_data = {
         "Solo/Duo Queue": (current_solo, previous_solo),
@@ -382,14 +559,7 @@ def track_elo_changes() -> List[Dict[str, any]]:
         logger.warning("No queue data available")
         return []
     
-    all_changes = []
-    
-    for _, row in puuid_df.iterrows():
-        summ_id = row['summ_id']
-        
-        for queue_name, (current_df, previous_df) in queue_data.items():
-            changes = process_queue_changes(summ_id, current_df, previous_df, queue_name)
-            all_changes.extend(changes)
+    all_changes = diff_queues(puuid_df, queue_data)
     
     logger.info(f"Found {len(all_changes)} ELO changes")
     return all_changes
@@ -397,31 +567,9 @@ def track_elo_changes() -> List[Dict[str, any]]:
 def fetch_winrate()-> Tuple[List[Dict[str, any]], List[Dict[str, any]]]:
     wr_solo = []
     wr_flex = []
-    with engine.connect() as connection:
-        query:str = """
-        WITH latest_scans AS (
-            SELECT
-                p.summ_id,
-                eh.queue_type,
-                eh.tier,
-                eh.rank,
-                eh.league_points,
-                eh.wins,
-                eh.losses,
-                eh.timestamp,
-                ROW_NUMBER() OVER (
-                    PARTITION BY eh.player_key, eh.queue_type
-                    ORDER BY eh.timestamp DESC
-                ) AS scan_number
-            FROM public.elo_history eh
-            JOIN public.players p
-                ON eh.player_key = p.id
-        ),
-        filtered_scans AS (
-            SELECT *
-            FROM latest_scans
-            WHERE scan_number = 1
-        )
+    with config.get_engine().connect() as connection:
+        query:str = f"""
+        WITH filtered_scans AS ({latest_scans_sql(1)})
         SELECT
             summ_id,
             queue_type,
@@ -595,13 +743,16 @@ def main()->None:
         file_path = os.path.join(daily_dir, filename)
         
         try:
-            write_snapshot(file_path, latest_path, {
+            if write_snapshot(file_path, latest_path, {
                 "message": message,
                 "timestamp": timestamp,
+                "run_id": metrics.run_id(),
                 "changes": python_changes,
                 "top_changes": python_top_changes
-            })
-            logger.info(f"ELO changes saved to {file_path} and mirrored to latest.json")
+            }):
+                logger.info(f"ELO changes saved to {file_path} and mirrored to latest.json")
+            else:
+                logger.info("ELO changes unchanged; refreshed latest.json timestamp")
         except Exception as e:
             logger.error(f"Failed to save ELO changes data: {e}", exc_info=True)
     else:
@@ -617,12 +768,14 @@ def main()->None:
         file_path = os.path.join(daily_dir, filename)
         
         try:
-            write_snapshot(file_path, latest_path, {
+            if write_snapshot(file_path, latest_path, {
                 "message": message,
                 "timestamp": timestamp,
                 "changes": wr_solo
-            })
-            logger.info(f"Solo winrate saved to {file_path} and mirrored to latest.json")
+            }):
+                logger.info(f"Solo winrate saved to {file_path} and mirrored to latest.json")
+            else:
+                logger.info("Solo winrate unchanged; refreshed latest.json timestamp")
         except Exception as e:
             logger.error(f"Failed to save solo winrate data: {e}", exc_info=True)
     else:
@@ -639,12 +792,14 @@ def main()->None:
         file_path = os.path.join(daily_dir, filename)
         
         try:
-            write_snapshot(file_path, latest_path, {
+            if write_snapshot(file_path, latest_path, {
                 "message": message,
                 "timestamp": timestamp,
                 "changes": wr_flex
-            })
-            logger.info(f"Flex winrate saved to {file_path} and mirrored to latest.json")
+            }):
+                logger.info(f"Flex winrate saved to {file_path} and mirrored to latest.json")
+            else:
+                logger.info("Flex winrate unchanged; refreshed latest.json timestamp")
         except Exception as e:
             logger.error(f"Failed to save flex winrate data: {e}", exc_info=True)
     else:
@@ -1,20 +1,33 @@
+import hashlib
+import json
+import os
 import unicodedata
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
 
 import pandas as pd
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from sqlalchemy import text
 
 import config
+from bulk_load import copy_rows
 from logger_config import setup_logger
 
 logger = setup_logger(__name__, 'fetch_google_forms_data.log')
 
-engine = config.get_engine()  # requires the Postgres container to be running
+
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+
+# A cached token this close to expiry is refreshed instead of reused.
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
 
 
 def test_network_connectivity() -> None:
-    """Test if we can reach Google's servers with proper SSL context"""
+    """Test if we can reach Google's servers with proper SSL context.
+
+    Three raw TLS round trips, so only run when a fetch has failed or
+    GOOGLE_CONNECTIVITY_CHECK asks for it -- not on every run.
+    """
     logger.info("Testing network connectivity to Google services")
     import socket
     import ssl
@@ -71,10 +84,52 @@ def normalize_riot_component(value) -> str:
     return value.replace('#', '').strip()
 
 
-def fetch_google_sheet_data(range_name: str = None) -> pd.DataFrame:
-    """Read form responses from the Google Sheet into a normalised DataFrame."""
-    range_name = range_name or config.GOOGLE_SHEET_RANGE
-    sheet_id = config.google_sheet_id()
+def _utcnow() -> datetime:
+    # google-auth keeps credential expiry as naive UTC.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def load_cached_token(creds, path: Optional[Path] = None) -> bool:
+    """Give `creds` the cached access token if it belongs to the same service
+    account and is not about to expire. Returns whether it did."""
+    path = path or config.GOOGLE_TOKEN_CACHE_PATH
+    try:
+        cached = json.loads(path.read_text(encoding="utf-8"))
+        if cached["client_email"] != creds.service_account_email:
+            return False
+        expiry = datetime.fromisoformat(cached["expiry"])
+        token = cached["token"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    if expiry - TOKEN_EXPIRY_MARGIN <= _utcnow():
+        return False
+    creds.token = token
+    creds.expiry = expiry
+    return True
+
+
+def save_token(creds, path: Optional[Path] = None) -> None:
+    """Cache `creds`' access token, readable by this user only."""
+    path = path or config.GOOGLE_TOKEN_CACHE_PATH
+    payload = json.dumps({
+        "client_email": creds.service_account_email,
+        "token": creds.token,
+        "expiry": creds.expiry.isoformat(),
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        handle.write(payload)
+    os.replace(tmp, path)
+
+
+def google_credentials():
+    """Service-account credentials holding a valid access token.
+
+    A token lasts an hour and the pipeline runs hourly, so most runs reuse the
+    cached one rather than signing a fresh JWT and exchanging it.
+    """
     credentials_path = config.GOOGLE_CREDENTIALS_PATH
 
     if not credentials_path.exists():
@@ -88,22 +143,54 @@ def fetch_google_sheet_data(range_name: str = None) -> pd.DataFrame:
             f"5. Save the file as 'credentials.json' at: {credentials_path.parent}"
         )
 
+    # Imported here rather than at the top: the google packages are the slowest
+    # imports in the pipeline, and nothing else in this module needs them.
+    from google.oauth2 import service_account
+
     creds = service_account.Credentials.from_service_account_file(
-        str(credentials_path),
-        scopes=['https://www.googleapis.com/auth/spreadsheets.readonly'],
+        str(credentials_path), scopes=SHEETS_SCOPES,
     )
-    service = build('sheets', 'v4', credentials=creds,
-                    cache_discovery=False, static_discovery=False)
+    if not load_cached_token(creds):
+        from google.auth.transport.requests import Request
 
-    result = service.spreadsheets().values().get(
-        spreadsheetId=sheet_id, range=range_name
-    ).execute()
-    values = result.get('values', [])
+        creds.refresh(Request())
+        try:
+            save_token(creds)
+        except OSError as e:
+            logger.warning(f"Could not cache the Google access token: {e}")
+    return creds
+
+
+def sheets_service(creds=None):
+    """An authorised Sheets v4 client.
+
+    Built from the discovery document bundled with googleapiclient rather than
+    one downloaded on every run.
+    """
+    from googleapiclient.discovery import build
 
-    if not values:
+    return build('sheets', 'v4', credentials=creds or google_credentials(),
+                 cache_discovery=False, static_discovery=True)
+
+
+def sheet_timestamps_to_utc(values: pd.Series) -> pd.Series:
+    """Parse the sheet's Timestamp column, which is wall-clock time in
+    SHEET_TIMEZONE, into naive UTC to match the database's TIMESTAMP columns.
+    Unparseable or non-existent local times become NaT."""
+    parsed = pd.to_datetime(values, errors='coerce')
+    return (
+        parsed.dt.tz_localize(config.SHEET_TIMEZONE, ambiguous='NaT', nonexistent='NaT')
+        .dt.tz_convert('UTC')
+        .dt.tz_localize(None)
+    )
+
+
+def responses_frame(header: List[str], rows: List[List[str]]) -> pd.DataFrame:
+    """Turn raw sheet rows into a normalised DataFrame of form responses."""
+    if not rows:
         return pd.DataFrame()
 
-    df = pd.DataFrame(values[1:], columns=values[0])
+    df = pd.DataFrame(rows, columns=header)
     df.rename(columns={
         'Timestamp': 'registered_at',
         "Tag line (e.g #EUW) ": "player_tag",
@@ -111,7 +198,7 @@ def fetch_google_sheet_data(range_name: str = None) -> pd.DataFrame:
         "Region": "region",
     }, inplace=True)
 
-    df['registered_at'] = pd.to_datetime(df['registered_at'], errors='coerce')
+    df['registered_at'] = sheet_timestamps_to_utc(df['registered_at'])
     df['summ_id'] = df['summ_id'].map(normalize_riot_component)
     df['player_tag'] = df['player_tag'].map(normalize_riot_component)
 
@@ -122,50 +209,295 @@ def fetch_google_sheet_data(range_name: str = None) -> pd.DataFrame:
     return df.sort_values('registered_at')
 
 
-def upsert_players(df: pd.DataFrame) -> int:
+# --- Incremental ingestion ----------------------------------------------------
+# Form responses are only ever appended, so the stage remembers how many data
+# rows it has ingested and asks the sheet for the rows after them. Alongside
+# the header and the new rows it re-reads the last row it ingested: if that row
+# is gone or no longer hashes the same, rows were deleted or edited above the
+# cursor and the stage reads the whole sheet again. Edits further up cannot be
+# seen that way, so a full read also happens every SHEET_FULL_RESYNC_HOURS.
+
+class SheetCursor(NamedTuple):
+    rows_ingested: int
+    last_row_hash: Optional[str]
+    last_full_sync_at: datetime
+
+
+def row_hash(row: List[str]) -> str:
+    return hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()
+
+
+def split_range(range_name: str) -> Tuple[str, str, str]:
+    """'Form Responses 1!A:D' -> ('Form Responses 1', 'A', 'D')."""
+    sheet, _, cells = range_name.rpartition('!')
+    first, _, last = cells.partition(':')
+    return sheet, first.rstrip('0123456789'), (last or first).rstrip('0123456789')
+
+
+def _a1(sheet: str, first: str, last: str, start: int, end: Optional[int] = None) -> str:
+    quoted = "'" + sheet.replace("'", "''") + "'"
+    return f"{quoted}!{first}{start}:{last}{'' if end is None else end}"
+
+
+class IngestedContent(NamedTuple):
+    """What the responses ingested so far hashed to, once normalised."""
+    fingerprint: Optional[str]
+    row_hashes: FrozenSet[str]
+
+
+NOTHING_INGESTED = IngestedContent(None, frozenset())
+
+
+def load_state(source: str) -> Tuple[Optional[SheetCursor], IngestedContent]:
+    with config.get_engine().connect() as connection:
+        row = connection.execute(
+            text("""
+                SELECT rows_ingested, last_row_hash, last_full_sync_at,
+                       fingerprint, row_hashes
+                FROM public.sheet_ingest_state
+                WHERE source = :source
+            """),
+            {"source": source},
+        ).first()
+    if row is None:
+        return None, NOTHING_INGESTED
+    return SheetCursor(*row[:3]), IngestedContent(row[3], frozenset(row[4] or ()))
+
+
+def save_state(connection, source: str, cursor: SheetCursor, content: IngestedContent) -> None:
+    connection.execute(
+        text("""
+            INSERT INTO public.sheet_ingest_state (
+                source, rows_ingested, last_row_hash, last_full_sync_at,
+                fingerprint, row_hashes, updated_at
+            )
+            VALUES (
+                :source, :rows_ingested, :last_row_hash, :last_full_sync_at,
+                :fingerprint, :row_hashes, now()
+            )
+            ON CONFLICT (source) DO UPDATE
+            SET rows_ingested = EXCLUDED.rows_ingested,
+                last_row_hash = EXCLUDED.last_row_hash,
+                last_full_sync_at = EXCLUDED.last_full_sync_at,
+                fingerprint = EXCLUDED.fingerprint,
+                row_hashes = EXCLUDED.row_hashes,
+                updated_at = EXCLUDED.updated_at
+        """),
+        {
+            "source": source,
+            **cursor._asdict(),
+            "fingerprint": content.fingerprint,
+            "row_hashes": sorted(content.row_hashes),
+        },
+    )
+
+
+def _full_sync(values: List[List[str]], now: datetime) -> Tuple[pd.DataFrame, SheetCursor]:
+    rows = values[1:]
+    cursor = SheetCursor(len(rows), row_hash(rows[-1]) if rows else None, now)
+    return (responses_frame(values[0], rows) if values else pd.DataFrame()), cursor
+
+
+def fetch_new_responses(
+    cursor: Optional[SheetCursor],
+    range_name: str = None,
+    service=None,
+    now: Optional[datetime] = None,
+) -> Tuple[pd.DataFrame, SheetCursor]:
+    """Form responses added since `cursor`, and the cursor to store after them.
+
+    Falls back to reading the whole sheet when there is no cursor, a full
+    resync is due, or the sheet changed above the cursor.
+    """
+    range_name = range_name or config.GOOGLE_SHEET_RANGE
+    service = service or sheets_service()
+    now = now or datetime.now()
+    values_api = service.spreadsheets().values()
+    sheet_id = config.google_sheet_id()
+
+    def full_read():
+        result = values_api.get(spreadsheetId=sheet_id, range=range_name).execute()
+        return _full_sync(result.get('values', []), now)
+
+    resync_after = timedelta(hours=config.SHEET_FULL_RESYNC_HOURS)
+    if cursor is None or cursor.rows_ingested == 0 or now - cursor.last_full_sync_at >= resync_after:
+        logger.info("Reading the whole sheet")
+        return full_read()
+
+    sheet, first, last = split_range(range_name)
+    # Row 1 is the header, so data row n is sheet row n + 1.
+    last_row = cursor.rows_ingested + 1
+    result = values_api.batchGet(
+        spreadsheetId=sheet_id,
+        ranges=[
+            _a1(sheet, first, last, 1, 1),
+            _a1(sheet, first, last, last_row, last_row),
+            _a1(sheet, first, last, last_row + 1),
+        ],
+    ).execute()
+    header, previous, new_rows = (
+        value_range.get('values', []) for value_range in result.get('valueRanges', [])
+    )
+
+    if not header or not previous or row_hash(previous[0]) != cursor.last_row_hash:
+        logger.info("Sheet changed above the stored cursor; reading the whole sheet")
+        return full_read()
+
+    if not new_rows:
+        return pd.DataFrame(), cursor
+    logger.info(f"Fetched {len(new_rows)} new sheet rows after row {last_row}")
+    advanced = cursor._replace(
+        rows_ingested=cursor.rows_ingested + len(new_rows),
+        last_row_hash=row_hash(new_rows[-1]),
+    )
+    return responses_frame(header[0], new_rows), advanced
+
+
+# --- Content fingerprint ---------------------------------------------------------
+# Each normalised response hashes to a short digest, and the sheet's fingerprint
+# is the hash of the set of them. A full read whose fingerprint matches the last
+# one changes nothing and never touches players; otherwise only responses whose
+# digest has not been ingested before are sent.
+
+RESPONSE_COLUMNS = ('summ_id', 'player_tag', 'region', 'registered_at')
+
+
+def response_hashes(df: pd.DataFrame) -> pd.Series:
+    """A digest per normalised response, aligned with `df`'s index."""
+    def digest(row) -> str:
+        fields = (
+            '' if pd.isna(row[column]) else
+            row[column].isoformat() if column == 'registered_at' else str(row[column])
+            for column in RESPONSE_COLUMNS
+        )
+        return hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=8).hexdigest()
+
+    if df.empty:
+        return pd.Series(dtype=object)
+    return df.apply(digest, axis=1)
+
+
+def content_fingerprint(row_hashes: FrozenSet[str]) -> Optional[str]:
+    if not row_hashes:
+        return None
+    return hashlib.sha1("\n".join(sorted(row_hashes)).encode("utf-8")).hexdigest()
+
+
+def changed_responses(
+    df: pd.DataFrame, previous: IngestedContent, full_read: bool
+) -> Tuple[pd.DataFrame, IngestedContent]:
+    """The responses in `df` not ingested before, and the content to store after.
+
+    A full read replaces the stored hashes, so deleted responses drop out of
+    them; new rows read past the cursor add to them.
+    """
+    hashes = response_hashes(df)
+    current = frozenset(hashes)
+    if not full_read:
+        current |= previous.row_hashes
+    content = IngestedContent(content_fingerprint(current), current)
+    if content.fingerprint == previous.fingerprint:
+        return df.iloc[0:0], previous
+    return df[~hashes.isin(previous.row_hashes)] if not df.empty else df, content
+
+
+def upsert_players(df: pd.DataFrame, connection) -> int:
     """Insert any player not already registered. Returns the number added.
 
     Keyed on the Riot ID rather than sheet position, so re-ordering or deleting
-    rows in the sheet can no longer reassign a player's ELO history.
+    rows in the sheet can no longer reassign a player's ELO history. The
+    responses are COPYed into a temporary table and merged in one statement;
+    when someone registered twice, the earliest response wins.
     """
     if df.empty:
         logger.info("No form responses to load")
         return 0
 
-    statement = text("""
+    connection.execute(text("""
+        CREATE TEMPORARY TABLE sheet_responses (
+            summ_id       TEXT,
+            player_tag    TEXT,
+            region        TEXT,
+            registered_at TIMESTAMP
+        ) ON COMMIT DROP
+    """))
+    copy_rows(
+        connection, "sheet_responses", RESPONSE_COLUMNS,
+        (
+            tuple(None if pd.isna(value) else value for value in row)
+            for row in df[list(RESPONSE_COLUMNS)].itertuples(index=False, name=None)
+        ),
+    )
+    result = connection.execute(text("""
         INSERT INTO public.players (summ_id, player_tag, region, registered_at)
-        VALUES (:summ_id, :player_tag, :region, :registered_at)
+        SELECT DISTINCT ON (lower(summ_id), lower(player_tag))
+               summ_id, player_tag, region, registered_at
+        FROM sheet_responses
+        ORDER BY lower(summ_id), lower(player_tag), registered_at NULLS LAST
         ON CONFLICT (lower(summ_id), lower(player_tag)) DO NOTHING
-    """)
+    """))
+    inserted = result.rowcount if result.rowcount and result.rowcount > 0 else 0
+    invalidate_resolution_attempts(connection)
 
-    records = df[['summ_id', 'player_tag', 'region', 'registered_at']].to_dict('records')
-    for record in records:
-        if pd.isna(record['registered_at']):
-            record['registered_at'] = None
+    logger.info(f"{inserted} new player(s) registered out of {len(df)} changed responses")
+    return inserted
 
-    with engine.begin() as connection:
-        result = connection.execute(statement, records)
-        inserted = result.rowcount if result.rowcount and result.rowcount > 0 else 0
 
-    logger.info(f"{inserted} new player(s) registered out of {len(records)} responses")
-    return inserted
+def invalidate_resolution_attempts(connection) -> None:
+    """Forget failed puuid lookups for players whose form response changed since.
+
+    Editing a response moves its timestamp forward, so a response newer than a
+    player's last failed lookup means they may have corrected something, and
+    generate_puuid should try them again this run rather than wait out the
+    backoff. A changed Riot ID registers a new player anyway.
+
+    Both sides are naive UTC -- registered_at via sheet_timestamps_to_utc,
+    last_attempt_at as generate_puuid records it -- so the comparison does not
+    depend on the session's or the server's time zone.
+    """
+    connection.execute(text("""
+        DELETE FROM public.puuid_resolution_attempts a
+        USING public.players p, sheet_responses sheet
+        WHERE a.player_key = p.id
+          AND lower(p.summ_id) = lower(sheet.summ_id)
+          AND lower(p.player_tag) = lower(sheet.player_tag)
+          AND a.last_attempt_at < sheet.registered_at
+    """))
 
 
 def main():
     logger.info("Starting Google Forms data fetch process")
-    df = fetch_google_sheet_data()
-    if df.empty:
-        logger.warning("No data was fetched from Google Sheets")
+    if config.GOOGLE_CONNECTIVITY_CHECK:
+        test_network_connectivity()
+
+    source = f"{config.google_sheet_id()}/{config.GOOGLE_SHEET_RANGE}"
+    previous, ingested = load_state(source)
+    try:
+        df, cursor = fetch_new_responses(previous)
+    except Exception:
+        # The diagnostics are for explaining a failure, so run them then.
+        if not config.GOOGLE_CONNECTIVITY_CHECK:
+            logger.info("Sheet fetch failed; checking connectivity to Google")
+            test_network_connectivity()
+        raise
+
+    full_read = previous is None or cursor.last_full_sync_at != previous.last_full_sync_at
+    changed, content = changed_responses(df, ingested, full_read)
+    if cursor == previous and content == ingested:
+        logger.info("No new form responses")
         return
 
-    logger.info(f"Fetched {len(df)} valid entries from Google Sheets")
-    upsert_players(df)
+    logger.info(f"{len(changed)} of {len(df)} fetched responses are new or changed")
+    # One transaction, so the stored state never runs ahead of the players
+    # table: a run that fails part-way reads the same rows again.
+    with config.get_engine().begin() as connection:
+        upsert_players(changed, connection)
+        save_state(connection, source, cursor, content)
     logger.info("Google Forms data fetch process completed")
 
 
 if __name__ == "__main__":
     try:
-        test_network_connectivity()
         main()
     except Exception as e:
         logger.error(f"Unhandled exception in main: {e}", exc_info=True)
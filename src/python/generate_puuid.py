@@ -1,5 +1,6 @@
-import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import requests
@@ -8,96 +9,295 @@ from sqlalchemy.exc import IntegrityError
 
 import config
 from logger_config import setup_logger
+from riot_client import get_client
 
 logger = setup_logger(__name__, 'generate_puuid.log')
 
-engine = config.get_engine()
+ACCOUNT_METHOD = "account-v1.accounts.by-riot-id"
 
+# Outcomes of one account-v1 lookup, as stored in puuid_resolution_attempts.
+RESOLVED = "resolved"
+NOT_FOUND = "not_found"
+LOOKUP_ERROR = "error"
 
-def fetch_players_without_puuid() -> pd.DataFrame:
-    """Players registered via the form that still need a puuid resolved."""
-    query = """
-    SELECT id, summ_id, player_tag
-    FROM public.players
-    WHERE puuid IS NULL
-    ORDER BY id
+
+def _utcnow() -> datetime:
+    # puuid_resolution_attempts holds naive UTC, as registered_at does.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def fetch_players_without_puuid(now: Optional[datetime] = None) -> pd.DataFrame:
+    """Players registered via the form that still need a puuid resolved, and are
+    due a lookup.
+
+    `attempts` is how many lookups of the player's current Riot ID have come
+    back not found in a row. An attempt recorded against a different Riot ID no
+    longer counts.
     """
-    with engine.connect() as connection:
-        return pd.read_sql(query, connection, index_col='id')
+    query = text("""
+    SELECT p.id, p.summ_id, p.player_tag, COALESCE(a.attempts, 0) AS attempts
+    FROM public.players p
+    LEFT JOIN public.puuid_resolution_attempts a
+      ON a.player_key = p.id
+     AND a.summ_id = p.summ_id
+     AND a.player_tag = p.player_tag
+    WHERE p.puuid IS NULL
+      AND (a.player_key IS NULL OR a.next_attempt_at <= :now)
+    ORDER BY p.id
+    """)
+    with config.get_engine().connect() as connection:
+        return pd.read_sql(query, connection, index_col='id',
+                           params={"now": now or _utcnow()})
+
+
+def retry_delay(status: str, attempts: int) -> timedelta:
+    """How long to wait before looking a Riot ID up again after `attempts`
+    consecutive failures, the latest with `status`.
+
+    Only a 404 backs off: Riot does not know the ID, and asking again next hour
+    will not change that. A 5xx or network error says nothing about the ID, so
+    it is retried on the next run.
+    """
+    if status != NOT_FOUND:
+        return timedelta(0)
+    hours = config.PUUID_RETRY_BASE_HOURS * 2 ** max(attempts - 1, 0)
+    return timedelta(hours=min(hours, config.PUUID_RETRY_MAX_HOURS))
+
+
+def record_failed_attempts(
+    df: pd.DataFrame, failures: Dict[int, str], now: Optional[datetime] = None
+) -> None:
+    """Remember each failed lookup and when the Riot ID is next due.
+
+    Only a not-found counts as an attempt. A lookup error says nothing about
+    the Riot ID, so it is recorded without adding to the count, and does not
+    lengthen the next not-found's backoff.
+    """
+    if not failures:
+        return
+    now = now or _utcnow()
+    records = []
+    for player_key, status in failures.items():
+        row = df.loc[player_key]
+        attempts = int(row['attempts']) + (status == NOT_FOUND)
+        records.append({
+            "player_key": int(player_key),
+            "summ_id": row['summ_id'],
+            "player_tag": row['player_tag'],
+            "status": status,
+            "attempts": attempts,
+            "last_attempt_at": now,
+            "next_attempt_at": now + retry_delay(status, attempts),
+        })
+    with config.get_engine().begin() as connection:
+        connection.execute(
+            text("""
+                INSERT INTO public.puuid_resolution_attempts (
+                    player_key, summ_id, player_tag, status, attempts,
+                    last_attempt_at, next_attempt_at
+                )
+                VALUES (
+                    :player_key, :summ_id, :player_tag, :status, :attempts,
+                    :last_attempt_at, :next_attempt_at
+                )
+                ON CONFLICT (player_key) DO UPDATE
+                SET summ_id = EXCLUDED.summ_id,
+                    player_tag = EXCLUDED.player_tag,
+                    status = EXCLUDED.status,
+                    attempts = EXCLUDED.attempts,
+                    last_attempt_at = EXCLUDED.last_attempt_at,
+                    next_attempt_at = EXCLUDED.next_attempt_at
+            """),
+            records,
+        )
+
+
+def forget_attempts(player_keys: List[int]) -> None:
+    """Drop the attempt history of players who now have a puuid."""
+    if not player_keys:
+        return
+    with config.get_engine().begin() as connection:
+        connection.execute(
+            text("DELETE FROM public.puuid_resolution_attempts WHERE player_key = ANY(:keys)"),
+            {"keys": [int(key) for key in player_keys]},
+        )
 
 
 def set_puuid(player_key: int, puuid: str) -> None:
     """Store a resolved puuid against a player."""
-    with engine.begin() as connection:
+    with config.get_engine().begin() as connection:
         connection.execute(
             text("UPDATE public.players SET puuid = :puuid WHERE id = :id"),
             {"puuid": puuid, "id": player_key},
         )
 
 
-def get_puuid_from_riot(summoner_name: str, tag: str) -> Optional[str]:
-    """Resolve a Riot ID (name#tag) to a puuid via account-v1."""
+def fetch_puuid_owners(puuids: List[str]) -> Dict[str, int]:
+    """puuid -> players.id, for any of `puuids` already stored against a player."""
+    if not puuids:
+        return {}
+    with config.get_engine().connect() as connection:
+        result = connection.execute(
+            text("SELECT puuid, id FROM public.players WHERE puuid = ANY(:puuids)"),
+            {"puuids": list(puuids)},
+        )
+        return {puuid: player_key for puuid, player_key in result}
+
+
+def split_conflicts(
+    resolved: Dict[int, str], owners: Dict[str, int]
+) -> Tuple[Dict[int, str], List[int]]:
+    """Split resolved puuids into those safe to write and the player keys that
+    would break players.puuid's uniqueness.
+
+    A puuid owned by another row conflicts, and so does a puuid two rows in the
+    batch both resolved to: the lower player key keeps it, as it would have
+    when rows were written one at a time in id order.
+    """
+    to_write: Dict[int, str] = {}
+    conflicts: List[int] = []
+    claimed = dict(owners)
+    for player_key in sorted(resolved):
+        puuid = resolved[player_key]
+        owner = claimed.setdefault(puuid, player_key)
+        if owner != player_key:
+            conflicts.append(player_key)
+        else:
+            to_write[player_key] = puuid
+    return to_write, conflicts
+
+
+def set_puuids(resolved: Dict[int, str]) -> None:
+    """Store several resolved puuids in one UPDATE ... FROM (VALUES ...)."""
+    if not resolved:
+        return
+    values = ", ".join(
+        f"(CAST(:id_{i} AS INTEGER), :puuid_{i})" for i in range(len(resolved))
+    )
+    params = {}
+    for i, (player_key, puuid) in enumerate(resolved.items()):
+        params[f"id_{i}"] = int(player_key)
+        params[f"puuid_{i}"] = puuid
+    with config.get_engine().begin() as connection:
+        connection.execute(
+            text(f"""
+                UPDATE public.players AS p
+                SET puuid = resolved.puuid
+                FROM (VALUES {values}) AS resolved (id, puuid)
+                WHERE p.id = resolved.id
+            """),
+            params,
+        )
+
+
+def get_puuid_from_riot(summoner_name: str, tag: str) -> Tuple[Optional[str], str]:
+    """Resolve a Riot ID (name#tag) to a puuid via account-v1.
+
+    Returns (puuid, status); puuid is None unless status is RESOLVED.
+    """
     url = (
         f"{config.RIOT_ACCOUNT_BASE_URL}/riot/account/v1/accounts/by-riot-id/"
         f"{requests.utils.quote(summoner_name)}/{requests.utils.quote(tag)}"
     )
 
     try:
-        response = requests.get(url, headers=config.riot_headers(), timeout=10)
+        response = get_client().get(url, ACCOUNT_METHOD)
         if response.status_code == 200:
-            return response.json().get("puuid")
+            puuid = response.json().get("puuid")
+            return (puuid, RESOLVED) if puuid else (None, LOOKUP_ERROR)
         if response.status_code == 404:
             logger.warning(f"No Riot account found for {summoner_name}#{tag}")
-        else:
-            logger.error(
-                f"API error for {summoner_name}#{tag}: "
-                f"{response.status_code} - {response.text[:200]}"
-            )
+            return None, NOT_FOUND
+        logger.error(
+            f"API error for {summoner_name}#{tag}: "
+            f"{response.status_code} - {response.text[:200]}"
+        )
     except requests.RequestException as e:
         logger.error(f"Request failed for {summoner_name}#{tag}: {e}")
 
-    return None
+    return None, LOOKUP_ERROR
+
+
+def resolve_puuids(
+    df: pd.DataFrame, concurrency: Optional[int] = None
+) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """Look up every Riot ID in `df` concurrently.
+
+    Returns player key -> puuid for those that resolved, and player key ->
+    status for those that did not.
+
+    The threads share riot_client's rate limiter, so concurrency only decides
+    how many lookups wait on the network at once, not how fast they are sent.
+    """
+    concurrency = max(1, concurrency or config.PUUID_CONCURRENCY)
+    players = list(df.iterrows())
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(get_puuid_from_riot, row['summ_id'], row['player_tag'])
+            for _, row in players
+        ]
+        lookups = [future.result() for future in futures]
+
+    resolved: Dict[int, str] = {}
+    failures: Dict[int, str] = {}
+    for (player_key, row), (puuid, status) in zip(players, lookups):
+        if status != RESOLVED:
+            logger.warning(f"Could not resolve {row['summ_id']}#{row['player_tag']}")
+            failures[player_key] = status
+            continue
+        resolved[player_key] = puuid
+    return resolved, failures
+
+
+def report_conflict(riot_id: str, player_key: int) -> None:
+    # The puuid is already claimed by another players row, i.e. this is the
+    # same human registered twice under Riot IDs that differ only by
+    # characters Riot ignores, or under a since-changed name. Leave the row
+    # unresolved and report it -- merging is sql/migrations/002's job, not
+    # something to do silently mid-run.
+    logger.error(
+        f"{riot_id} resolves to a puuid already owned by another player "
+        f"(players.id={player_key} left unresolved). Run "
+        f"sql/migrations/002_normalize_and_merge_players.sql to merge."
+    )
 
 
 def process_players() -> int:
     """Resolve and persist puuids for everyone missing one. Returns the count updated."""
     df = fetch_players_without_puuid()
     if df.empty:
-        logger.info("All players already have a puuid")
+        logger.info("No players need a puuid lookup this run")
         return 0
 
     logger.info(f"Resolving puuids for {len(df)} players")
-    updated_count = 0
-
-    for player_key, row in df.iterrows():
-        riot_id = f"{row['summ_id']}#{row['player_tag']}"
-        puuid = get_puuid_from_riot(row['summ_id'], row['player_tag'])
-
-        if not puuid:
-            logger.warning(f"Could not resolve {riot_id}")
-            time.sleep(0.1)
-            continue
+    resolved, failures = resolve_puuids(df)
+    record_failed_attempts(df, failures)
+    riot_ids = {key: f"{row['summ_id']}#{row['player_tag']}" for key, row in df.iterrows()}
 
-        try:
-            set_puuid(player_key, puuid)
-        except IntegrityError:
-            # The puuid is already claimed by another players row, i.e. this is
-            # the same human registered twice under Riot IDs that differ only by
-            # characters Riot ignores, or under a since-changed name. Leave the
-            # row unresolved and report it -- merging is sql/migrations/002's job,
-            # not something to do silently mid-run.
-            logger.error(
-                f"{riot_id} resolves to a puuid already owned by another player "
-                f"(players.id={player_key} left unresolved). Run "
-                f"sql/migrations/002_normalize_and_merge_players.sql to merge."
-            )
-        else:
-            updated_count += 1
-            logger.info(f"Resolved puuid for {riot_id}")
+    to_write, conflicts = split_conflicts(resolved, fetch_puuid_owners(list(resolved.values())))
+    for player_key in conflicts:
+        report_conflict(riot_ids[player_key], player_key)
 
-        time.sleep(0.1)
+    try:
+        set_puuids(to_write)
+        written = list(to_write)
+    except IntegrityError:
+        # Someone claimed one of these puuids between the check and the write.
+        # Fall back to one transaction per row so only that row is refused.
+        logger.warning("Batched puuid update conflicted; retrying row by row")
+        written = []
+        for player_key, puuid in to_write.items():
+            try:
+                set_puuid(player_key, puuid)
+            except IntegrityError:
+                report_conflict(riot_ids[player_key], player_key)
+            else:
+                written.append(player_key)
 
-    return updated_count
+    forget_attempts(written)
+    for player_key in written:
+        logger.info(f"Resolved puuid for {riot_ids[player_key]}")
+    return len(written)
 
 
 def main():
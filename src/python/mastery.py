@@ -1,102 +1,268 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import List, NamedTuple, Optional
+
 import pandas as pd
+from sqlalchemy import text
 
 import config
+from bulk_load import copy_records, quote_identifier
 from logger_config import setup_logger
+from riot_client import RiotClient, get_client
 
 logger = setup_logger(__name__, 'mastery.log')
 
-engine = config.get_engine()
+MASTERY_METHOD = "champion-mastery-v4.top-by-puuid"
+
+MASTERY_COLUMNS = (
+    'puuid', 'championId', 'championLevel', 'championPoints', 'lastPlayTime',
+    'championPointsSinceLastLevel', 'championPointsUntilNextLevel',
+    'markRequiredForNextLevel', 'tokensEarned', 'championSeasonMilestone',
+)
+
+
+class MasteryFetch(NamedTuple):
+    """One run's fetch: the rows, every player whose fetch succeeded --
+    including those Riot returned no masteries for -- and how many players
+    were asked about."""
+    rows: List[dict]
+    puuids: List[str]
+    requested: int = 0
+
+
+def next_slice(connection, slices: Optional[int] = None) -> int:
+    """Which slice of the roster is due: the one after the last one finished.
+
+    The cursor lives in mastery_slice_state rather than being derived from the
+    clock, so a missed or repeated hourly run neither skips a slice nor
+    refreshes one twice. Needs sql/migrations/012.
+    """
+    slices = max(1, slices or config.MASTERY_SLICES)
+    row = connection.execute(
+        text("SELECT next_slice FROM public.mastery_slice_state WHERE slices = :slices"),
+        {"slices": slices},
+    ).first()
+    return 0 if row is None else row[0] % slices
+
 
-def fetch_puuid(db_connection: object) -> pd.DataFrame:
+def advance_slice(connection, slice_index: int, slices: Optional[int] = None) -> None:
+    """Record `slice_index` as finished, so the next run takes the one after."""
+    slices = max(1, slices or config.MASTERY_SLICES)
+    connection.execute(
+        text("""
+            INSERT INTO public.mastery_slice_state (slices, next_slice, updated_at)
+            VALUES (:slices, :next_slice, now())
+            ON CONFLICT (slices) DO UPDATE
+            SET next_slice = EXCLUDED.next_slice,
+                updated_at = EXCLUDED.updated_at
+        """),
+        {"slices": slices, "next_slice": (slice_index + 1) % slices},
+    )
+
+
+def fetch_puuid(
+    db_connection: object,
+    slice_index: Optional[int] = None,
+    slices: Optional[int] = None,
+) -> pd.DataFrame:
+    """Players with a puuid; only those in `slice_index` of `slices` when given."""
     logger.info("Fetching PUUID data from database")
+    query = "SELECT id, puuid FROM public.players WHERE puuid IS NOT NULL"
+    params = {}
+    if slice_index is not None:
+        query += " AND id % :slices = :slice_index"
+        params = {"slices": max(1, slices or config.MASTERY_SLICES), "slice_index": slice_index}
     with db_connection.connect() as connection:
-        df: pd.DataFrame = pd.read_sql(
-            "SELECT id, puuid FROM public.players WHERE puuid IS NOT NULL",
-            connection,
-            index_col='id')
+        df: pd.DataFrame = pd.read_sql(text(query), connection, index_col='id', params=params)
         if df.empty:
             logger.warning("No PUUID data found")
         else:
             logger.info(f"Fetched {len(df)} rows of PUUID data")
         return df
 
-def mastery_check():
+def fetch_player_mastery(client: RiotClient, puuid: str) -> Optional[List[dict]]:
+    """One worker's unit of work: a player's top masteries, or None on failure.
+
+    [] is a real answer -- the player has no masteries -- and clears their rows.
     """
-    Fetches champion mastery data for all PUUIDs in the database.
-    Returns a DataFrame with mastery information or empty DataFrame if no data.
+    url = (
+        f"{config.RIOT_PLATFORM_BASE_URL}"
+        f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top"
+    )
+    try:
+        response = client.get(url, MASTERY_METHOD)
+        if response.status_code == 200:
+            rows = [
+                {
+                    'puuid': item['puuid'],
+                    'championId': item['championId'],
+                    'championLevel': item['championLevel'],
+                    'championPoints': item['championPoints'],
+                    'lastPlayTime': datetime.fromtimestamp(item['lastPlayTime'] / 1000),
+                    'championPointsSinceLastLevel': item['championPointsSinceLastLevel'],
+                    'championPointsUntilNextLevel': item['championPointsUntilNextLevel'],
+                    'markRequiredForNextLevel': item['markRequiredForNextLevel'],
+                    'tokensEarned': item['tokensEarned'],
+                    'championSeasonMilestone': item['championSeasonMilestone']
+                }
+                for item in response.json()
+            ]
+            logger.debug(f"Successfully fetched mastery data for PUUID: {puuid}")
+            return rows
+
+        logger.warning(f"Failed for PUUID: {puuid}, Status code: {response.status_code}")
+        if response.status_code == 429:
+            logger.warning("Still rate limited after waiting out Retry-After")
+        elif response.status_code == 403:
+            logger.warning("Forbidden - check your API key permissions")
+
+    except requests.RequestException as e:
+        logger.error(f"Request failed for PUUID: {puuid}, Error: {e}")
+    except KeyError as e:
+        logger.error(f"Missing expected field in API response for PUUID: {puuid}, Field: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error for PUUID: {puuid}, Error: {e}")
+    return None
+
+def mastery_check(
+    slice_index: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> MasteryFetch:
     """
-    logger.info("Starting champion mastery check")
-    mastery_data = []
+    Fetches champion mastery data for every PUUID in the database, or only
+    for the players in `slice_index` when given.
+    Returns one dict per (puuid, champion), keyed by MASTERY_COLUMNS, along
+    with the players whose fetch succeeded. Both are empty if no data.
 
-    headers = config.riot_headers()
+    Requests run on MASTERY_CONCURRENCY threads through the shared client, so
+    they count against the same rate limiter as the league scan.
+    """
+    logger.info("Starting champion mastery check")
+    concurrency = max(1, concurrency or config.MASTERY_CONCURRENCY)
+    client = get_client()
 
-    puuid_df: pd.DataFrame = fetch_puuid(db_connection=engine)
+    puuid_df: pd.DataFrame = fetch_puuid(db_connection=config.get_engine(), slice_index=slice_index)
     if puuid_df.empty:
         logger.warning("No PUUID data found")
-        return pd.DataFrame()  # Return empty DataFrame consistently
+        return MasteryFetch([], [])
 
-    for idx, row in puuid_df.iterrows():
-        puuid = row['puuid']
-        url = (
-            f"{config.RIOT_PLATFORM_BASE_URL}"
-            f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top"
-        )
-        try:
-            response = requests.get(url, headers=headers)      
-            if response.status_code == 200:
-                data = response.json()
-                
-                for item in data:
-                    mastery_data.append({
-                        'puuid': item['puuid'],
-                        'championId': item['championId'],
-                        'championLevel': item['championLevel'],
-                        'championPoints': item['championPoints'],
-                        'lastPlayTime': datetime.fromtimestamp(item['lastPlayTime'] / 1000),
-                        'championPointsSinceLastLevel': item['championPointsSinceLastLevel'],
-                        'championPointsUntilNextLevel': item['championPointsUntilNextLevel'],
-                        'markRequiredForNextLevel': item['markRequiredForNextLevel'],
-                        'tokensEarned': item['tokensEarned'],
-                        'championSeasonMilestone': item['championSeasonMilestone']
-                    })
-                    
-                logger.debug(f"Successfully fetched mastery data for PUUID: {puuid}")
-                
-            else:
-                logger.warning(f"Failed for PUUID: {puuid}, Status code: {response.status_code}")
-                if response.status_code == 429:
-                    logger.warning("Rate limit exceeded. Consider adding delays between requests")
-                elif response.status_code == 403:
-                    logger.warning("Forbidden - check your API key permissions")
-
-        except requests.RequestException as e:
-            logger.error(f"Request failed for PUUID: {puuid}, Error: {e}")
-        except KeyError as e:
-            logger.error(f"Missing expected field in API response for PUUID: {puuid}, Field: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error for PUUID: {puuid}, Error: {e}")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        fetched = list(zip(
+            puuid_df['puuid'],
+            executor.map(lambda puuid: fetch_player_mastery(client, puuid), puuid_df['puuid']),
+        ))
+    mastery_data = [row for _, rows in fetched if rows for row in rows]
+    puuids = [puuid for puuid, rows in fetched if rows is not None]
 
     if mastery_data:
-        mastery_df = pd.DataFrame(mastery_data)
-        logger.info(f"Mastery data fetched successfully. Total records: {len(mastery_df)}")
-        return mastery_df
+        logger.info(f"Mastery data fetched successfully. Total records: {len(mastery_data)}")
     else:
         logger.warning("No mastery data was successfully fetched")
-        return pd.DataFrame()
+    return MasteryFetch(mastery_data, puuids, len(puuid_df))
+
+def upsert_sql(history: bool) -> str:
+    """Merge fetched_mastery into mastery, returning the rows written.
+
+    A row whose championPoints and lastPlayTime are both unchanged is not
+    rewritten. With `history`, the written rows are also appended to
+    mastery_history in the same statement.
+    """
+    columns = ", ".join(quote_identifier(column) for column in MASTERY_COLUMNS)
+    updates = ", ".join(
+        f"{quote_identifier(column)} = EXCLUDED.{quote_identifier(column)}"
+        for column in MASTERY_COLUMNS[2:]
+    )
+    upsert = f"""
+        INSERT INTO public.mastery ({columns})
+        SELECT {columns} FROM fetched_mastery
+        ON CONFLICT ("puuid", "championId") DO UPDATE
+        SET {updates}
+        WHERE mastery."championPoints" IS DISTINCT FROM EXCLUDED."championPoints"
+           OR mastery."lastPlayTime" IS DISTINCT FROM EXCLUDED."lastPlayTime"
+        RETURNING "puuid", "championId", "championLevel", "championPoints", "lastPlayTime"
+    """
+    if not history:
+        return upsert
+    return f"""
+        WITH written AS ({upsert})
+        INSERT INTO public.mastery_history (
+            "puuid", "championId", recorded_at,
+            "championLevel", "championPoints", "lastPlayTime"
+        )
+        SELECT "puuid", "championId", now(),
+               "championLevel", "championPoints", "lastPlayTime"
+        FROM written
+    """
+
+# Champions a fetched player no longer has in their top masteries. A player
+# fetched with no masteries at all has nothing in fetched_mastery, so every
+# row of theirs goes.
+PRUNE_SQL = """
+    DELETE FROM public.mastery m
+    WHERE m."puuid" = ANY(:puuids)
+      AND NOT EXISTS (
+          SELECT 1 FROM fetched_mastery f
+          WHERE f."puuid" = m."puuid" AND f."championId" = m."championId"
+      )
+"""
+
+def upsert_mastery(
+    rows: List[dict],
+    puuids: Optional[List[str]] = None,
+    history: Optional[bool] = None,
+) -> int:
+    """Write the champions whose mastery changed. Returns how many rows that was.
+
+    `rows` are COPYed into a temporary table and merged into mastery on
+    (puuid, championId) by upsert_sql. `puuids` are the players `rows` are
+    complete for (by default, those that appear in it): any of their champions
+    not in `rows` are removed, so the table keeps matching what Riot returned.
+    Other players are left alone.
+
+    With MASTERY_HISTORY, every written row is also appended to
+    mastery_history. Needs sql/migrations/011.
+    """
+    history = config.MASTERY_HISTORY if history is None else history
+    if puuids is None:
+        puuids = sorted({row['puuid'] for row in rows})
+
+    with config.get_engine().begin() as connection:
+        connection.execute(text("""
+            CREATE TEMPORARY TABLE fetched_mastery
+            (LIKE public.mastery INCLUDING DEFAULTS) ON COMMIT DROP
+        """))
+        copy_records(connection, "fetched_mastery", MASTERY_COLUMNS, rows)
+        written = connection.execute(text(upsert_sql(history))).rowcount
+        connection.execute(text(PRUNE_SQL), {"puuids": list(puuids)})
+    return written
 
 def main():
-    logger.info("Starting mastery data main process")
-    mastery_df = mastery_check()
-    if not mastery_df.empty:
+    """Refresh the next slice of the roster."""
+    with config.get_engine().connect() as connection:
+        slice_index = next_slice(connection)
+    logger.info(
+        f"Starting mastery data main process (slice {slice_index + 1} of {config.MASTERY_SLICES})"
+    )
+    fetch = mastery_check(slice_index=slice_index)
+    if fetch.puuids:
         logger.info("Loading mastery data to database")
-        mastery_df.to_sql(name="mastery", con=engine, if_exists='replace', index=False)
-        logger.debug(f"Sample mastery data:\n{mastery_df.head()}")
-        logger.info("Mastery data loaded successfully into the database")
+        written = upsert_mastery(fetch.rows, fetch.puuids)
+        logger.info(
+            f"Mastery data loaded successfully into the database "
+            f"({written} of {len(fetch.rows)} rows changed)"
+        )
     else:
         logger.warning("No mastery or milestone data to load")
 
+    # Every fetch failing (an expired key, a Riot outage) says nothing about the
+    # slice, so it is taken again next run instead of waiting a full rotation.
+    if fetch.requested and not fetch.puuids:
+        logger.warning(f"Every mastery fetch in slice {slice_index + 1} failed; retrying it next run")
+        return
+    with config.get_engine().begin() as connection:
+        advance_slice(connection, slice_index)
+
 if __name__ == "__main__":
     try:
         main()
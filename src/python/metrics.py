@@ -0,0 +1,204 @@
+"""Structured per-run metrics: counters, latency histograms and stage timings.
+
+Stages and the Riot client record into one process-wide Metrics as they work.
+run_pipeline writes it out once at the end of the run, as JSON under
+data/metrics/ and optionally as a Prometheus textfile for node_exporter's
+textfile collector (METRICS_TEXTFILE). A stage run on its own still records,
+and writes nothing.
+
+Every run has an ID. It comes from PIPELINE_RUN_ID when set, otherwise it is
+generated once and exported to PIPELINE_RUN_ID, so everything in the run --
+including the elo_changes snapshot -- carries the same one.
+"""
+
+import json
+import os
+import threading
+import uuid
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+
+# Upper bounds, in seconds, for Riot request latency. A healthy call is well
+# under 0.5s; the top buckets are there to show timeouts and slow retries.
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_PREFIX = "elo_snitch_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def run_id() -> str:
+    """This run's ID, shared with anything it starts through the environment."""
+    value = os.environ.get(RUN_ID_ENV)
+    if not value:
+        value = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        os.environ[RUN_ID_ENV] = value
+    return value
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, observations <= le) pairs, Prometheus-style."""
+        total, pairs = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append(("+Inf" if bound == float("inf") else f"{bound:g}", total))
+        return pairs
+
+
+class Metrics:
+    """Thread-safe: the Riot client records from elo_check's worker threads."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_at = datetime.now()
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._stages: List[dict] = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(tuple(buckets))
+            histogram.observe(value)
+
+    def record_stage(self, stage: str, seconds: float, exit_code: int) -> None:
+        with self._lock:
+            self._stages.append({"stage": stage, "seconds": round(seconds, 3), "exit_code": exit_code})
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "stages": list(self._stages),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "buckets": dict(histogram.cumulative()),
+                        "sum": round(histogram.sum, 6),
+                        "count": histogram.count,
+                    }
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """The textfile collector format. Everything describes the last run, so
+        counters are exposed as gauges; only latency stays a histogram."""
+        data = self.to_dict()
+        lines: List[str] = []
+        typed = set()
+
+        def sample(family, kind, labels, value, suffix=""):
+            metric = PROMETHEUS_PREFIX + family
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} {kind}")
+                typed.add(metric)
+            rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{metric}{suffix}{{{rendered}}} {value:g}" if rendered else f"{metric}{suffix} {value:g}")
+
+        # The run id is exposed once, not as a label on every sample: a label
+        # that changes every run would start a new series per run per metric.
+        sample("pipeline_run_info", "gauge", {"run_id": data["run_id"]}, 1)
+        sample("last_run_timestamp_seconds", "gauge", {}, self.started_at.timestamp())
+        for stage in data["stages"]:
+            labels = {"stage": stage["stage"]}
+            sample("stage_duration_seconds", "gauge", labels, stage["seconds"])
+            sample("stage_exit_code", "gauge", labels, stage["exit_code"])
+        for counter in data["counters"]:
+            sample(counter["name"], "gauge", counter["labels"], counter["value"])
+        for histogram in data["histograms"]:
+            name, labels = histogram["name"], histogram["labels"]
+            for le, count in histogram["buckets"].items():
+                sample(name, "histogram", {**labels, "le": le}, count, "_bucket")
+            sample(name, "histogram", labels, histogram["sum"], "_sum")
+            sample(name, "histogram", labels, histogram["count"], "_count")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(path: Path, content: str) -> None:
+    # The textfile collector may read at any moment; never let it see half a file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide collector for this run."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics(run_id())
+        return _metrics
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    get_metrics().inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    get_metrics().observe(name, value, **labels)
+
+
+def write_metrics(
+    metrics: Optional[Metrics] = None,
+    directory: Optional[Path] = None,
+    textfile: Optional[str] = None,
+) -> Path:
+    """Write the run's JSON (dated, plus latest.json) and, if configured, the
+    Prometheus textfile. Returns the dated JSON path."""
+    metrics = metrics or get_metrics()
+    directory = Path(directory or config.METRICS_DIR)
+    textfile = textfile or config.METRICS_TEXTFILE
+
+    payload = json.dumps(metrics.to_dict(), indent=2)
+    daily_path = directory / f"{metrics.started_at:%Y-%m-%d}" / f"metrics_{metrics.run_id}.json"
+    _write_atomically(daily_path, payload)
+    _write_atomically(directory / "latest.json", payload)
+    if textfile:
+        _write_atomically(Path(textfile), metrics.to_prometheus())
+    return daily_path
@@ -0,0 +1,153 @@
+"""Client-side limiter for the Riot API, driven by Riot's own response headers.
+
+Every Riot response carries two families of limits: the application limit
+(X-App-Rate-Limit, shared by everything using the key) and a per-endpoint
+method limit (X-Method-Rate-Limit). Each lists one or more "<requests>:<seconds>"
+windows, and the matching *-Count header says how much of each window the key
+has already spent. Reading those instead of hardcoding a sleep lets a scan run
+right up to whatever quota the key actually has -- a dev key and a production
+key differ by two orders of magnitude -- without tripping 429s.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+# What a development key is allowed before Riot has told us otherwise. The first
+# response replaces it with the key's real limits.
+DEFAULT_APP_LIMITS: str = "20:1,100:120"
+
+# Used when a 429 arrives without a Retry-After header.
+DEFAULT_RETRY_AFTER: int = 60
+
+APP_SCOPE: str = "application"
+
+
+def parse_rate_limits(header: Optional[str]) -> List[Tuple[int, int]]:
+    """'20:1,100:120' -> [(20, 1), (100, 120)]. Malformed parts are skipped."""
+    windows: List[Tuple[int, int]] = []
+    if not header:
+        return windows
+    for part in header.split(","):
+        try:
+            requests_allowed, seconds = part.strip().split(":")
+            windows.append((int(requests_allowed), int(seconds)))
+        except ValueError:
+            continue
+    return windows
+
+
+class _Window:
+    """One "<requests>:<seconds>" bucket.
+
+    Refilled all at once when the window elapses rather than trickled back.
+    Riot counts in fixed windows that open on the first request, so a steady
+    refill would let the first window through at nearly twice its limit.
+    """
+
+    def __init__(self, limit: int, seconds: int, now: float):
+        self.limit = limit
+        self.seconds = seconds
+        self.tokens = limit
+        self.opened_at = now
+
+    def refill(self, now: float) -> None:
+        if now - self.opened_at >= self.seconds:
+            self.tokens = self.limit
+            self.opened_at = now
+
+    def wait_time(self, now: float) -> float:
+        self.refill(now)
+        if self.tokens > 0:
+            return 0.0
+        return self.opened_at + self.seconds - now
+
+    def sync(self, used: int, now: float) -> None:
+        """Adopt Riot's count for this window when it is stricter than ours --
+        another process on the same key spends the same quota."""
+        self.refill(now)
+        self.tokens = min(self.tokens, max(self.limit - used, 0))
+
+
+class RateLimiter:
+    """Thread-safe token buckets for the application scope and each method.
+
+    Callers bracket every request with acquire() before and update() after;
+    a 429 goes through penalize() instead, which pauses the scope Riot named
+    for as long as Retry-After asks.
+    """
+
+    def __init__(
+        self,
+        app_limits: str = DEFAULT_APP_LIMITS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._limits: Dict[str, str] = {}
+        self._windows: Dict[str, List[_Window]] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._set_limits(APP_SCOPE, app_limits, clock())
+
+    def acquire(self, method: str) -> None:
+        """Block until both the application and `method` buckets have a token."""
+        scopes = (APP_SCOPE, method)
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = max(self._wait_time(scope, now) for scope in scopes)
+                if wait <= 0:
+                    for scope in scopes:
+                        for window in self._windows.get(scope, ()):
+                            window.tokens -= 1
+                    return
+            self._sleep(wait)
+
+    def update(self, method: str, headers: Mapping[str, str]) -> None:
+        """Reconcile the buckets with the limits and counts Riot reported."""
+        with self._lock:
+            now = self._clock()
+            self._sync(APP_SCOPE, headers.get("X-App-Rate-Limit"),
+                       headers.get("X-App-Rate-Limit-Count"), now)
+            self._sync(method, headers.get("X-Method-Rate-Limit"),
+                       headers.get("X-Method-Rate-Limit-Count"), now)
+
+    def penalize(self, method: str, headers: Mapping[str, str]) -> float:
+        """Record a 429 and return how many seconds the affected scope is paused.
+
+        X-Rate-Limit-Type says whose limit was hit. "application" pauses every
+        call on the key; "method" and "service" only pause this endpoint.
+        """
+        try:
+            retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+        except (TypeError, ValueError):
+            retry_after = float(DEFAULT_RETRY_AFTER)
+        scope = APP_SCOPE if headers.get("X-Rate-Limit-Type", APP_SCOPE) == APP_SCOPE else method
+        with self._lock:
+            until = self._clock() + retry_after
+            self._blocked_until[scope] = max(self._blocked_until.get(scope, 0.0), until)
+        return retry_after
+
+    def _wait_time(self, scope: str, now: float) -> float:
+        wait = self._blocked_until.get(scope, 0.0) - now
+        for window in self._windows.get(scope, ()):
+            wait = max(wait, window.wait_time(now))
+        return wait
+
+    def _set_limits(self, scope: str, header: str, now: float) -> None:
+        self._limits[scope] = header
+        self._windows[scope] = [
+            _Window(limit, seconds, now) for limit, seconds in parse_rate_limits(header)
+        ]
+
+    def _sync(self, scope: str, limit_header: Optional[str], count_header: Optional[str], now: float) -> None:
+        if not limit_header:
+            return
+        if self._limits.get(scope) != limit_header:
+            self._set_limits(scope, limit_header, now)
+        used = dict((seconds, count) for count, seconds in parse_rate_limits(count_header))
+        for window in self._windows[scope]:
+            if window.seconds in used:
+                window.sync(used[window.seconds], now)
@@ -0,0 +1,116 @@
+"""The one HTTP client every Riot call goes through.
+
+elo_check, generate_puuid and mastery used to build their own connections --
+a retrying Session, a bare requests.get per player, and a requests.get with no
+timeout at all. Sharing one client means one keep-alive pool (no TLS handshake
+per request), one retry policy, and one RateLimiter, so every stage draws on
+the same quota budget instead of each assuming it has the key to itself.
+"""
+
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+import metrics
+from logger_config import setup_logger
+from rate_limiter import RateLimiter
+
+logger = setup_logger(__name__, 'riot_client.log')
+
+# A 429 is waited out and retried this many times before the call gives up.
+MAX_RATE_LIMIT_RETRIES: int = 3
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """A pooled, gzip-accepting Session that retries transient server errors.
+
+    429 is deliberately not in the forcelist: urllib3 would sleep out the
+    Retry-After inside one thread while the others kept firing. RiotClient
+    hands it to the rate limiter instead, which pauses every caller at once.
+    """
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+class RiotClient:
+    """Rate-limited GETs against the Riot API.
+
+    `method` names the endpoint for Riot's per-method limits; any stable
+    string works as long as every caller of one endpoint uses the same one.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        limiter: Optional[RateLimiter] = None,
+        timeout: float = config.RIOT_TIMEOUT_SECONDS,
+    ):
+        self.session = session or create_session(config.RIOT_POOL_SIZE)
+        self.limiter = limiter or RateLimiter()
+        self.timeout = timeout
+
+    def get(self, url: str, method: str) -> requests.Response:
+        """GET `url`, waiting out 429s. Non-429 errors are returned, not raised."""
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            started = time.monotonic()
+            self.limiter.acquire(method)
+            requested = time.monotonic()
+            metrics.inc("riot_throttle_wait_seconds", requested - started, method=method)
+            try:
+                response = self.session.get(url, headers=config.riot_headers(), timeout=self.timeout)
+            except requests.RequestException:
+                metrics.inc("riot_requests", method=method, status="error")
+                raise
+            self._record(method, response, time.monotonic() - requested)
+            if response.status_code != 429:
+                self.limiter.update(method, response.headers)
+                return response
+            # Penalised even on the last attempt, so the next caller still waits.
+            retry_after = self.limiter.penalize(method, response.headers)
+            metrics.inc("riot_rate_limit_wait_seconds", retry_after, method=method)
+            if attempt < MAX_RATE_LIMIT_RETRIES:
+                metrics.inc("riot_rate_limit_retries", method=method)
+                logger.warning(f"Rate limited on {method}. Waiting {retry_after:g}s before retry...")
+        logger.error(f"Still rate limited on {method} after {MAX_RATE_LIMIT_RETRIES} retries")
+        return response
+
+    @staticmethod
+    def _record(method: str, response: requests.Response, seconds: float) -> None:
+        metrics.inc("riot_requests", method=method, status=response.status_code)
+        metrics.observe("riot_request_seconds", seconds, method=method)
+        # 5xx retries happen inside urllib3; its Retry object keeps the history.
+        retries = getattr(getattr(getattr(response, "raw", None), "retries", None), "history", ())
+        if retries:
+            metrics.inc("riot_server_retries", len(retries), method=method)
+
+
+_client: Optional[RiotClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> RiotClient:
+    """Process-wide client, so every stage shares one pool and one quota."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RiotClient()
+        return _client
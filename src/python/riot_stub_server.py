@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+"""
+Offline stand-in for the three Riot APIs the pipeline calls, for load testing.
+
+Serves account-v1 (by-riot-id), league-v4 (entries by-puuid) and
+champion-mastery-v4 (top by-puuid) from a fixtures file where one is given and
+from deterministic synthetic data everywhere else. It behaves the way Riot does
+under load: per-request latency, X-App/X-Method rate-limit headers with live
+counts, 429s with Retry-After once a window is spent, and 403s once the "dev
+key" has expired.
+
+Point the pipeline at it and seed a synthetic roster. The defaults are a dev
+key's quota; raise them to measure throughput rather than the limiter:
+
+  python src/python/riot_stub_server.py --port 8089 --seed-players 10000 \\
+      --app-limits 500:10,30000:600 --method-limit league=2000:10
+  RIOT_ACCOUNT_BASE_URL=http://localhost:8089 \\
+  RIOT_PLATFORM_BASE_URL=http://localhost:8089 \\
+  RIOT_API_KEY=stub python -m src.python.run_pipeline --skip fetch_google_forms_data
+
+The stub has no Google Sheets stand-in, hence --skip: generate_puuid resolves
+the seeded players without waiting on the sheet fetch.
+
+Fixtures are a JSON object mapping a request path to {"status", "body"}, e.g.
+{"/lol/league/v4/entries/by-puuid/abc": {"status": 200, "body": [...]}} --
+real responses saved from a dev-key session drop straight in.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from rate_limiter import DEFAULT_APP_LIMITS, parse_rate_limits
+
+ACCOUNT_PREFIX = "/riot/account/v1/accounts/by-riot-id/"
+LEAGUE_PREFIX = "/lol/league/v4/entries/by-puuid/"
+MASTERY_PREFIX = "/lol/champion-mastery/v4/champion-masteries/by-puuid/"
+
+# Per-method limits roughly as Riot publishes them for a development key.
+METHOD_LIMITS: Dict[str, str] = {
+    "account": "1000:60",
+    "league": "100:10",
+    "mastery": "2000:10",
+}
+
+SYNTHETIC_TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER"]
+SYNTHETIC_DIVISIONS = ["IV", "III", "II", "I"]
+
+Response = Tuple[int, Dict[str, str], object]
+
+
+def _digest(*parts: str) -> int:
+    """Stable across processes, unlike hash()."""
+    joined = "/".join(parts).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(joined).digest()[:8], "big")
+
+
+def synthetic_puuid(game_name: str, tag_line: str) -> str:
+    return f"stub-{_digest(game_name.lower(), tag_line.lower()):016x}"
+
+
+def synthetic_entries(puuid: str, hour: int) -> List[dict]:
+    """League entries that drift from hour to hour, so consecutive runs of the
+    tracker see real changes rather than an identical roster."""
+    seed = _digest(puuid)
+    entries = []
+    for offset, queue_type in enumerate(("RANKED_SOLO_5x5", "RANKED_FLEX_SR")):
+        # Roughly one player in five is unranked in flex.
+        if queue_type == "RANKED_FLEX_SR" and seed % 5 == 0:
+            continue
+        # Everyone plays a game every third hour, staggered so that about a
+        # third of the roster moves in any given hour.
+        games = (seed >> (offset * 8)) % 200 + (hour + seed % 3) // 3
+        wins = games // 2 + (seed >> 16) % 5
+        tier = SYNTHETIC_TIERS[(seed >> (offset * 4)) % len(SYNTHETIC_TIERS)]
+        division = None if tier == "MASTER" else SYNTHETIC_DIVISIONS[(seed >> 12) % 4]
+        entries.append({
+            "leagueId": f"stub-league-{offset}",
+            "queueType": queue_type,
+            "tier": tier,
+            # Riot sends "I" for apex tiers; elo_check stores it as-is.
+            "rank": division or "I",
+            "puuid": puuid,
+            "leaguePoints": (seed + games * 17) % 100,
+            "wins": wins,
+            "losses": max(games - wins, 0),
+            "veteran": False,
+            "inactive": False,
+            "freshBlood": False,
+            "hotStreak": False,
+        })
+    return entries
+
+
+def synthetic_mastery(puuid: str, now_ms: int) -> List[dict]:
+    seed = _digest(puuid, "mastery")
+    return [
+        {
+            "puuid": puuid,
+            "championId": (seed >> (slot * 8)) % 160 + 1,
+            "championLevel": 5 + slot,
+            "championPoints": 20000 + (seed >> slot) % 500000,
+            "lastPlayTime": now_ms - ((seed >> (slot * 4)) % 30) * 86_400_000,
+            "championPointsSinceLastLevel": 1000,
+            "championPointsUntilNextLevel": 0,
+            "markRequiredForNextLevel": 1,
+            "tokensEarned": 0,
+            "championSeasonMilestone": slot,
+        }
+        for slot in range(3)
+    ]
+
+
+class _Windows:
+    """Server-side fixed windows, counted the way Riot counts them."""
+
+    def __init__(self, header: str):
+        self.header = header
+        self.windows = [[limit, seconds, 0, None] for limit, seconds in parse_rate_limits(header)]
+
+    def try_spend(self, now: float) -> Optional[float]:
+        """Count one request, or return the seconds until a spent window reopens."""
+        for window in self.windows:
+            limit, seconds, count, opened_at = window
+            if opened_at is None or now - opened_at >= seconds:
+                window[2], window[3] = 0, now
+            elif count >= limit:
+                return opened_at + seconds - now
+        for window in self.windows:
+            window[2] += 1
+        return None
+
+    def counts(self) -> str:
+        return ",".join(f"{count}:{seconds}" for _, seconds, count, _ in self.windows)
+
+
+class StubRiot:
+    """Routing, fixtures and quota state, independent of the HTTP plumbing."""
+
+    def __init__(
+        self,
+        fixtures: Optional[Dict[str, dict]] = None,
+        app_limits: str = DEFAULT_APP_LIMITS,
+        method_limits: Optional[Dict[str, str]] = None,
+        key_ttl: Optional[float] = None,
+        missing_rate: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        self.fixtures = fixtures or {}
+        self.missing_rate = missing_rate
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._expires_at = clock() + key_ttl if key_ttl is not None else None
+        self._lock = threading.Lock()
+        self._app = _Windows(app_limits)
+        method_limits = {**METHOD_LIMITS, **(method_limits or {})}
+        self._methods = {name: _Windows(limits) for name, limits in method_limits.items()}
+
+    def handle(self, path: str, headers: Dict[str, str]) -> Response:
+        method = self._route(path)
+        if method is None:
+            return 404, {}, {"status": {"message": "Data not found - no route", "status_code": 404}}
+        if not headers.get("X-Riot-Token"):
+            return 401, {}, {"status": {"message": "Unauthorized", "status_code": 401}}
+        if self._expires_at is not None and self._clock() >= self._expires_at:
+            return 403, {}, {"status": {"message": "Forbidden", "status_code": 403}}
+
+        with self._lock:
+            now = self._clock()
+            app_wait = self._app.try_spend(now)
+            method_wait = None if app_wait is not None else self._methods[method].try_spend(now)
+            limit_headers = {
+                "X-App-Rate-Limit": self._app.header,
+                "X-App-Rate-Limit-Count": self._app.counts(),
+                "X-Method-Rate-Limit": self._methods[method].header,
+                "X-Method-Rate-Limit-Count": self._methods[method].counts(),
+            }
+        if app_wait is not None or method_wait is not None:
+            limit_type = "application" if app_wait is not None else "method"
+            retry_after = math.ceil(app_wait if app_wait is not None else method_wait)
+            return 429, {
+                **limit_headers,
+                "Retry-After": str(max(retry_after, 1)),
+                "X-Rate-Limit-Type": limit_type,
+            }, {"status": {"message": "Rate limit exceeded", "status_code": 429}}
+
+        if path in self.fixtures:
+            fixture = self.fixtures[path]
+            return fixture.get("status", 200), limit_headers, fixture.get("body")
+        status, body = self._synthesise(method, path)
+        return status, limit_headers, body
+
+    def _route(self, path: str) -> Optional[str]:
+        if path.startswith(ACCOUNT_PREFIX):
+            return "account"
+        if path.startswith(LEAGUE_PREFIX):
+            return "league"
+        if path.startswith(MASTERY_PREFIX) and path.endswith("/top"):
+            return "mastery"
+        return None
+
+    def _synthesise(self, method: str, path: str) -> Tuple[int, object]:
+        if method == "account":
+            parts = path[len(ACCOUNT_PREFIX):].split("/")
+            if len(parts) != 2:
+                return 400, {"status": {"message": "Bad request", "status_code": 400}}
+            game_name, tag_line = (unquote(part) for part in parts)
+            if (_digest(game_name, tag_line, "missing") % 10_000) < self.missing_rate * 10_000:
+                return 404, {"status": {"message": "Data not found - No results found for player with riot id", "status_code": 404}}
+            return 200, {
+                "puuid": synthetic_puuid(game_name, tag_line),
+                "gameName": game_name,
+                "tagLine": tag_line,
+            }
+        if method == "league":
+            puuid = path[len(LEAGUE_PREFIX):]
+            return 200, synthetic_entries(puuid, int(self._wall_clock() // 3600) % 10_000)
+        puuid = path[len(MASTERY_PREFIX):-len("/top")]
+        return 200, synthetic_mastery(puuid, int(self._wall_clock() * 1000))
+
+
+def make_handler(stub: StubRiot, latency: float, jitter: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_GET(self):
+            if latency or jitter:
+                time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            status, headers, body = stub.handle(self.path.split("?")[0], dict(self.headers))
+            payload = json.dumps(body).encode("utf-8")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip.compress(payload)
+                headers = {**headers, "Content-Encoding": "gzip"}
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # One line per request would drown a 10k-player run.
+            pass
+
+    return Handler
+
+
+def create_server(
+    stub: StubRiot,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+) -> ThreadingHTTPServer:
+    """Bind without serving; port 0 picks a free one (see server_address)."""
+    server = ThreadingHTTPServer((host, port), make_handler(stub, latency, jitter))
+    server.daemon_threads = True
+    return server
+
+
+def seed_players(count: int) -> int:
+    """Register `count` synthetic players with no puuid, so a pipeline run
+    exercises account-v1 resolution as well as the league scan."""
+    from sqlalchemy import text
+
+    import config
+
+    records = [
+        {"summ_id": f"StubPlayer{i:05d}", "player_tag": "STUB", "region": "EUW"}
+        for i in range(count)
+    ]
+    with config.get_engine().begin() as connection:
+        result = connection.execute(
+            text("""
+                INSERT INTO public.players (summ_id, player_tag, region)
+                VALUES (:summ_id, :player_tag, :region)
+                ON CONFLICT (lower(summ_id), lower(player_tag)) DO NOTHING
+            """),
+            records,
+        )
+        return result.rowcount if result.rowcount and result.rowcount > 0 else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=40.0,
+                        help="mean added latency per request (default 40)")
+    parser.add_argument("--jitter-ms", type=float, default=20.0,
+                        help="uniform +/- jitter around the mean (default 20)")
+    parser.add_argument("--app-limits", default=DEFAULT_APP_LIMITS,
+                        help=f"X-App-Rate-Limit to enforce (default {DEFAULT_APP_LIMITS})")
+    parser.add_argument("--method-limit", action="append", default=[], metavar="NAME=LIMITS",
+                        help="override a method limit, e.g. league=2000:10 "
+                             f"(methods: {', '.join(METHOD_LIMITS)})")
+    parser.add_argument("--key-ttl", type=float, default=None,
+                        help="seconds until every request returns 403, like an expired dev key")
+    parser.add_argument("--missing-rate", type=float, default=0.01,
+                        help="fraction of Riot IDs that 404 (default 0.01)")
+    parser.add_argument("--fixtures", default=None,
+                        help="JSON file mapping request paths to {status, body}")
+    parser.add_argument("--seed-players", type=int, default=0,
+                        help="insert this many synthetic players into the database first")
+    args = parser.parse_args()
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures, encoding="utf-8") as f:
+            fixtures = json.load(f)
+
+    if args.seed_players:
+        added = seed_players(args.seed_players)
+        print(f"Seeded {added} synthetic players")
+
+    method_limits = dict(item.split("=", 1) for item in args.method_limit)
+    stub = StubRiot(
+        fixtures=fixtures,
+        app_limits=args.app_limits,
+        method_limits=method_limits,
+        key_ttl=args.key_ttl,
+        missing_rate=args.missing_rate,
+    )
+    server = create_server(stub, args.host, args.port,
+                           args.latency_ms / 1000, args.jitter_ms / 1000)
+    host, port = server.server_address[:2]
+    print(f"Riot stand-in listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,37 +7,228 @@ Run hourly via cron:
   0 * * * * cd /path/to/elo_snitch_bot && python -m src.python.run_pipeline
 
 Or via systemd timer — see README for setup.
+
+  --skip STAGE  leave a stage out of this run, e.g. --skip fetch_google_forms_data
+                to load-test against the Riot stub without Google credentials
+
+The stages run in this process rather than as four fresh interpreters, so
+pandas, SQLAlchemy and googleapiclient are imported once per run instead of
+once per stage, and every stage shares config.get_engine()'s pool and
+riot_client.get_client()'s session.
+
+Stages form a small dependency graph rather than a fixed sequence. Scanning
+players who already have a puuid needs neither the sheet nor generate_puuid,
+so it runs alongside them; players generate_puuid resolves are then scanned in
+a follow-up pass under the same scanned_at, and the tracker reports both. A
+stage that fails skips everything that `requires` it, and the run exits 1.
 """
 
+import argparse
+import importlib
+import logging
 import sys
-import subprocess
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# Exit code recorded for a stage that never ran because a requirement failed.
+SKIPPED = -1
+
+
+class Stage(NamedTuple):
+    name: str
+    module: str
+    # The functions its `python <module>.py` entry point calls, in order.
+    entry_points: Tuple[str, ...]
+    # Stages that must have succeeded; if one did not, this stage is skipped.
+    requires: Tuple[str, ...] = ()
+    # Stages that only have to have finished first, whatever their outcome.
+    after: Tuple[str, ...] = ()
+    # Stages whose result -- what their last entry point returned -- is passed
+    # to this stage's first entry point, in order. Each must also be in
+    # `requires`, so a failed one skips this stage rather than passing None.
+    inputs: Tuple[str, ...] = ()
+
+
+class StageResult(NamedTuple):
+    exit_code: int
+    # What the last entry point returned; None unless it succeeded.
+    value: object = None
+
+
+STAGES: Sequence[Stage] = (
+    Stage("fetch_google_forms_data", "fetch_google_forms_data", ("main",)),
+    Stage("generate_puuid", "generate_puuid", ("main",),
+          requires=("fetch_google_forms_data",)),
+    Stage("elo_check", "elo_check", ("scan_existing_players",)),
+    # Waits for generate_puuid but does not need it to succeed: if the sheet
+    # or puuid resolution failed there are simply no new players to scan.
+    # The first pass's scanned_at and roster are handed over as its result.
+    Stage("elo_check_new_players", "elo_check", ("scan_new_players",),
+          requires=("elo_check",), after=("generate_puuid",), inputs=("elo_check",)),
+    # Runs whenever the main scan succeeded, so an hour's changes are reported
+    # even when the sheet fetch is down.
+    Stage("elo_tracker", "elo_tracker", ("main",),
+          requires=("elo_check",), after=("elo_check_new_players",)),
+    # A slice of the roster per run. It waits for the league scan so the two
+    # do not split the Riot quota, but needs nothing from it.
+    Stage("mastery", "mastery", ("main",), after=("elo_check_new_players",)),
+    # Rolls finished days of report snapshots into one archive each.
+    Stage("compact_snapshots", "snapshots", ("compact_snapshots",), after=("elo_tracker",)),
+)
+
+
+def run_stage(module_name: str, entry_points: Sequence[str], args: Sequence = ()) -> StageResult:
+    """Import a stage and call its entry points, the first with `args`.
+    Returns its exit code and what the last entry point returned.
+
+    Anything a stage raises -- including while importing -- is contained here
+    and reported as exit code 1, so one broken stage cannot take the runner
+    down with an unhandled traceback. sys.exit() inside a stage is honoured the
+    way the interpreter would have honoured it.
+
+    The traceback also goes to the stage's own log (logs/<stage>.log), as its
+    `__main__` block would have written it when run as a script; a stage that
+    could not even be imported is logged to logs/run_pipeline.log.
+    """
+    module = None
+    value = None
+    try:
+        module = importlib.import_module(module_name)
+        for position, name in enumerate(entry_points):
+            value = getattr(module, name)(*(args if position == 0 else ()))
+    except SystemExit as e:
+        if e.code is None or e.code == 0:
+            return StageResult(0)
+        return StageResult(e.code if isinstance(e.code, int) else 1)
+    except Exception as e:
+        traceback.print_exc()
+        stage_logger = getattr(module, "logger", None)
+        if not isinstance(stage_logger, logging.Logger):
+            stage_logger = _runner_logger()
+        stage_logger.error(f"Unhandled exception in {module_name}: {e}", exc_info=True)
+        return StageResult(1)
+    return StageResult(0, value)
+
+
+def _runner_logger() -> logging.Logger:
+    from logger_config import setup_logger
+
+    return setup_logger("run_pipeline", "run_pipeline.log")
+
+
+def without_stages(stages: Sequence[Stage], names: Sequence[str]) -> Tuple[Stage, ...]:
+    """`stages` minus those in `names`. Dependencies on a removed stage are
+    dropped rather than treated as failed, so the stages after it still run."""
+    unknown = set(names) - {stage.name for stage in stages}
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}")
+    return tuple(
+        stage._replace(
+            requires=tuple(name for name in stage.requires if name not in names),
+            after=tuple(name for name in stage.after if name not in names),
+            inputs=tuple(name for name in stage.inputs if name not in names),
+        )
+        for stage in stages
+        if stage.name not in names
+    )
+
+
+def _check_graph(stages: Sequence[Stage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names in {names}")
+    for stage in stages:
+        unknown = set(stage.requires + stage.after) - set(names)
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(unknown)}")
+        if not set(stage.inputs).issubset(stage.requires):
+            raise ValueError(f"Stage {stage.name} takes inputs it does not require")
+
+    finished: set = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if finished.issuperset(s.requires + s.after)]
+        if not ready:
+            raise ValueError(f"Dependency cycle among {[s.name for s in remaining]}")
+        finished.update(s.name for s in ready)
+        remaining = [s for s in remaining if s not in ready]
+
+
+def run_pipeline(stages: Sequence[Stage] = STAGES) -> int:
+    """Run every stage once its dependencies are done, then write the run's metrics."""
+    _check_graph(stages)
+    # The stages import each other flat (import config), as they do when run
+    # as scripts from this directory.
+    if str(SCRIPT_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPT_DIR))
+    import metrics
+
+    run_metrics = metrics.get_metrics()
+    print(f"Pipeline run {run_metrics.run_id}")
+
+    exit_codes: Dict[str, int] = {}
+    pending = list(stages)
+    running: Dict[Future, Tuple[Stage, float]] = {}
+
+    results: Dict[str, object] = {}
+
+    def announce_and_run(stage: Stage) -> StageResult:
+        print(f"Running {stage.name}...")
+        args = tuple(results[name] for name in stage.inputs)
+        return run_stage(stage.module, stage.entry_points, args)
 
-def run_pipeline():
-    """Execute the four pipeline stages in sequence."""
-    scripts = [
-        "fetch_google_forms_data.py",
-        "generate_puuid.py",
-        "elo_check.py",
-        "elo_tracker.py",
-    ]
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(stages), 1)) as executor:
+            while pending or running:
+                for stage in list(pending):
+                    if not all(name in exit_codes for name in stage.requires + stage.after):
+                        continue
+                    pending.remove(stage)
+                    failed = [name for name in stage.requires if exit_codes[name] != 0]
+                    if failed:
+                        print(f"Skipping {stage.name}: {', '.join(failed)} did not succeed",
+                              file=sys.stderr)
+                        exit_codes[stage.name] = SKIPPED
+                        run_metrics.record_stage(stage.name, 0.0, SKIPPED)
+                        continue
+                    running[executor.submit(announce_and_run, stage)] = (stage, time.monotonic())
+                # A skip can make further stages ready without anything finishing.
+                if not running:
+                    continue
 
-    script_dir = Path(__file__).parent
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, started = running.pop(future)
+                    returncode, results[stage.name] = future.result()
+                    exit_codes[stage.name] = returncode
+                    run_metrics.record_stage(stage.name, time.monotonic() - started, returncode)
+                    if returncode != 0:
+                        print(f"ERROR: {stage.name} failed with exit code {returncode}",
+                              file=sys.stderr)
+                    else:
+                        print(f"{stage.name} completed.\n")
+        return 0 if all(code == 0 for code in exit_codes.values()) else 1
+    finally:
+        # A failed run's metrics matter most; never let writing them fail it.
+        try:
+            print(f"Metrics written to {metrics.write_metrics(run_metrics)}")
+        except Exception:
+            traceback.print_exc()
 
-    for script in scripts:
-        script_path = script_dir / script
-        if not script_path.exists():
-            print(f"ERROR: {script_path} not found", file=sys.stderr)
-            return 1
 
-        print(f"Running {script}...")
-        result = subprocess.run([sys.executable, str(script_path)], cwd=str(script_dir))
-        if result.returncode != 0:
-            print(f"ERROR: {script} failed with exit code {result.returncode}", file=sys.stderr)
-            return 1
-        print(f"{script} completed.\n")
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the ELO tracking pipeline once.")
+    parser.add_argument("--skip", action="append", default=[], metavar="STAGE",
+                        choices=[stage.name for stage in STAGES],
+                        help="leave a stage out of this run; repeatable")
+    args = parser.parse_args(argv)
+    return run_pipeline(without_stages(STAGES, args.skip))
 
-    return 0
 
 if __name__ == "__main__":
-    sys.exit(run_pipeline())
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Decides which players elo_check rescans this run, for SCAN_SCHEDULE=adaptive.
+
+Most of the roster has not played in days, and rescanning them hourly spends
+Riot quota to learn nothing. A player's activity is read straight from
+elo_history -- the last time their wins + losses went up -- and the longer they
+have been idle, the longer they wait between scans. Nobody ever waits longer
+than SCAN_MAX_STALENESS_HOURS, and someone who has never been scanned is always
+due.
+
+When a player was last scanned lives in player_scan_state
+(sql/migrations/004), because in change-only mode elo_history does not record
+scans that found nothing new.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+import config
+from logger_config import setup_logger
+
+logger = setup_logger(__name__, 'scan_scheduler.log')
+
+# (idle for at least, rescan every), in hours, checked from the longest idle
+# down. Someone who played within the last day is scanned every run.
+BACKOFF_SCHEDULE = (
+    (168, 24),
+    (72, 12),
+    (24, 6),
+    (0, 0),
+)
+
+# How far back elo_history is searched for activity. Anyone idle longer than the
+# last BACKOFF_SCHEDULE threshold is treated the same, so nothing older matters.
+ACTIVITY_LOOKBACK_HOURS = BACKOFF_SCHEDULE[0][0]
+
+
+def scan_interval(idle: Optional[timedelta], max_staleness: timedelta) -> timedelta:
+    """How long a player idle for `idle` waits between scans.
+
+    No recorded activity at all counts as idle for the longest bracket.
+    """
+    interval = timedelta(hours=BACKOFF_SCHEDULE[0][1])
+    if idle is not None:
+        for idle_hours, every_hours in BACKOFF_SCHEDULE:
+            if idle >= timedelta(hours=idle_hours):
+                interval = timedelta(hours=every_hours)
+                break
+    return min(interval, max_staleness)
+
+
+def is_due(
+    last_scanned_at: Optional[datetime],
+    last_active_at: Optional[datetime],
+    now: datetime,
+    max_staleness: timedelta,
+) -> bool:
+    if last_scanned_at is None:
+        return True
+    idle = now - last_active_at if last_active_at is not None else None
+    return now - last_scanned_at >= scan_interval(idle, max_staleness)
+
+
+def select_due(
+    players_df: pd.DataFrame,
+    last_scanned: Dict[int, datetime],
+    last_active: Dict[int, datetime],
+    now: datetime,
+    max_staleness: timedelta,
+) -> pd.DataFrame:
+    """The rows of `players_df` (indexed by player key) due a scan at `now`."""
+    due = [
+        is_due(last_scanned.get(player_key), last_active.get(player_key), now, max_staleness)
+        for player_key in players_df.index
+    ]
+    return players_df[due]
+
+
+def fetch_last_scanned(db_connection=None) -> Dict[int, datetime]:
+    if db_connection is None:
+        db_connection = config.get_engine()
+    with db_connection.connect() as connection:
+        result = connection.execute(
+            text("SELECT player_key, last_scanned_at FROM public.player_scan_state")
+        )
+        return {player_key: scanned_at for player_key, scanned_at in result}
+
+
+# LAG has to see each series' last row from before the window, or the first
+# row inside it has no predecessor and a game played then is never counted.
+# elo_history only gets a row when something changed, so that row can be
+# arbitrarily old; it is found with one probe of idx_elo_history_latest (006)
+# per series rather than by running LAG over all of history.
+LAST_ACTIVE_SQL = """
+    WITH windowed AS (
+        SELECT player_key, queue_type, timestamp, wins + losses AS games
+        FROM public.elo_history
+        WHERE timestamp >= :since
+    ),
+    series AS (
+        SELECT DISTINCT player_key, queue_type FROM windowed
+    ),
+    with_predecessors AS (
+        SELECT player_key, queue_type, timestamp, games FROM windowed
+        UNION ALL
+        SELECT h.player_key, h.queue_type, h.timestamp, h.wins + h.losses AS games
+        FROM series s
+        JOIN public.elo_history h
+          ON h.player_key = s.player_key
+         AND h.queue_type = s.queue_type
+         AND h.timestamp = (
+            SELECT max(b.timestamp)
+            FROM public.elo_history b
+            WHERE b.player_key = s.player_key
+              AND b.queue_type = s.queue_type
+              AND b.timestamp < :since
+         )
+    ),
+    games AS (
+        SELECT
+            player_key,
+            timestamp,
+            games,
+            LAG(games) OVER (
+                PARTITION BY player_key, queue_type
+                ORDER BY timestamp
+            ) AS previous_games
+        FROM with_predecessors
+    )
+    SELECT player_key, max(timestamp) AS last_active_at
+    FROM games
+    WHERE games > previous_games
+      AND timestamp >= :since
+    GROUP BY player_key
+"""
+
+
+def fetch_last_active(now: datetime, db_connection=None) -> Dict[int, datetime]:
+    """When each player's games played last went up, within the lookback window."""
+    query = text(LAST_ACTIVE_SQL)
+    since = now - timedelta(hours=ACTIVITY_LOOKBACK_HOURS)
+    if db_connection is None:
+        db_connection = config.get_engine()
+    with db_connection.connect() as connection:
+        result = connection.execute(query, {"since": since})
+        return {player_key: active_at for player_key, active_at in result}
+
+
+def due_players(players_df: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """Filter elo_check's roster down to the players due a scan this run."""
+    max_staleness = timedelta(hours=config.SCAN_MAX_STALENESS_HOURS)
+    due = select_due(
+        players_df, fetch_last_scanned(), fetch_last_active(now), now, max_staleness
+    )
+    logger.info(f"{len(due)} of {len(players_df)} players due a scan")
+    return due
+
+
+def record_scans(player_keys: Iterable[int], scanned_at: datetime) -> None:
+    """Mark players as scanned. Only successful fetches belong here, so a
+    player whose call failed is retried next run rather than backed off."""
+    records = [
+        {"player_key": int(player_key), "scanned_at": scanned_at}
+        for player_key in player_keys
+    ]
+    if not records:
+        return
+    with config.get_engine().begin() as connection:
+        connection.execute(
+            text("""
+                INSERT INTO public.player_scan_state (player_key, last_scanned_at)
+                VALUES (:player_key, :scanned_at)
+                ON CONFLICT (player_key) DO UPDATE
+                SET last_scanned_at = EXCLUDED.last_scanned_at
+            """),
+            records,
+        )
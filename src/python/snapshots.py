@@ -0,0 +1,232 @@
+"""Writing the JSON snapshots the WhatsApp bot reads.
+
+Every report is written to a dated file and mirrored to <folder>/latest.json,
+which is the only file the bot reads. Both are replaced atomically -- written
+to a temporary file, fsynced, then renamed over the old one -- so the bot can
+never read half a report.
+
+A report identical to the one already in latest.json (the winrate tables, most
+hours) is not written again. Only latest.json is rewritten, so its timestamp
+still says when the pipeline last ran.
+
+Finished days are compacted: every snapshot in <folder>/<date>/ becomes one
+line of <folder>/<date>.jsonl.gz, each line its own gzip member, and
+<date>.index.json records each member's offset and length. load_snapshot then
+reads any old snapshot with one seek, and a day costs two files instead of one
+per hour. The per-run metrics JSON (see metrics.write_metrics) is compacted the
+same way.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import config
+import metrics
+from logger_config import setup_logger
+
+logger = setup_logger(__name__, 'snapshots.log')
+
+HASH_KEY = "content_hash"
+
+# Fields that differ between runs without the report itself changing.
+VOLATILE_KEYS = frozenset({"timestamp", "run_id", HASH_KEY})
+
+
+def encode(payload: Dict[str, Any]) -> str:
+    if config.SNAPSHOT_PRETTY:
+        return json.dumps(payload, indent=2)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def content_hash(payload: Dict[str, Any]) -> str:
+    """Hash of everything in `payload` but its volatile fields."""
+    content = {key: value for key, value in payload.items() if key not in VOLATILE_KEYS}
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def atomic_write(path: str, content: str) -> int:
+    """Replace `path` with `content` all at once. Returns the bytes written."""
+    data = content.encode("utf-8")
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if os.name == "posix":
+        # Make the rename itself durable, not just the file's contents.
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    return len(data)
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(daily_path: str, latest_path: str, payload: Dict[str, Any]) -> bool:
+    """Write a snapshot to its dated file and mirror it to latest.json.
+
+    Returns False when the report matched latest.json, in which case only
+    latest.json was rewritten, to refresh its timestamp.
+
+    latest.json is a plain copy rather than a symlink: os.symlink needs the
+    SeCreateSymbolicLink privilege on Windows, so the symlink always failed and
+    latest.json never actually existed.
+    """
+    # Labelled by folder: elo_changes, solo, flex.
+    snapshot = os.path.basename(os.path.dirname(latest_path))
+    payload = {**payload, HASH_KEY: content_hash(payload)}
+    encoded = encode(payload)
+
+    current = read_json(latest_path)
+    unchanged = current is not None and current.get(HASH_KEY) == payload[HASH_KEY]
+    paths = (latest_path,) if unchanged else (daily_path, latest_path)
+    if unchanged:
+        metrics.inc("snapshots_unchanged", snapshot=snapshot)
+    for path in paths:
+        metrics.inc("snapshot_bytes_written", atomic_write(path, encoded), snapshot=snapshot)
+    return not unchanged
+
+
+# --- Compaction -----------------------------------------------------------------
+
+SNAPSHOT_FOLDERS = ("elo_changes", "winrate/solo", "winrate/flex")
+
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# elo_changes_2026-08-09_21-32-50 -> 2026-08-09
+NAME_DATE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})_\d{2}-\d{2}-\d{2}$")
+
+
+def archive_paths(folder: Path, day: str):
+    return folder / f"{day}.jsonl.gz", folder / f"{day}.index.json"
+
+
+def compact_day(folder: Path, day: str) -> int:
+    """Roll <folder>/<day>/*.json into the day's archive, then remove the
+    directory. Returns the number of snapshots newly archived.
+
+    A day with nothing to archive -- common, since the dated directory is
+    created even when an unchanged snapshot is skipped -- only has its empty
+    directory removed, and gets no archive.
+
+    An existing archive is only ever appended to: its bytes are copied, the new
+    members written after them, and the index updated to match. A file with an
+    already-archived name points the index at the new member. Safe to re-run
+    after a crash: the archive is replaced before the index, and an old index
+    still describes a prefix of the new archive; a file is only deleted once
+    both are in place. An unreadable file stays behind, with its directory,
+    but the files archived alongside it do not, so later runs do not archive
+    them again.
+    """
+    day_dir = folder / day
+    files = sorted(day_dir.glob("*.json"))
+    if not files:
+        if not any(day_dir.iterdir()):
+            day_dir.rmdir()
+        return 0
+
+    archive, index_path = archive_paths(folder, day)
+    index: Dict[str, List[int]] = read_json(str(index_path)) or {}
+    tmp = archive.with_name(archive.name + ".tmp")
+    if index and archive.exists():
+        shutil.copyfile(archive, tmp)
+    else:
+        index = {}
+        open(tmp, "wb").close()
+
+    archived = []
+    with open(tmp, "ab") as out:
+        for path in files:
+            snapshot = read_json(str(path))
+            if snapshot is None:
+                # Left in place rather than lost; the directory survives too.
+                continue
+            line = json.dumps(snapshot, separators=(",", ":")) + "\n"
+            member = gzip.compress(line.encode("utf-8"), mtime=0)
+            index[path.stem] = [out.tell(), len(member)]
+            out.write(member)
+            archived.append(path)
+        out.flush()
+        os.fsync(out.fileno())
+    if not archived:
+        os.remove(tmp)
+        return 0
+    os.replace(tmp, archive)
+    atomic_write(str(index_path), json.dumps(index, separators=(",", ":")))
+
+    for path in archived:
+        path.unlink()
+    if not any(day_dir.iterdir()):
+        day_dir.rmdir()
+    return len(archived)
+
+
+def compact_snapshots(
+    data_dir: Optional[Path] = None,
+    today: Optional[date] = None,
+    metrics_dir: Optional[Path] = None,
+) -> int:
+    """Compact every finished day of every report folder, and of the per-run
+    metrics JSON under METRICS_DIR. Returns snapshots archived."""
+    data_dir = Path(data_dir or config.DATA_DIR)
+    today = (today or date.today()).isoformat()
+    folders = [(name, data_dir / name) for name in SNAPSHOT_FOLDERS]
+    folders.append(("metrics", Path(metrics_dir or config.METRICS_DIR)))
+    archived = 0
+    for name, folder in folders:
+        if not folder.is_dir():
+            continue
+        for day_dir in sorted(folder.iterdir()):
+            if day_dir.is_dir() and DAY_PATTERN.match(day_dir.name) and day_dir.name < today:
+                count = compact_day(folder, day_dir.name)
+                logger.info(f"Archived {count} {name} snapshots from {day_dir.name}")
+                archived += count
+    metrics.inc("snapshots_archived", archived)
+    return archived
+
+
+def load_snapshot(folder: str, name: str, data_dir: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """A snapshot by folder ("winrate/solo") and file name without .json, whether
+    it is still a dated file or already compacted. None if there is no such one."""
+    match = NAME_DATE_PATTERN.search(name)
+    if match is None:
+        raise ValueError(f"Not a snapshot name: {name!r}")
+    day = match.group(1)
+    folder_path = Path(data_dir or config.DATA_DIR) / folder
+
+    loose = folder_path / day / f"{name}.json"
+    if loose.exists():
+        return read_json(str(loose))
+
+    archive, index_path = archive_paths(folder_path, day)
+    entry = (read_json(str(index_path)) or {}).get(name)
+    if entry is None:
+        return None
+    offset, length = entry
+    with open(archive, "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))
+
+
+if __name__ == "__main__":
+    try:
+        compact_snapshots()
+    except Exception as e:
+        logger.error(f"Unhandled exception in compact_snapshots: {e}", exc_info=True)
+        raise
@@ -0,0 +1,42 @@
+"""Each player's newest two elo_history rows, read from current_standings.
+
+Rebuilding "each player's latest scan" from history costs more with every
+hourly run. sql/migrations/007 keeps the latest and previous row per player and
+queue in current_standings instead, updated by a trigger as elo_check writes,
+so readers touch one row per player and queue however long history gets.
+"""
+
+_STANDING_COLUMNS = ("tier", "rank", "league_points", "wins", "losses", "timestamp")
+
+
+def latest_scans_sql(depth: int) -> str:
+    """A SELECT of the newest `depth` (1 or 2) rows per player and queue.
+
+    Columns: player_key, summ_id, queue_type, tier, rank, league_points, wins,
+    losses, timestamp and scan_number (1 = newest) -- the shape the old
+    ROW_NUMBER() queries over elo_history produced, minus the rows they threw
+    away. Meant to be used as a CTE.
+    """
+    depth = int(depth)
+    if depth not in (1, 2):
+        raise ValueError(f"current_standings holds two rows per player; depth {depth} asked")
+
+    def select(prefix: str, scan_number: int) -> str:
+        columns = ",\n            ".join(
+            f"cs.{prefix}{column} AS {column}" for column in _STANDING_COLUMNS
+        )
+        where = f"\n        WHERE cs.{prefix}timestamp IS NOT NULL" if prefix else ""
+        return f"""
+        SELECT
+            cs.player_key,
+            p.summ_id,
+            cs.queue_type,
+            {columns},
+            {scan_number} AS scan_number
+        FROM public.current_standings cs
+        JOIN public.players p ON p.id = cs.player_key{where}"""
+
+    selects = [select("", 1)]
+    if depth == 2:
+        selects.append(select("prev_", 2))
+    return "\n        UNION ALL".join(selects) + "\n    "
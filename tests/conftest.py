@@ -1,7 +1,62 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # The pipeline scripts import each other flat (import config, import
 # logger_config), so src/python has to be importable as a top-level location.
 SRC = Path(__file__).resolve().parents[1] / "src" / "python"
 sys.path.insert(0, str(SRC))
+
+
+class FakeResponse:
+    """A requests.Response with only what RiotClient reads."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Serves `responses` in order, recording each request."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, headers, timeout))
+        return self.responses.pop(0)
+
+
+class Recorder:
+    """Stands in for config.get_engine() and its connections, recording each
+    statement executed and its parameters."""
+
+    def __init__(self):
+        self.statements = []
+
+    def begin(self):
+        return self
+
+    connect = begin
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return type("Result", (), {"rowcount": 1})()
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    """A Recorder installed as the engine."""
+    import config
+
+    engine = Recorder()
+    monkeypatch.setattr(config, "get_engine", lambda: engine)
+    return engine
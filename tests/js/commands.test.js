@@ -155,3 +155,37 @@ test('ordinary conversation never reaches the limiter', () => {
 
     assert.strictEqual(limiter.allow('user-a', at), true, 'chatter consumed the command budget');
 });
+
+// --- reply cache -------------------------------------------------------------
+
+test('a burst of one command against one snapshot renders once', async () => {
+    let renders = 0;
+    const original = COMMANDS['!topelo'].render;
+    COMMANDS['!topelo'].render = (data, now) => { renders += 1; return original(data, now); };
+    try {
+        const snapshot = { ...snapshots.elo_changes };
+        const read = async () => snapshot;
+        const first = await runCommand('!topelo', { read, now: NOW });
+        for (let i = 0; i < 10; i += 1) {
+            assert.strictEqual(await runCommand('!topelo', { read, now: NOW }), first);
+        }
+        assert.strictEqual(renders, 1);
+
+        // A new snapshot object is a new pipeline run.
+        await runCommand('!topelo', { read: async () => ({ ...snapshot }), now: NOW });
+        assert.strictEqual(renders, 2);
+    } finally {
+        COMMANDS['!topelo'].render = original;
+    }
+});
+
+test('a cached reply is re-rendered once its age text moves on', async () => {
+    const snapshot = { ...snapshots.elo_changes };
+    const read = async () => snapshot;
+
+    const fresh = await runCommand('!elocheck', { read, now: NOW });
+    const later = await runCommand('!elocheck', { read, now: new Date(NOW.getTime() + 3 * 3600 * 1000) });
+
+    assert.match(fresh, /\(just now\)/);
+    assert.match(later, /\(3 hours ago\)/);
+});
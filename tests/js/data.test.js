@@ -0,0 +1,89 @@
+/**
+ * readLatest's cache: one read per change to latest.json, however many commands.
+ */
+
+const test = require('node:test');
+const assert = require('node:assert');
+const fsSync = require('fs');
+const fs = require('fs').promises;
+const os = require('os');
+const path = require('path');
+
+const { createSnapshotReader } = require('../../src/js/data');
+
+function tempDataDir() {
+    const dir = fsSync.mkdtempSync(path.join(os.tmpdir(), 'snitch-data-'));
+    fsSync.mkdirSync(path.join(dir, 'elo_changes'));
+    return dir;
+}
+
+// The way the pipeline writes it: a temporary file renamed over latest.json.
+function publish(dir, snapshot) {
+    const file = path.join(dir, 'elo_changes', 'latest.json');
+    fsSync.writeFileSync(`${file}.tmp`, JSON.stringify(snapshot));
+    fsSync.renameSync(`${file}.tmp`, file);
+}
+
+async function eventually(check, timeoutMs = 2000) {
+    const deadline = Date.now() + timeoutMs;
+    while (!(await check())) {
+        if (Date.now() > deadline) {
+            throw new Error('timed out');
+        }
+        await new Promise((resolve) => setTimeout(resolve, 10));
+    }
+}
+
+for (const watch of [true, false]) {
+    test(`a burst of reads parses latest.json once (watch: ${watch})`, async (t) => {
+        const dir = tempDataDir();
+        publish(dir, { timestamp: 'one' });
+        const reader = createSnapshotReader({ dataDir: dir, watch });
+        t.after(() => reader.close());
+        const readFile = t.mock.method(fs, 'readFile');
+
+        const first = await reader.read('elo_changes');
+        for (let i = 0; i < 20; i += 1) {
+            assert.strictEqual(await reader.read('elo_changes'), first);
+        }
+
+        assert.strictEqual(first.timestamp, 'one');
+        assert.strictEqual(readFile.mock.callCount(), 1);
+    });
+
+    test(`a new latest.json is picked up (watch: ${watch})`, async (t) => {
+        const dir = tempDataDir();
+        publish(dir, { timestamp: 'one' });
+        const reader = createSnapshotReader({ dataDir: dir, watch });
+        t.after(() => reader.close());
+        await reader.read('elo_changes');
+
+        publish(dir, { timestamp: 'two, which is longer' });
+
+        await eventually(async () => (await reader.read('elo_changes')).timestamp !== 'one');
+    });
+}
+
+test('a folder with no snapshot yet reads as null, then picks one up', async (t) => {
+    const dir = tempDataDir();
+    const reader = createSnapshotReader({ dataDir: dir });
+    t.after(() => reader.close());
+
+    assert.strictEqual(await reader.read('winrate/solo'), null);
+
+    fsSync.mkdirSync(path.join(dir, 'winrate', 'solo'), { recursive: true });
+    fsSync.writeFileSync(path.join(dir, 'winrate', 'solo', 'latest.json'), '{"timestamp":"one"}');
+    assert.deepStrictEqual(await reader.read('winrate/solo'), { timestamp: 'one' });
+});
+
+test('malformed JSON throws and is not cached', async (t) => {
+    const dir = tempDataDir();
+    fsSync.writeFileSync(path.join(dir, 'elo_changes', 'latest.json'), '{"timestamp":');
+    const reader = createSnapshotReader({ dataDir: dir, watch: false });
+    t.after(() => reader.close());
+
+    await assert.rejects(() => reader.read('elo_changes'), SyntaxError);
+
+    fsSync.writeFileSync(path.join(dir, 'elo_changes', 'latest.json'), '{"timestamp":"fixed"}');
+    assert.deepStrictEqual(await reader.read('elo_changes'), { timestamp: 'fixed' });
+});
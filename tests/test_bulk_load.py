@@ -0,0 +1,103 @@
+"""COPY encoding: what Postgres will read back from the CSV stream."""
+
+import csv
+import io
+from datetime import datetime
+
+import pandas as pd
+
+from bulk_load import _CsvStream, copy_records, copy_rows
+
+
+def decode(stream):
+    return stream.read().decode("utf-8")
+
+
+def test_none_and_empty_string_stay_distinct():
+    """COPY reads a bare empty field as NULL and "" as an empty string."""
+    assert decode(_CsvStream([(None, "", "x")])) == ',"","x"\n'
+
+
+def test_nan_and_nat_become_null():
+    assert decode(_CsvStream([(float("nan"), pd.NaT, 1)])) == ',,"1"\n'
+
+
+def test_values_are_rendered_with_str():
+    text = decode(_CsvStream([(5, 2.5, datetime(2026, 8, 9, 12, 0))]))
+    assert text == '"5","2.5","2026-08-09 12:00:00"\n'
+
+
+def test_strings_with_delimiters_survive_a_round_trip():
+    awkward = ('say "hi", ok', "line\nbreak", "ünïcode")
+    text = decode(_CsvStream([awkward]))
+    assert next(csv.reader(io.StringIO(text))) == list(awkward)
+
+
+def test_rows_are_encoded_lazily_as_copy_reads():
+    pulled = []
+
+    def rows():
+        for i in range(1000):
+            pulled.append(i)
+            yield (i, "padding" * 10)
+
+    stream = _CsvStream(rows())
+    stream.read(64)
+
+    assert len(pulled) < 10
+
+
+def test_small_reads_reassemble_the_whole_payload():
+    rows = [(i, f"name-{i}") for i in range(50)]
+    whole = decode(_CsvStream(rows))
+
+    stream = _CsvStream(rows)
+    pieces = []
+    while chunk := stream.read(7):
+        pieces.append(chunk)
+
+    assert b"".join(pieces).decode("utf-8") == whole
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statement = None
+        self.payload = None
+        self.closed = False
+
+    def copy_expert(self, statement, stream):
+        self.statement = statement
+        self.payload = stream.read().decode("utf-8")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursor_obj = FakeCursor()
+        self.connection = self
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+def test_copy_rows_quotes_columns_and_counts_rows():
+    connection = FakeConnection()
+
+    count = copy_rows(connection, "public.mastery", ["puuid", "championId"], [("a", 1), ("b", 2)])
+
+    assert count == 2
+    assert connection.cursor_obj.statement == (
+        'COPY public.mastery ("puuid", "championId") FROM STDIN WITH (FORMAT csv)'
+    )
+    assert connection.cursor_obj.payload == '"a","1"\n"b","2"\n'
+    assert connection.cursor_obj.closed
+
+
+def test_copy_records_picks_columns_in_order():
+    connection = FakeConnection()
+
+    copy_records(connection, "t", ["b", "a"], [{"a": 1, "b": "x", "ignored": 0}])
+
+    assert connection.cursor_obj.payload == '"x","1"\n'
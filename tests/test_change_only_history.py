@@ -0,0 +1,55 @@
+"""Which scan rows ELO_HISTORY_MODE=changes keeps."""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from elo_check import select_rows_to_store
+
+HEARTBEAT = timedelta(hours=24)
+NOW = pd.Timestamp(2026, 8, 9, 12, 0, 0)
+
+
+def row(player_key=1, queue="RANKED_SOLO_5x5", tier="GOLD", rank="II", lp=50, wins=10, losses=8):
+    return {
+        "timestamp": NOW, "player_key": player_key, "queue_type": queue,
+        "tier": tier, "rank": rank, "league_points": lp, "wins": wins, "losses": losses,
+    }
+
+
+def stored(hours_ago=1, **overrides):
+    previous = row(**overrides)
+    previous["timestamp"] = NOW.to_pydatetime() - timedelta(hours=hours_ago)
+    return {(previous["player_key"], previous["queue_type"]): previous}
+
+
+def test_unchanged_standing_is_not_stored():
+    assert select_rows_to_store([row()], stored(), HEARTBEAT) == []
+
+
+def test_any_standing_field_moving_is_stored():
+    for change in ({"lp": 51}, {"wins": 11}, {"losses": 9}, {"rank": "I"}, {"tier": "PLATINUM"}):
+        current = row(**change)
+        assert select_rows_to_store([current], stored(), HEARTBEAT) == [current], change
+
+
+def test_first_row_for_a_queue_is_always_stored():
+    flex = row(queue="RANKED_FLEX_SR")
+    assert select_rows_to_store([flex], stored(), HEARTBEAT) == [flex]
+
+
+def test_heartbeat_is_written_once_the_last_row_is_old_enough():
+    assert select_rows_to_store([row()], stored(hours_ago=23), HEARTBEAT) == []
+    assert select_rows_to_store([row()], stored(hours_ago=24), HEARTBEAT) == [row()]
+
+
+def test_apex_rows_with_no_division_compare_equal():
+    apex = row(tier="MASTER", rank=None, lp=300)
+    assert select_rows_to_store([apex], stored(tier="MASTER", rank=None, lp=300), HEARTBEAT) == []
+
+
+def test_players_are_judged_independently():
+    moved, steady = row(player_key=1, lp=70), row(player_key=2)
+    latest = {**stored(player_key=1), **stored(player_key=2)}
+
+    assert select_rows_to_store([moved, steady], latest, HEARTBEAT) == [moved]
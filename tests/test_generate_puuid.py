@@ -0,0 +1,75 @@
+"""Concurrent puuid resolution, which resolved puuids are safe to write, and
+how long an unresolvable Riot ID waits before it is tried again."""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import config
+import generate_puuid
+from generate_puuid import (
+    LOOKUP_ERROR, NOT_FOUND, RESOLVED, record_failed_attempts, resolve_puuids, retry_delay,
+    split_conflicts,
+)
+
+
+def test_unclaimed_puuids_are_all_written():
+    assert split_conflicts({1: "a", 2: "b"}, {}) == ({1: "a", 2: "b"}, [])
+
+
+def test_a_puuid_owned_by_another_player_conflicts():
+    assert split_conflicts({1: "a", 2: "b"}, {"b": 7}) == ({1: "a"}, [2])
+
+
+def test_the_lowest_key_wins_a_puuid_resolved_twice_in_one_batch():
+    assert split_conflicts({5: "a", 3: "a", 4: "b"}, {}) == ({3: "a", 4: "b"}, [5])
+
+
+def test_resolution_splits_resolved_players_from_failures(monkeypatch):
+    answers = {
+        "one": ("p1", RESOLVED), "two": (None, NOT_FOUND),
+        "three": ("p3", RESOLVED), "four": (None, LOOKUP_ERROR),
+    }
+    monkeypatch.setattr(generate_puuid, "get_puuid_from_riot", lambda name, tag: answers[name])
+    df = pd.DataFrame(
+        {"summ_id": list(answers), "player_tag": ["EUW"] * 4},
+        index=pd.Index([10, 11, 12, 13], name="id"),
+    )
+
+    resolved, failures = resolve_puuids(df, concurrency=3)
+
+    assert resolved == {10: "p1", 12: "p3"}
+    assert failures == {11: NOT_FOUND, 13: LOOKUP_ERROR}
+
+
+def test_not_found_backs_off_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(config, "PUUID_RETRY_BASE_HOURS", 1)
+    monkeypatch.setattr(config, "PUUID_RETRY_MAX_HOURS", 24)
+
+    delays = [retry_delay(NOT_FOUND, attempts) for attempts in range(1, 8)]
+
+    assert delays == [timedelta(hours=h) for h in (1, 2, 4, 8, 16, 24, 24)]
+
+
+def test_transient_errors_are_retried_next_run():
+    assert retry_delay(LOOKUP_ERROR, 5) == timedelta(0)
+
+
+def test_only_not_found_counts_as_an_attempt(monkeypatch, recorder):
+    monkeypatch.setattr(config, "PUUID_RETRY_BASE_HOURS", 1)
+    now = datetime(2026, 8, 9, 12, 0)
+    df = pd.DataFrame(
+        {"summ_id": ["one", "two"], "player_tag": ["EUW", "EUW"], "attempts": [2, 2]},
+        index=pd.Index([10, 11], name="id"),
+    )
+
+    record_failed_attempts(df, {10: NOT_FOUND, 11: LOOKUP_ERROR}, now=now)
+
+    ((sql, records),) = recorder.statements
+    assert "ON CONFLICT (player_key) DO UPDATE" in sql
+    by_key = {record["player_key"]: record for record in records}
+    assert by_key[10]["attempts"] == 3
+    assert by_key[10]["next_attempt_at"] == now + timedelta(hours=4)
+    assert by_key[11]["attempts"] == 2
+    assert by_key[11]["status"] == LOOKUP_ERROR
+    assert by_key[11]["next_attempt_at"] == now
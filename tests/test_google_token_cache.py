@@ -0,0 +1,51 @@
+"""The cached Google access token: reused while valid, never across accounts."""
+
+import os
+import stat
+from datetime import timedelta
+from types import SimpleNamespace
+
+import fetch_google_forms_data as forms
+
+
+def credentials(email="bot@project.iam.gserviceaccount.com", token=None, expiry=None):
+    return SimpleNamespace(service_account_email=email, token=token, expiry=expiry)
+
+
+def test_a_saved_token_is_reused_until_near_expiry(tmp_path):
+    path = tmp_path / "token.json"
+    expiry = forms._utcnow() + timedelta(minutes=30)
+    forms.save_token(credentials(token="abc", expiry=expiry), path)
+
+    fresh = credentials()
+    assert forms.load_cached_token(fresh, path)
+    assert (fresh.token, fresh.expiry) == ("abc", expiry)
+
+
+def test_a_token_about_to_expire_is_not_reused(tmp_path):
+    path = tmp_path / "token.json"
+    forms.save_token(credentials(token="abc", expiry=forms._utcnow() + timedelta(minutes=2)), path)
+
+    assert not forms.load_cached_token(credentials(), path)
+
+
+def test_another_accounts_token_is_not_reused(tmp_path):
+    path = tmp_path / "token.json"
+    forms.save_token(credentials(token="abc", expiry=forms._utcnow() + timedelta(hours=1)), path)
+
+    assert not forms.load_cached_token(credentials(email="other@project.iam"), path)
+
+
+def test_a_missing_or_corrupt_cache_is_ignored(tmp_path):
+    path = tmp_path / "token.json"
+    assert not forms.load_cached_token(credentials(), path)
+    path.write_text("{not json")
+    assert not forms.load_cached_token(credentials(), path)
+
+
+def test_the_cache_is_private(tmp_path):
+    path = tmp_path / "token.json"
+    forms.save_token(credentials(token="abc", expiry=forms._utcnow()), path)
+
+    if os.name == "posix":
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
@@ -0,0 +1,87 @@
+"""Cold-start budget for the pipeline stages, measured with -X importtime.
+
+Importing a stage -- to run it, or just to reach one helper from a test --
+should cost its real dependencies and nothing more: no database engine or
+driver, and no googleapiclient outside the one function that talks to Google.
+Each module is imported in a fresh interpreter, as cron would start it.
+
+The budgets are generous on purpose; they exist to catch a new eager import of
+something heavy, not a noisy machine. IMPORT_BUDGET_SCALE multiplies them all
+on hardware slower than a small Fly VM.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1] / "src" / "python"
+
+SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1"))
+
+# Cumulative import time per module, in milliseconds. The stages all pay for
+# pandas (and most for SQLAlchemy), which is most of their figure.
+BUDGETS_MS = {
+    "config": 150,
+    "riot_client": 400,
+    "run_pipeline": 100,
+    "fetch_google_forms_data": 2000,
+    "generate_puuid": 2000,
+    "elo_check": 2000,
+    "elo_tracker": 2000,
+    "mastery": 2000,
+}
+
+# Loaded only once a stage actually needs them.
+DEFERRED_MODULES = ("googleapiclient", "google.oauth2", "psycopg2", "sqlalchemy.dialects.postgresql")
+
+PROBE = """
+import sys
+import {module}
+import config
+print(json.dumps({{
+    "engine_built": config._engine is not None,
+    "loaded": sorted(name for name in {deferred!r} if name in sys.modules),
+}}))
+"""
+
+
+def cold_import(module):
+    code = "import json\n" + PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC, capture_output=True, text=True, timeout=60,
+        env={**os.environ, "PYTHONPATH": str(SRC)},
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    assert cumulative_us is not None, f"{module} missing from -X importtime output"
+    return cumulative_us / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_stage_import_stays_within_budget(module):
+    budget = BUDGETS_MS[module] * SCALE
+    # Best of three, so one scheduling hiccup cannot fail the build.
+    timings = []
+    for _ in range(3):
+        elapsed_ms, probe = cold_import(module)
+        assert not probe["engine_built"], f"importing {module} built the database engine"
+        assert probe["loaded"] == [], f"importing {module} loaded {probe['loaded']}"
+        timings.append(elapsed_ms)
+        if elapsed_ms <= budget:
+            break
+
+    assert min(timings) <= budget, (
+        f"{module} took {min(timings):.0f} ms to import (budget {budget:.0f} ms)"
+    )
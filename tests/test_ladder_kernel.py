@@ -0,0 +1,125 @@
+"""The array kernel against the scalar reference, over every reachable rank.
+
+ladder_points_array and calculate_elo_change_array exist only to be fast; the
+scalar functions define what the answers are. Like test_ladder_points, these
+enumerate rather than sample.
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from elo_tracker import (
+    APEX_TIERS,
+    CHANGE_DEMOTED,
+    CHANGE_NONE,
+    CHANGE_PROMOTED,
+    DIVISION_ORDER,
+    LP_PER_DIVISION,
+    TIER_ORDER,
+    calculate_elo_change,
+    calculate_elo_change_array,
+    ladder_points,
+    ladder_points_array,
+)
+
+DIVISIONED_TIERS = [t for t in TIER_ORDER if t not in APEX_TIERS]
+
+CODES = {"PROMOTED": CHANGE_PROMOTED, "DEMOTED": CHANGE_DEMOTED, None: CHANGE_NONE}
+
+
+def every_rank():
+    for tier in DIVISIONED_TIERS:
+        for division in DIVISION_ORDER:
+            for lp in range(0, LP_PER_DIVISION + 1):
+                yield (tier, division, lp)
+    for tier in sorted(APEX_TIERS):
+        for division in (None, "I"):
+            for lp in range(0, 1001, 7):
+                yield (tier, division, lp)
+
+
+ALL_RANKS = list(every_rank())
+
+
+def columns(ranks):
+    tiers, divisions, lps = zip(*ranks)
+    return list(tiers), list(divisions), list(lps)
+
+
+def test_ladder_points_array_matches_the_scalar_for_every_rank():
+    expected = [ladder_points(t, d, lp) for t, d, lp in ALL_RANKS]
+    assert ladder_points_array(*columns(ALL_RANKS)).tolist() == expected
+
+
+def test_missing_lp_counts_as_zero():
+    result = ladder_points_array(["GOLD", "MASTER"], ["II", None], [None, np.nan])
+    assert result.tolist() == [ladder_points("GOLD", "II", None), ladder_points("MASTER", None, None)]
+
+
+def test_pandas_missing_divisions_read_as_none():
+    """pandas' string dtype turns None into NaN; both mean no division."""
+    divisions = pd.Series(["I", None], dtype="str")
+    result = ladder_points_array(["MASTER", "MASTER"], divisions, [10, 10])
+    assert result.tolist() == [ladder_points("MASTER", None, 10)] * 2
+
+
+def test_unknown_tier_raises_the_scalar_error():
+    with pytest.raises(ValueError, match="Unknown tier: 'WOOD'"):
+        ladder_points_array(["GOLD", "WOOD"], ["I", "I"], [0, 0])
+
+
+def test_unknown_division_raises_only_where_the_scalar_looks_at_it():
+    with pytest.raises(ValueError, match="Unknown division: 'V'"):
+        ladder_points_array(["GOLD"], ["V"], [0])
+    # Apex tiers never consult the division.
+    assert ladder_points_array(["MASTER"], ["V"], [5]).tolist() == [ladder_points("MASTER", "V", 5)]
+
+
+# Every division boundary and both LP extremes, across every pair of tiers:
+# 10 tiers x their divisions x 3 LP values, squared.
+SAMPLE_RANKS = [
+    (tier, division, lp)
+    for tier, division, lp in ALL_RANKS
+    if lp in (0, 50, 100)
+]
+
+
+def test_calculate_elo_change_array_matches_the_scalar_for_every_pair():
+    pairs = list(itertools.product(SAMPLE_RANKS, repeat=2))
+    old = columns([old for old, _ in pairs])
+    new = columns([new for _, new in pairs])
+
+    result = calculate_elo_change_array(*old, *new)
+
+    for i, ((ot, od, olp), (nt, nd, nlp)) in enumerate(pairs):
+        expected = calculate_elo_change(ot, od, olp, nt, nd, nlp)
+        got = (
+            result.lp_change[i],
+            result.tier_change[i],
+            result.division_change[i] != CHANGE_NONE,
+        )
+        assert got == (
+            expected["lp_change"],
+            CODES[expected["tier_change"]],
+            expected["division_change"] is not None,
+        ), ((ot, od, olp), (nt, nd, nlp))
+
+
+def test_division_change_direction():
+    result = calculate_elo_change_array(
+        ["GOLD", "GOLD", "GOLD"], ["III", "II", "II"], [50, 50, 50],
+        ["GOLD", "GOLD", "GOLD"], ["II", "III", "II"], [50, 50, 60],
+    )
+    assert result.division_change.tolist() == [CHANGE_PROMOTED, CHANGE_DEMOTED, CHANGE_NONE]
+
+
+def test_no_old_tier_reports_nothing():
+    result = calculate_elo_change_array([None], [None], [None], ["GOLD"], ["I"], [50])
+    expected = calculate_elo_change(None, None, None, "GOLD", "I", 50)
+
+    assert result.lp_change.tolist() == [expected["lp_change"]]
+    assert result.tier_change.tolist() == [CHANGE_NONE]
+    assert result.division_change.tolist() == [CHANGE_NONE]
@@ -0,0 +1,133 @@
+"""Mastery's slices of the roster, its concurrent fetch and its upsert. No
+database here, so the upsert's statements are pinned by their shape."""
+
+import pandas as pd
+import pytest
+
+import config
+import mastery
+
+class SliceState:
+    """Stands in for a connection to mastery_slice_state."""
+
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+
+    def execute(self, statement, params):
+        if str(statement).lstrip().startswith("SELECT"):
+            value = self.rows.get(params["slices"])
+            return Result(None if value is None else (value,))
+        self.rows[params["slices"]] = params["next_slice"]
+
+
+class Result:
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+
+def test_slices_start_at_zero_and_follow_the_last_finished_one():
+    state = SliceState()
+    seen = []
+    for _ in range(26):
+        slice_index = mastery.next_slice(state, slices=24)
+        seen.append(slice_index)
+        mastery.advance_slice(state, slice_index, slices=24)
+    assert seen == list(range(24)) + [0, 1]
+
+
+def test_an_unfinished_slice_is_taken_again():
+    state = SliceState({24: 5})
+    assert mastery.next_slice(state, slices=24) == 5
+    assert mastery.next_slice(state, slices=24) == 5
+
+
+def test_changing_the_slice_count_starts_a_fresh_rotation():
+    state = SliceState({24: 5})
+    assert mastery.next_slice(state, slices=12) == 0
+
+
+def test_a_single_slice_is_the_whole_roster():
+    state = SliceState()
+    mastery.advance_slice(state, 0, slices=1)
+    assert mastery.next_slice(state, slices=1) == 0
+
+
+def test_every_fetched_players_rows_are_collected(monkeypatch):
+    roster = pd.DataFrame({"puuid": ["a", "b", "c", "d"]}, index=pd.Index([1, 2, 3, 4], name="id"))
+    seen = {}
+    monkeypatch.setattr(config, "get_engine", lambda: None)
+    monkeypatch.setattr(mastery, "get_client", lambda: None)
+
+    def fetch_puuid(db_connection, slice_index=None):
+        seen["slice"] = slice_index
+        return roster
+
+    monkeypatch.setattr(mastery, "fetch_puuid", fetch_puuid)
+    answers = {"a": [{"puuid": "a", "championId": 1}], "b": None, "c": [], "d": [{"puuid": "d", "championId": 1}]}
+    monkeypatch.setattr(mastery, "fetch_player_mastery", lambda client, puuid: answers[puuid])
+
+    fetch = mastery.mastery_check(slice_index=7, concurrency=3)
+
+    assert seen["slice"] == 7
+    assert sorted(row["puuid"] for row in fetch.rows) == ["a", "d"]
+    # "b" failed and is left alone; "c" has no masteries and is cleared.
+    assert fetch.puuids == ["a", "c", "d"]
+
+
+def test_only_changed_rows_are_rewritten():
+    sql = mastery.upsert_sql(history=False)
+    assert 'ON CONFLICT ("puuid", "championId") DO UPDATE' in sql
+    assert 'mastery."championPoints" IS DISTINCT FROM EXCLUDED."championPoints"' in sql
+    assert 'OR mastery."lastPlayTime" IS DISTINCT FROM EXCLUDED."lastPlayTime"' in sql
+    assert '"puuid" = EXCLUDED."puuid"' not in sql
+    assert '"championSeasonMilestone" = EXCLUDED."championSeasonMilestone"' in sql
+    assert "mastery_history" not in sql
+
+
+def test_history_records_exactly_the_written_rows():
+    sql = mastery.upsert_sql(history=True)
+    assert sql.lstrip().startswith("WITH written AS (")
+    assert mastery.upsert_sql(history=False).strip() in sql
+    assert "INSERT INTO public.mastery_history" in sql
+    assert sql.rstrip().endswith("FROM written")
+
+
+def test_removed_champions_are_pruned_for_every_fetched_player(monkeypatch, recorder):
+    copied = []
+    monkeypatch.setattr(mastery, "copy_records", lambda conn, table, columns, rows: copied.extend(rows))
+
+    rows = [{"puuid": "a", "championId": 1}]
+    mastery.upsert_mastery(rows, ["a", "c"], history=False)
+
+    assert copied == rows
+    sql, params = recorder.statements[-1]
+    assert sql == mastery.PRUNE_SQL
+    assert params == {"puuids": ["a", "c"]}
+
+
+def test_without_puuids_only_players_in_the_rows_are_pruned(monkeypatch, recorder):
+    monkeypatch.setattr(mastery, "copy_records", lambda *args: None)
+
+    mastery.upsert_mastery([{"puuid": "b"}, {"puuid": "a"}, {"puuid": "b"}], history=False)
+
+    assert recorder.statements[-1][1] == {"puuids": ["a", "b"]}
+
+
+@pytest.mark.parametrize("fetch, advanced", [
+    (mastery.MasteryFetch([{"puuid": "a"}], ["a"], 2), True),
+    (mastery.MasteryFetch([], [], 0), True),
+    (mastery.MasteryFetch([], [], 2), False),
+])
+def test_a_slice_is_only_finished_when_a_fetch_succeeded(monkeypatch, recorder, fetch, advanced):
+    finished = []
+    monkeypatch.setattr(mastery, "next_slice", lambda connection: 5)
+    monkeypatch.setattr(mastery, "mastery_check", lambda slice_index: fetch)
+    monkeypatch.setattr(mastery, "upsert_mastery", lambda rows, puuids: len(rows))
+    monkeypatch.setattr(mastery, "advance_slice", lambda connection, index: finished.append(index))
+
+    mastery.main()
+
+    assert finished == ([5] if advanced else [])
@@ -0,0 +1,109 @@
+"""Per-run metrics: the collector, its two output formats, and what the Riot
+client records into it."""
+
+import json
+
+import pytest
+
+import config
+import metrics
+from conftest import FakeResponse, FakeSession
+from metrics import Metrics, write_metrics
+from rate_limiter import RateLimiter
+from riot_client import RiotClient
+
+
+@pytest.fixture
+def run(monkeypatch):
+    collector = Metrics("run-1")
+    monkeypatch.setattr(metrics, "_metrics", collector)
+    return collector
+
+
+def counters(collector):
+    return {
+        (c["name"], tuple(sorted(c["labels"].items()))): c["value"]
+        for c in collector.to_dict()["counters"]
+    }
+
+
+def test_counters_sum_per_label_set(run):
+    metrics.inc("riot_requests", method="m", status=200)
+    metrics.inc("riot_requests", method="m", status=200)
+    metrics.inc("riot_requests", method="m", status=429)
+
+    assert counters(run) == {
+        ("riot_requests", (("method", "m"), ("status", "200"))): 2,
+        ("riot_requests", (("method", "m"), ("status", "429"))): 1,
+    }
+
+
+def test_histogram_buckets_are_cumulative(run):
+    for seconds in (0.01, 0.2, 0.2, 45.0):
+        metrics.observe("riot_request_seconds", seconds, method="m")
+
+    (histogram,) = run.to_dict()["histograms"]
+    assert histogram["count"] == 4
+    assert histogram["sum"] == pytest.approx(45.41)
+    assert histogram["buckets"]["0.05"] == 1
+    assert histogram["buckets"]["0.25"] == 3
+    assert histogram["buckets"]["30"] == 3
+    assert histogram["buckets"]["+Inf"] == 4
+
+
+def test_prometheus_textfile(run):
+    run.record_stage("elo_check", 12.5, 0)
+    metrics.inc("elo_history_rows_written", 40)
+    metrics.observe("riot_request_seconds", 0.2, method="league")
+
+    text = run.to_prometheus()
+
+    assert '# TYPE elo_snitch_stage_duration_seconds gauge' in text
+    assert 'elo_snitch_pipeline_run_info{run_id="run-1"} 1' in text
+    assert 'elo_snitch_stage_duration_seconds{stage="elo_check"} 12.5' in text
+    assert '\nelo_snitch_elo_history_rows_written 40\n' in text
+    assert text.count("# TYPE elo_snitch_riot_request_seconds histogram") == 1
+    assert 'elo_snitch_riot_request_seconds_bucket{method="league",le="+Inf"} 1' in text
+    assert 'elo_snitch_riot_request_seconds_count{method="league"} 1' in text
+    assert text.count("run-1") == 1
+
+
+def test_write_metrics_writes_dated_json_latest_and_textfile(run, tmp_path):
+    run.record_stage("elo_tracker", 1.0, 0)
+    textfile = tmp_path / "textfile" / "elo_snitch.prom"
+
+    path = write_metrics(run, directory=tmp_path / "metrics", textfile=str(textfile))
+
+    assert path.name == "metrics_run-1.json"
+    assert json.loads(path.read_text()) == json.loads((tmp_path / "metrics" / "latest.json").read_text())
+    assert "elo_snitch_stage_exit_code" in textfile.read_text()
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_run_id_comes_from_the_environment_and_is_exported(monkeypatch):
+    monkeypatch.setenv(metrics.RUN_ID_ENV, "from-cron")
+    assert metrics.run_id() == "from-cron"
+
+    monkeypatch.delenv(metrics.RUN_ID_ENV)
+    generated = metrics.run_id()
+    assert generated
+    assert metrics.run_id() == generated
+
+
+# --- what the Riot client records -------------------------------------------
+
+def test_riot_client_counts_statuses_latency_and_429_waits(run, monkeypatch):
+    monkeypatch.setattr(config, "riot_headers", lambda: {"X-Riot-Token": "test"})
+    now = [0.0]
+    limiter = RateLimiter(clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+    session = FakeSession([FakeResponse(429, {"Retry-After": "3"}), FakeResponse(200)])
+
+    RiotClient(session=session, limiter=limiter, timeout=5).get("https://example", "league")
+
+    recorded = counters(run)
+    assert recorded[("riot_requests", (("method", "league"), ("status", "429")))] == 1
+    assert recorded[("riot_requests", (("method", "league"), ("status", "200")))] == 1
+    assert recorded[("riot_rate_limit_retries", (("method", "league"),))] == 1
+    assert recorded[("riot_rate_limit_wait_seconds", (("method", "league"),))] == 3
+    (latency,) = run.to_dict()["histograms"]
+    assert latency["count"] == 2
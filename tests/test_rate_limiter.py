@@ -0,0 +1,154 @@
+"""The header-driven limiter and the concurrent scan built on it.
+
+A fake clock drives every limiter test, so nothing here actually sleeps.
+"""
+
+import pandas as pd
+import pytest
+
+import elo_check
+from rate_limiter import RateLimiter, parse_rate_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def limiter(app_limits="3:1,5:10"):
+    clock = FakeClock()
+    return RateLimiter(app_limits, clock=clock, sleep=clock.sleep), clock
+
+
+# --- header parsing ----------------------------------------------------------
+
+def test_parse_rate_limits_reads_every_window():
+    assert parse_rate_limits("20:1,100:120") == [(20, 1), (100, 120)]
+
+
+def test_parse_rate_limits_skips_garbage():
+    assert parse_rate_limits("20:1,nonsense,5:") == [(20, 1)]
+    assert parse_rate_limits(None) == []
+
+
+# --- buckets -----------------------------------------------------------------
+
+def test_burst_up_to_the_short_window_then_waits_for_it():
+    rl, clock = limiter()
+
+    for _ in range(3):
+        rl.acquire("m")
+    assert clock.slept == []
+
+    rl.acquire("m")
+    assert clock.slept == [1.0]
+
+
+def test_long_window_caps_the_total_across_short_windows():
+    """5 per 10s must hold even though 3 per 1s keeps refilling."""
+    rl, clock = limiter()
+
+    for _ in range(5):
+        rl.acquire("m")
+    rl.acquire("m")
+
+    assert clock.now == pytest.approx(10.0)
+
+
+def test_riot_counts_override_our_own_when_stricter():
+    """Another process on the same key spent quota we never saw."""
+    rl, clock = limiter()
+
+    rl.update("m", {"X-App-Rate-Limit": "3:1,5:10", "X-App-Rate-Limit-Count": "1:1,5:10"})
+    rl.acquire("m")
+
+    assert clock.now == pytest.approx(10.0)
+
+
+def test_new_limits_from_headers_replace_the_defaults():
+    """A production key's real quota is learned from the first response."""
+    rl, clock = limiter()
+
+    rl.update("m", {"X-App-Rate-Limit": "500:10", "X-App-Rate-Limit-Count": "1:10"})
+    for _ in range(499):
+        rl.acquire("m")
+
+    assert clock.slept == []
+
+
+def test_method_limits_only_throttle_their_own_endpoint():
+    rl, clock = limiter("100:1")
+    rl.update("slow", {"X-Method-Rate-Limit": "1:5", "X-Method-Rate-Limit-Count": "1:5"})
+
+    rl.acquire("fast")
+    assert clock.slept == []
+
+    rl.acquire("slow")
+    assert clock.now == pytest.approx(5.0)
+
+
+def test_application_429_pauses_every_method_for_retry_after():
+    rl, clock = limiter("100:1")
+
+    waited = rl.penalize("m", {"Retry-After": "7", "X-Rate-Limit-Type": "application"})
+    rl.acquire("other")
+
+    assert waited == 7
+    assert clock.now == pytest.approx(7.0)
+
+
+def test_method_429_leaves_other_methods_alone():
+    rl, clock = limiter("100:1")
+
+    rl.penalize("m", {"Retry-After": "7", "X-Rate-Limit-Type": "method"})
+    rl.acquire("other")
+    assert clock.now == 0
+
+    rl.acquire("m")
+    assert clock.now == pytest.approx(7.0)
+
+
+def test_429_without_retry_after_uses_the_default():
+    rl, _ = limiter()
+    assert rl.penalize("m", {}) == 60
+
+
+# --- the concurrent scan -----------------------------------------------------
+
+def test_concurrent_scan_returns_rows_in_player_order(monkeypatch):
+    players = pd.DataFrame(
+        {"summ_id": [f"p{i}" for i in range(20)], "puuid": [f"u{i}" for i in range(20)]},
+        index=pd.Index(range(100, 120), name="id"),
+    )
+
+    def fake_fetch(client, puuid):
+        number = int(puuid[1:])
+        if number % 7 == 3:
+            return None  # failed call: the player is skipped, not fatal
+        return [
+            {"queueType": "RANKED_FLEX_SR", "tier": "GOLD", "rank": "I",
+             "leaguePoints": number, "wins": 1, "losses": 1},
+            {"queueType": "RANKED_SOLO_5x5", "tier": "SILVER", "rank": "II",
+             "leaguePoints": number, "wins": 2, "losses": 3},
+        ]
+
+    monkeypatch.setattr(elo_check, "fetch_players", lambda: players)
+    monkeypatch.setattr(elo_check, "fetch_entries", fake_fetch)
+
+    sequential = elo_check.elo_check(concurrency=1)
+    concurrent = elo_check.elo_check(concurrency=8)
+
+    def strip_time(rows):
+        return [{k: v for k, v in row.items() if k != "timestamp"} for row in rows]
+
+    assert strip_time(concurrent) == strip_time(sequential)
+    assert [row["queue_type"] for row in sequential[:2]] == ["RANKED_SOLO_5x5", "RANKED_FLEX_SR"]
+    assert 103 not in {row["player_key"] for row in sequential}
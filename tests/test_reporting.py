@@ -1,10 +1,16 @@
-"""Ranking and message assembly: get_top_changes, process_queue_changes, formatters."""
+"""Ranking and message assembly: get_top_changes, process_queue_changes,
+diff_queues, formatters."""
+
+import random
 
 import pandas as pd
 import pytest
 
 from elo_tracker import (
+    DIVISION_ORDER,
+    TIER_ORDER,
     convert_to_python_types,
+    diff_queues,
     format_elo_changes_message,
     format_tier_rank,
     format_winrate_message,
@@ -121,6 +127,83 @@ def test_player_absent_from_current_scan_yields_nothing():
     assert process_queue_changes("missing", current, previous, "Solo/Duo Queue") == []
 
 
+# --- diff_queues -------------------------------------------------------------
+
+def per_player_loop(puuid_df, queue_data):
+    """What track_elo_changes did before diff_queues."""
+    changes = []
+    for _, row in puuid_df.iterrows():
+        for queue_name, (current_df, previous_df) in queue_data.items():
+            changes.extend(
+                process_queue_changes(row['summ_id'], current_df, previous_df, queue_name)
+            )
+    return changes
+
+
+def random_standing(rng, summ_id):
+    tier = rng.choice(TIER_ORDER)
+    # Riot reports every apex player as division "I".
+    rank = "I" if tier in ("MASTER", "GRANDMASTER", "CHALLENGER") else rng.choice(DIVISION_ORDER)
+    return {"summ_id": summ_id, "tier": tier, "rank": rank, "league_points": rng.randint(0, 100)}
+
+
+def test_diff_queues_matches_the_per_player_loop():
+    rng = random.Random(7)
+    players = [f"p{i}" for i in range(300)]
+    puuid_df = pd.DataFrame({"summ_id": players, "puuid": [f"u{i}" for i in range(300)]})
+
+    queue_data = {}
+    for queue_name in ("Solo/Duo Queue", "Flex Queue"):
+        current, previous = [], []
+        for summ_id in players:
+            if rng.random() < 0.9:
+                current.append(random_standing(rng, summ_id))
+            if rng.random() < 0.9:
+                # Half the players keep their standing, so "no change" is common.
+                if current and current[-1]["summ_id"] == summ_id and rng.random() < 0.5:
+                    previous.append(dict(current[-1]))
+                else:
+                    previous.append(random_standing(rng, summ_id))
+        queue_data[queue_name] = (pd.DataFrame(current), pd.DataFrame(previous))
+
+    expected = per_player_loop(puuid_df, queue_data)
+
+    assert expected
+    assert diff_queues(puuid_df, queue_data) == expected
+
+
+def test_diff_queues_interleaves_queues_per_player():
+    puuid_df = pd.DataFrame({"summ_id": ["b", "a"], "puuid": ["ub", "ua"]})
+    solo = (
+        pd.concat([frame("a", "GOLD", "I", 60), frame("b", "GOLD", "I", 60)]),
+        pd.concat([frame("a", "GOLD", "I", 40), frame("b", "GOLD", "I", 40)]),
+    )
+    flex = (frame("b", "SILVER", "II", 10), frame("b", "SILVER", "III", 90))
+
+    changes = diff_queues(puuid_df, {"Solo/Duo Queue": solo, "Flex Queue": flex})
+
+    assert [(c["summ_id"], c["queue"]) for c in changes] == [
+        ("b", "Solo/Duo Queue"), ("b", "Flex Queue"), ("a", "Solo/Duo Queue"),
+    ]
+    assert changes == per_player_loop(puuid_df, {"Solo/Duo Queue": solo, "Flex Queue": flex})
+
+
+def test_diff_queues_with_empty_frames():
+    puuid_df = pd.DataFrame({"summ_id": ["a"], "puuid": ["ua"]})
+    empty = pd.DataFrame(columns=["summ_id", "tier", "rank", "league_points"])
+
+    assert diff_queues(puuid_df, {"Solo/Duo Queue": (empty, empty)}) == []
+    assert diff_queues(puuid_df, {"Solo/Duo Queue": (frame("a", "GOLD", "I", 5), empty)}) == []
+
+
+def test_diff_queues_rejects_unknown_tiers_like_the_scalar_path():
+    puuid_df = pd.DataFrame({"summ_id": ["a"], "puuid": ["ua"]})
+    queue_data = {"Solo/Duo Queue": (frame("a", "WOOD", "I", 5), frame("a", "GOLD", "I", 5))}
+
+    with pytest.raises(ValueError, match="Unknown tier"):
+        diff_queues(puuid_df, queue_data)
+
+
 # --- formatting --------------------------------------------------------------
 
 def test_format_tier_rank_omits_empty_division():
@@ -0,0 +1,74 @@
+"""The shared Riot client: rate-limit handling and the process-wide singleton."""
+
+import pytest
+
+import config
+import riot_client
+from conftest import FakeResponse, FakeSession
+from rate_limiter import RateLimiter
+from riot_client import MAX_RATE_LIMIT_RETRIES, RiotClient
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    monkeypatch.setattr(config, "riot_headers", lambda: {"X-Riot-Token": "test"})
+
+    def build(responses):
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(clock=lambda: now[0], sleep=sleep)
+        session = FakeSession(responses)
+        return RiotClient(session=session, limiter=limiter, timeout=5), session, slept
+
+    return build
+
+
+def test_a_429_is_waited_out_and_retried(client_for):
+    client, session, slept = client_for([
+        FakeResponse(429, {"Retry-After": "3"}),
+        FakeResponse(200),
+    ])
+
+    response = client.get("https://example/league", "m")
+
+    assert response.status_code == 200
+    assert len(session.calls) == 2
+    assert slept == [3.0]
+
+
+def test_every_request_carries_the_auth_header_and_timeout(client_for):
+    client, session, _ = client_for([FakeResponse(200)])
+
+    client.get("https://example/league", "m")
+
+    _, headers, timeout = session.calls[0]
+    assert headers == {"X-Riot-Token": "test"}
+    assert timeout == 5
+
+
+def test_gives_up_after_the_retry_budget(client_for):
+    client, session, _ = client_for(
+        [FakeResponse(429, {"Retry-After": "1"})] * (MAX_RATE_LIMIT_RETRIES + 1)
+    )
+
+    response = client.get("https://example/league", "m")
+
+    assert response.status_code == 429
+    assert len(session.calls) == MAX_RATE_LIMIT_RETRIES + 1
+
+
+def test_errors_other_than_429_are_returned_untouched(client_for):
+    client, session, _ = client_for([FakeResponse(404)])
+
+    assert client.get("https://example/account", "m").status_code == 404
+    assert len(session.calls) == 1
+
+
+def test_get_client_is_shared(monkeypatch):
+    monkeypatch.setattr(riot_client, "_client", None)
+    assert riot_client.get_client() is riot_client.get_client()
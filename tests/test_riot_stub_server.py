@@ -0,0 +1,116 @@
+"""The offline Riot stand-in: routing, quota behaviour, and a real round trip."""
+
+import threading
+
+import pytest
+
+import config
+from rate_limiter import RateLimiter
+from riot_client import RiotClient, create_session
+from riot_stub_server import (
+    StubRiot,
+    create_server,
+    synthetic_entries,
+    synthetic_puuid,
+)
+
+AUTH = {"X-Riot-Token": "stub"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_account_lookup_is_deterministic():
+    stub = StubRiot()
+    status, _, body = stub.handle("/riot/account/v1/accounts/by-riot-id/Sadme17/EUW", AUTH)
+
+    assert status == 200
+    assert body["puuid"] == synthetic_puuid("Sadme17", "EUW")
+
+
+def test_league_entries_have_the_fields_elo_check_reads():
+    for entry in synthetic_entries("some-puuid", hour=10):
+        assert {"queueType", "tier", "rank", "leaguePoints", "wins", "losses"} <= entry.keys()
+
+
+def test_entries_drift_between_hours():
+    """Otherwise consecutive tracker runs would never see a change."""
+    puuids = [f"p{i}" for i in range(30)]
+    moved = [p for p in puuids if synthetic_entries(p, 10) != synthetic_entries(p, 11)]
+    assert 0 < len(moved) < len(puuids)
+
+
+def test_missing_token_is_rejected():
+    status, _, _ = StubRiot().handle("/lol/league/v4/entries/by-puuid/x", {})
+    assert status == 401
+
+
+def test_unknown_paths_404():
+    status, _, _ = StubRiot().handle("/lol/summoner/v4/whatever", AUTH)
+    assert status == 404
+
+
+def test_spent_window_returns_429_with_retry_after_and_counts():
+    clock = Clock()
+    stub = StubRiot(app_limits="2:10", clock=clock)
+    path = "/lol/league/v4/entries/by-puuid/x"
+
+    first = stub.handle(path, AUTH)
+    stub.handle(path, AUTH)
+    clock.now = 4.0
+    status, headers, _ = stub.handle(path, AUTH)
+
+    assert first[1]["X-App-Rate-Limit"] == "2:10"
+    assert first[1]["X-App-Rate-Limit-Count"] == "1:10"
+    assert status == 429
+    assert headers["Retry-After"] == "6"
+    assert headers["X-Rate-Limit-Type"] == "application"
+
+    clock.now = 10.0
+    assert stub.handle(path, AUTH)[0] == 200
+
+
+def test_key_expiry_turns_every_call_into_403():
+    clock = Clock()
+    stub = StubRiot(key_ttl=60, clock=clock)
+    path = "/lol/league/v4/entries/by-puuid/x"
+
+    assert stub.handle(path, AUTH)[0] == 200
+    clock.now = 60.0
+    assert stub.handle(path, AUTH)[0] == 403
+
+
+def test_fixtures_take_precedence_over_synthetic_data():
+    path = "/lol/league/v4/entries/by-puuid/recorded"
+    stub = StubRiot(fixtures={path: {"status": 200, "body": [{"queueType": "X"}]}})
+
+    assert stub.handle(path, AUTH)[2] == [{"queueType": "X"}]
+
+
+@pytest.fixture
+def running_server():
+    server = create_server(StubRiot(app_limits="1000:1"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_riot_client_round_trip_over_http(running_server, monkeypatch):
+    monkeypatch.setattr(config, "riot_headers", lambda: AUTH)
+    limiter = RateLimiter()
+    client = RiotClient(session=create_session(2), limiter=limiter, timeout=5)
+
+    response = client.get(f"{running_server}/lol/league/v4/entries/by-puuid/abc", "league")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert {entry["puuid"] for entry in response.json()} == {"abc"}
+    assert limiter._limits["application"] == "1000:1"
@@ -0,0 +1,260 @@
+"""The in-process runner: stage ordering, failure isolation and exit codes."""
+
+import json
+import logging
+import sys
+import threading
+import types
+
+import pytest
+
+import config
+import metrics
+import run_pipeline
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "METRICS_DIR", tmp_path / "metrics")
+    monkeypatch.setattr(config, "METRICS_TEXTFILE", None)
+    monkeypatch.setattr(metrics, "_metrics", metrics.Metrics("test-run"))
+
+
+def fake_stage(monkeypatch, name, calls, behaviour=None):
+    module = types.ModuleType(name)
+
+    def main():
+        calls.append(name)
+        if behaviour is not None:
+            behaviour()
+
+    module.main = main
+    monkeypatch.setitem(sys.modules, name, module)
+
+
+def raise_(error):
+    def behaviour():
+        raise error
+    return behaviour
+
+
+def stages(*names):
+    """A chain: each stage requires the one before it."""
+    return tuple(
+        run_pipeline.Stage(name, name, ("main",), requires=tuple(names[i - 1:i]))
+        for i, name in enumerate(names)
+    )
+
+
+def stage(name, **dependencies):
+    return run_pipeline.Stage(name, name, ("main",), **dependencies)
+
+
+def test_stages_run_in_order_in_this_process(monkeypatch):
+    calls = []
+    for name in ("one", "two", "three"):
+        fake_stage(monkeypatch, name, calls)
+
+    assert run_pipeline.run_pipeline(stages("one", "two", "three")) == 0
+    assert calls == ["one", "two", "three"]
+
+
+def test_a_raising_stage_stops_the_run_with_exit_code_1(monkeypatch, capsys):
+    calls = []
+    fake_stage(monkeypatch, "one", calls, raise_(RuntimeError("boom")))
+    fake_stage(monkeypatch, "two", calls)
+
+    assert run_pipeline.run_pipeline(stages("one", "two")) == 1
+    assert calls == ["one"]
+    err = capsys.readouterr().err
+    assert "RuntimeError: boom" in err
+    assert "ERROR: one failed with exit code 1" in err
+    assert "Skipping two: one did not succeed" in err
+
+
+@pytest.mark.parametrize("code, expected", [(None, 0), (0, 0), (3, 3), ("bad", 1)])
+def test_sys_exit_inside_a_stage_is_its_exit_code(monkeypatch, code, expected):
+    fake_stage(monkeypatch, "one", [], raise_(SystemExit(code)))
+    assert run_pipeline.run_stage("one", ("main",)).exit_code == expected
+
+
+def test_clean_sys_exit_lets_the_run_continue(monkeypatch):
+    calls = []
+    fake_stage(monkeypatch, "one", calls, raise_(SystemExit(0)))
+    fake_stage(monkeypatch, "two", calls)
+
+    assert run_pipeline.run_pipeline(stages("one", "two")) == 0
+    assert calls == ["one", "two"]
+
+
+def test_a_stage_that_cannot_be_imported_fails_cleanly(caplog):
+    assert run_pipeline.run_stage("no_such_stage_module", ("main",)).exit_code == 1
+    (record,) = [r for r in caplog.records if r.name == "run_pipeline"]
+    assert "no_such_stage_module" in record.getMessage()
+
+
+def test_a_crash_is_written_to_the_stages_own_log(monkeypatch, caplog):
+    fake_stage(monkeypatch, "one", [], raise_(RuntimeError("boom")))
+    sys.modules["one"].logger = logging.getLogger("one")
+
+    assert run_pipeline.run_stage("one", ("main",)).exit_code == 1
+
+    (record,) = [r for r in caplog.records if r.name == "one"]
+    assert record.levelno == logging.ERROR
+    assert "boom" in record.getMessage()
+    assert record.exc_info[0] is RuntimeError
+
+
+def test_entry_points_are_called_in_order(monkeypatch):
+    calls = []
+    module = types.ModuleType("forms")
+    module.test_network_connectivity = lambda: calls.append("connectivity")
+    module.main = lambda: calls.append("main")
+    monkeypatch.setitem(sys.modules, "forms", module)
+
+    assert run_pipeline.run_stage("forms", ("test_network_connectivity", "main")).exit_code == 0
+    assert calls == ["connectivity", "main"]
+
+
+def test_every_stage_module_exists():
+    for pipeline_stage in run_pipeline.STAGES:
+        assert (run_pipeline.SCRIPT_DIR / f"{pipeline_stage.module}.py").exists()
+
+
+def test_the_pipeline_graph_is_valid():
+    run_pipeline._check_graph(run_pipeline.STAGES)
+
+
+def test_stage_timings_and_exit_codes_are_written_even_when_a_stage_fails(monkeypatch, tmp_path):
+    fake_stage(monkeypatch, "one", [])
+    fake_stage(monkeypatch, "two", [], raise_(RuntimeError("boom")))
+
+    assert run_pipeline.run_pipeline(stages("one", "two")) == 1
+
+    written = json.loads((tmp_path / "metrics" / "latest.json").read_text())
+    assert written["run_id"] == "test-run"
+    assert [(s["stage"], s["exit_code"]) for s in written["stages"]] == [("one", 0), ("two", 1)]
+
+
+def test_a_stage_skipped_by_a_failed_requirement_is_recorded(monkeypatch, tmp_path):
+    fake_stage(monkeypatch, "one", [], raise_(RuntimeError("boom")))
+    fake_stage(monkeypatch, "two", [])
+
+    assert run_pipeline.run_pipeline(stages("one", "two")) == 1
+
+    written = json.loads((tmp_path / "metrics" / "latest.json").read_text())
+    assert [(s["stage"], s["exit_code"]) for s in written["stages"]] == [
+        ("one", 1), ("two", run_pipeline.SKIPPED),
+    ]
+
+
+def test_independent_stages_run_concurrently(monkeypatch):
+    # Each waits for the other; run one after the other, the barrier times out.
+    barrier = threading.Barrier(2, timeout=5)
+    fake_stage(monkeypatch, "sheet", [], barrier.wait)
+    fake_stage(monkeypatch, "scan", [], barrier.wait)
+
+    assert run_pipeline.run_pipeline((stage("sheet"), stage("scan"))) == 0
+
+
+def test_a_stage_waits_for_its_dependencies(monkeypatch):
+    calls = []
+    for name in ("sheet", "puuid", "scan", "rescan", "report"):
+        fake_stage(monkeypatch, name, calls)
+
+    graph = (
+        stage("report", requires=("scan",), after=("rescan",)),
+        stage("rescan", requires=("scan",), after=("puuid",)),
+        stage("puuid", requires=("sheet",)),
+        stage("sheet"),
+        stage("scan"),
+    )
+    assert run_pipeline.run_pipeline(graph) == 0
+    assert calls.index("puuid") > calls.index("sheet")
+    assert calls.index("rescan") > max(calls.index("puuid"), calls.index("scan"))
+    assert calls[-1] == "report"
+
+
+def test_after_runs_even_when_that_stage_failed(monkeypatch, capsys):
+    calls = []
+    fake_stage(monkeypatch, "sheet", calls, raise_(RuntimeError("sheet down")))
+    fake_stage(monkeypatch, "puuid", calls)
+    fake_stage(monkeypatch, "scan", calls)
+    fake_stage(monkeypatch, "report", calls)
+
+    graph = (
+        stage("sheet"),
+        stage("puuid", requires=("sheet",)),
+        stage("scan"),
+        stage("report", requires=("scan",), after=("puuid",)),
+    )
+    # The run still fails, but the scan is reported rather than lost.
+    assert run_pipeline.run_pipeline(graph) == 1
+    assert "puuid" not in calls
+    assert calls[-1] == "report"
+    assert "Skipping puuid: sheet did not succeed" in capsys.readouterr().err
+
+
+def test_skips_propagate_through_requires(monkeypatch):
+    calls = []
+    for name in ("one", "two", "three"):
+        fake_stage(monkeypatch, name, calls)
+    fake_stage(monkeypatch, "one", calls, raise_(RuntimeError("boom")))
+
+    assert run_pipeline.run_pipeline(stages("one", "two", "three")) == 1
+    assert calls == ["one"]
+
+
+def test_a_stage_result_is_passed_to_the_stages_that_take_it(monkeypatch):
+    received = []
+    first = types.ModuleType("one")
+    first.main = lambda: "first pass"
+    second = types.ModuleType("two")
+    second.main = lambda result: received.append(result)
+    monkeypatch.setitem(sys.modules, "one", first)
+    monkeypatch.setitem(sys.modules, "two", second)
+
+    graph = (stage("one"), stage("two", requires=("one",), inputs=("one",)))
+
+    assert run_pipeline.run_pipeline(graph) == 0
+    assert received == ["first pass"]
+
+
+@pytest.mark.parametrize("graph", [
+    (stage("one", requires=("two",)), stage("two", after=("one",))),
+    (stage("one", requires=("missing",)),),
+    (stage("one"), stage("one")),
+    (stage("one"), stage("two", after=("one",), inputs=("one",))),
+])
+def test_a_broken_graph_is_rejected_before_anything_runs(monkeypatch, graph):
+    calls = []
+    fake_stage(monkeypatch, "one", calls)
+    fake_stage(monkeypatch, "two", calls)
+
+    with pytest.raises(ValueError):
+        run_pipeline.run_pipeline(graph)
+    assert calls == []
+
+
+def test_a_skipped_stage_is_left_out_and_its_dependants_still_run(monkeypatch):
+    calls = []
+    for name in ("one", "two", "three"):
+        fake_stage(monkeypatch, name, calls)
+
+    graph = run_pipeline.without_stages(stages("one", "two", "three"), ["one"])
+
+    assert [s.name for s in graph] == ["two", "three"]
+    assert graph[0].requires == ()
+    assert run_pipeline.run_pipeline(graph) == 0
+    assert calls == ["two", "three"]
+
+
+def test_skipping_the_sheet_fetch_keeps_the_rest_of_the_pipeline():
+    graph = run_pipeline.without_stages(run_pipeline.STAGES, ["fetch_google_forms_data"])
+    run_pipeline._check_graph(graph)
+    assert "generate_puuid" in [s.name for s in graph]
+
+
+def test_skipping_an_unknown_stage_is_an_error():
+    with pytest.raises(ValueError):
+        run_pipeline.without_stages(run_pipeline.STAGES, ["nope"])
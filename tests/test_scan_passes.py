@@ -0,0 +1,42 @@
+"""elo_check's two-pass scan: the existing roster, then newly resolved players."""
+
+import pandas as pd
+import pytest
+
+import elo_check
+
+
+def roster(*player_keys):
+    return pd.DataFrame({"puuid": [f"p{key}" for key in player_keys]},
+                        index=pd.Index(player_keys, name="id"))
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    calls = []
+    monkeypatch.setattr(elo_check, "run_scan",
+                        lambda players, scanned_at: calls.append((list(players.index), scanned_at)))
+    return calls
+
+
+def test_the_follow_up_scan_covers_only_new_players_at_the_same_time(monkeypatch, scans):
+    monkeypatch.setattr(elo_check, "fetch_players", lambda: roster(1, 2))
+    first_pass = elo_check.scan_existing_players()
+    monkeypatch.setattr(elo_check, "fetch_players", lambda: roster(1, 2, 3))
+    elo_check.scan_new_players(first_pass)
+
+    (first, first_at), (second, second_at) = scans
+    assert (first, second) == ([1, 2], [3])
+    assert second_at == first_at == first_pass.scanned_at
+
+
+def test_no_new_players_means_no_second_scan(monkeypatch, scans):
+    monkeypatch.setattr(elo_check, "fetch_players", lambda: roster(1, 2))
+    elo_check.scan_new_players(elo_check.scan_existing_players())
+    assert len(scans) == 1
+
+
+def test_without_a_first_pass_the_follow_up_does_nothing(monkeypatch, scans):
+    monkeypatch.setattr(elo_check, "fetch_players", lambda: roster(1, 2))
+    elo_check.scan_new_players()
+    assert scans == []
@@ -0,0 +1,128 @@
+"""Adaptive scan cadence: who is due a rescan, and when. The activity query
+runs against an in-memory SQLite elo_history."""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from scan_scheduler import (
+    ACTIVITY_LOOKBACK_HOURS, fetch_last_active, is_due, scan_interval, select_due,
+)
+
+NOW = datetime(2026, 8, 9, 12, 0, 0)
+DAY = timedelta(hours=24)
+
+
+@pytest.mark.parametrize(
+    "idle_hours, expected_hours",
+    [(0, 0), (23, 0), (24, 6), (71, 6), (72, 12), (167, 12), (168, 24), (2000, 24)],
+)
+def test_interval_backs_off_with_idle_time(idle_hours, expected_hours):
+    assert scan_interval(timedelta(hours=idle_hours), DAY) == timedelta(hours=expected_hours)
+
+
+def test_no_recorded_activity_gets_the_longest_interval():
+    assert scan_interval(None, DAY) == DAY
+
+
+def test_max_staleness_caps_every_interval():
+    cap = timedelta(hours=8)
+    assert scan_interval(None, cap) == cap
+    assert scan_interval(timedelta(hours=100), cap) == cap
+    assert scan_interval(timedelta(0), cap) == timedelta(0)
+
+
+def test_never_scanned_is_always_due():
+    assert is_due(None, None, NOW, DAY)
+
+
+def test_active_player_is_due_every_run():
+    assert is_due(NOW - timedelta(minutes=50), NOW - timedelta(hours=2), NOW, DAY)
+
+
+def test_dormant_player_waits_out_their_interval():
+    week_idle = NOW - timedelta(days=8)
+
+    assert not is_due(NOW - timedelta(hours=23), week_idle, NOW, DAY)
+    assert is_due(NOW - timedelta(hours=24), week_idle, NOW, DAY)
+
+
+def test_select_due_filters_the_roster_by_player_key():
+    roster = pd.DataFrame(
+        {"summ_id": ["hot", "cold", "new"], "puuid": ["a", "b", "c"]},
+        index=pd.Index([1, 2, 3], name="id"),
+    )
+    last_scanned = {1: NOW - timedelta(hours=1), 2: NOW - timedelta(hours=1)}
+    last_active = {1: NOW - timedelta(hours=3)}
+
+    due = select_due(roster, last_scanned, last_active, NOW, DAY)
+
+    assert list(due["summ_id"]) == ["hot", "new"]
+
+
+@pytest.fixture
+def history():
+    """An in-memory elo_history behind an engine, for the activity query."""
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.execute("ATTACH ':memory:' AS public")
+    db.execute(
+        "CREATE TABLE public.elo_history (player_key INTEGER, queue_type TEXT,"
+        " wins INTEGER, losses INTEGER, timestamp TIMESTAMP)"
+    )
+
+    def insert(player_key, hours_ago, games, queue_type="RANKED_SOLO_5x5"):
+        db.execute(
+            "INSERT INTO public.elo_history VALUES (?, ?, ?, 0, ?)",
+            (player_key, queue_type, games, NOW - timedelta(hours=hours_ago)),
+        )
+        db.commit()
+
+    engine = create_engine("sqlite://", creator=lambda: db, poolclass=StaticPool)
+    yield insert, engine
+    engine.dispose()
+
+
+def last_active(engine):
+    # SQLite hands timestamps back as text.
+    return {key: datetime.fromisoformat(at) for key, at in fetch_last_active(NOW, engine).items()}
+
+
+def test_the_first_game_in_the_window_counts_against_the_row_before_it(history):
+    insert, engine = history
+    before = ACTIVITY_LOOKBACK_HOURS + 6
+    insert(7, before, 10)
+    insert(7, 3, 11)
+
+    assert last_active(engine) == {7: NOW - timedelta(hours=3)}
+
+
+def test_only_the_latest_row_before_the_window_is_compared(history):
+    insert, engine = history
+    before = ACTIVITY_LOOKBACK_HOURS + 6
+    insert(8, before + 24, 5)
+    insert(8, before, 10)
+    insert(8, 3, 10)
+
+    assert last_active(engine) == {}
+
+
+def test_activity_is_the_latest_increase_in_any_queue(history):
+    insert, engine = history
+    insert(9, 5, 10)
+    insert(9, 4, 11)
+    insert(9, 2, 11)
+    insert(9, 6, 1, queue_type="RANKED_FLEX_SR")
+    insert(9, 1, 2, queue_type="RANKED_FLEX_SR")
+
+    assert last_active(engine) == {9: NOW - timedelta(hours=1)}
+
+
+def test_a_single_row_is_not_activity(history):
+    insert, engine = history
+    insert(10, 2, 30)
+
+    assert last_active(engine) == {}
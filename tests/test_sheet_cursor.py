@@ -0,0 +1,129 @@
+"""Incremental form ingestion: which rows are read, and when the whole sheet is."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from fetch_google_forms_data import SheetCursor, fetch_new_responses, row_hash, split_range
+
+NOW = datetime(2026, 8, 9, 12, 0, 0)
+HEADER = ["Timestamp", "Summoner ID (case sensitive)", "Tag line (e.g #EUW) ", "Region"]
+
+
+def response(n):
+    return [f"8/{n}/2026 10:00:00", f"player{n}", "EUW", "EUW"]
+
+
+class FakeSheet:
+    """Just enough of the Sheets values API to serve one sheet's rows."""
+
+    def __init__(self, rows):
+        self.rows = [HEADER] + rows
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _read(self, a1):
+        cells = a1.rpartition("!")[2]
+        start, _, end = cells.partition(":")
+        first = int(start.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ") or 1)
+        last = end.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        values = self.rows[first - 1:int(last) if last else None]
+        return {"values": values} if values else {}
+
+    def get(self, spreadsheetId, range):
+        self.calls.append("get")
+        return Result(self._read(range))
+
+    def batchGet(self, spreadsheetId, ranges):
+        self.calls.append("batchGet")
+        return Result({"valueRanges": [self._read(a1) for a1 in ranges]})
+
+
+class Result:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def execute(self):
+        return self.payload
+
+
+@pytest.fixture(autouse=True)
+def sheet_config(monkeypatch):
+    monkeypatch.setattr(config, "google_sheet_id", lambda: "sheet")
+    monkeypatch.setattr(config, "SHEET_FULL_RESYNC_HOURS", 24)
+
+
+def cursor_after(rows, synced_hours_ago=1):
+    return SheetCursor(len(rows), row_hash(rows[-1]), NOW - timedelta(hours=synced_hours_ago))
+
+
+def read(sheet, cursor):
+    return fetch_new_responses(cursor, "Form Responses 1!A:D", service=sheet, now=NOW)
+
+
+def test_split_range():
+    assert split_range("Form Responses 1!A:D") == ("Form Responses 1", "A", "D")
+    assert split_range("Sheet1!B2:E") == ("Sheet1", "B", "E")
+
+
+def test_first_run_reads_the_whole_sheet():
+    rows = [response(1), response(2)]
+    df, cursor = read(FakeSheet(rows), None)
+
+    assert list(df["summ_id"]) == ["player1", "player2"]
+    assert cursor == SheetCursor(2, row_hash(rows[-1]), NOW)
+
+
+def test_only_rows_after_the_cursor_are_returned():
+    rows = [response(1), response(2), response(3)]
+    sheet = FakeSheet(rows)
+
+    df, cursor = read(sheet, cursor_after(rows[:2]))
+
+    assert sheet.calls == ["batchGet"]
+    assert list(df["summ_id"]) == ["player3"]
+    assert cursor.rows_ingested == 3
+    assert cursor.last_row_hash == row_hash(rows[-1])
+
+
+def test_nothing_new_keeps_the_cursor():
+    rows = [response(1), response(2)]
+    previous = cursor_after(rows)
+
+    df, cursor = read(FakeSheet(rows), previous)
+
+    assert df.empty
+    assert cursor == previous
+
+
+@pytest.mark.parametrize("change", ["edited", "deleted"])
+def test_a_change_at_the_cursor_forces_a_full_read(change):
+    rows = [response(1), response(2)]
+    previous = cursor_after(rows)
+    if change == "edited":
+        rows[-1] = response(9)
+    else:
+        rows.pop()
+    sheet = FakeSheet(rows)
+
+    df, cursor = read(sheet, previous)
+
+    assert sheet.calls == ["batchGet", "get"]
+    assert len(df) == len(rows)
+    assert cursor == SheetCursor(len(rows), row_hash(rows[-1]), NOW)
+
+
+def test_a_stale_full_sync_forces_a_full_read():
+    rows = [response(1), response(2)]
+    sheet = FakeSheet(rows)
+
+    _, cursor = read(sheet, cursor_after(rows, synced_hours_ago=24))
+
+    assert sheet.calls == ["get"]
+    assert cursor.last_full_sync_at == NOW
@@ -0,0 +1,93 @@
+"""Which form responses the content fingerprint lets through to the database,
+and the timestamps they carry there."""
+
+import pandas as pd
+
+import config
+from fetch_google_forms_data import (
+    NOTHING_INGESTED, changed_responses, content_fingerprint, invalidate_resolution_attempts,
+    response_hashes, sheet_timestamps_to_utc,
+)
+
+
+def responses(*names):
+    return pd.DataFrame({
+        "summ_id": list(names),
+        "player_tag": ["EUW"] * len(names),
+        "region": ["EUW"] * len(names),
+        "registered_at": pd.to_datetime(["2026-08-01 10:00"] * len(names)),
+    })
+
+
+def ingest(df, previous=NOTHING_INGESTED, full_read=True):
+    changed, content = changed_responses(df, previous, full_read)
+    return list(changed["summ_id"]) if not changed.empty else [], content
+
+
+def test_everything_is_new_the_first_time():
+    names, content = ingest(responses("a", "b"))
+    assert names == ["a", "b"]
+    assert content.fingerprint == content_fingerprint(content.row_hashes)
+
+
+def test_an_unchanged_sheet_sends_nothing():
+    _, content = ingest(responses("a", "b"))
+    names, after = ingest(responses("b", "a"), content)
+    assert names == []
+    assert after == content
+
+
+def test_only_new_or_edited_responses_are_sent():
+    _, content = ingest(responses("a", "b"))
+    edited = responses("a", "b", "c")
+    edited.loc[1, "region"] = "EUNE"
+
+    names, _ = ingest(edited, content)
+
+    assert names == ["b", "c"]
+
+
+def test_a_full_read_forgets_deleted_responses():
+    _, content = ingest(responses("a", "b"))
+    _, after = ingest(responses("a"), content)
+    assert after.row_hashes == frozenset(response_hashes(responses("a")))
+
+
+def test_rows_past_the_cursor_add_to_what_was_ingested():
+    _, content = ingest(responses("a"))
+    names, after = ingest(responses("b"), content, full_read=False)
+    assert names == ["b"]
+    assert after.row_hashes == frozenset(response_hashes(responses("a", "b")))
+
+
+def test_missing_fields_hash_consistently():
+    df = responses("a")
+    df.loc[0, "registered_at"] = pd.NaT
+    df.loc[0, "region"] = None
+    assert list(response_hashes(df)) == list(response_hashes(df.copy()))
+
+
+def test_sheet_timestamps_are_stored_as_utc(monkeypatch):
+    monkeypatch.setattr(config, "SHEET_TIMEZONE", "Europe/London")
+    parsed = sheet_timestamps_to_utc(pd.Series(["8/9/2026 10:00:00", "1/9/2026 10:00:00", "nonsense"]))
+    assert list(parsed[:2]) == [pd.Timestamp("2026-08-09 09:00"), pd.Timestamp("2026-01-09 10:00")]
+    assert parsed.dt.tz is None
+    assert pd.isna(parsed[2])
+
+
+def test_attempts_are_invalidated_by_a_newer_response_for_the_same_riot_id():
+    statements = []
+
+    class Connection:
+        def execute(self, statement, params=None):
+            statements.append(str(statement))
+
+    invalidate_resolution_attempts(Connection())
+
+    (sql,) = statements
+    assert "DELETE FROM public.puuid_resolution_attempts a" in sql
+    assert "lower(p.summ_id) = lower(sheet.summ_id)" in sql
+    assert "lower(p.player_tag) = lower(sheet.player_tag)" in sql
+    # Naive UTC on both sides: no AT TIME ZONE, no timestamptz.
+    assert "a.last_attempt_at < sheet.registered_at" in sql
+    assert "TIME ZONE" not in sql
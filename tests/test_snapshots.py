@@ -0,0 +1,173 @@
+"""Snapshot writes (atomic, compact, skipped when nothing changed) and the
+daily archives finished days are compacted into."""
+
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+import config
+import metrics
+import snapshots
+from snapshots import content_hash, write_snapshot
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "SNAPSHOT_PRETTY", False)
+    monkeypatch.setattr(config, "METRICS_DIR", tmp_path / "metrics")
+    monkeypatch.setattr(metrics, "_metrics", metrics.Metrics("test-run"))
+
+
+def counter(name):
+    return sum(c["value"] for c in metrics.get_metrics().to_dict()["counters"] if c["name"] == name)
+
+
+def paths(tmp_path, hour):
+    folder = tmp_path / "solo"
+    (folder / "2026-08-09").mkdir(parents=True, exist_ok=True)
+    return str(folder / "2026-08-09" / f"winrate_solo_{hour}.json"), str(folder / "latest.json")
+
+
+def report(timestamp, wins=10):
+    return {"message": "table", "timestamp": timestamp, "changes": [{"wins": wins}]}
+
+
+def test_a_new_report_is_written_compactly_to_both_files(tmp_path):
+    daily, latest = paths(tmp_path, "12")
+
+    assert write_snapshot(daily, latest, report("2026-08-09_12-00-00"))
+
+    text = open(latest, encoding="utf-8").read()
+    assert "\n" not in text and ", " not in text
+    assert open(daily, encoding="utf-8").read() == text
+    assert json.loads(text)["content_hash"] == content_hash(report("x"))
+
+
+def test_an_unchanged_report_only_refreshes_latest(tmp_path):
+    write_snapshot(*paths(tmp_path, "12"), report("2026-08-09_12-00-00"))
+    daily, latest = paths(tmp_path, "13")
+
+    assert not write_snapshot(daily, latest, report("2026-08-09_13-00-00"))
+
+    assert not (tmp_path / "solo" / "2026-08-09" / "winrate_solo_13.json").exists()
+    assert json.load(open(latest, encoding="utf-8"))["timestamp"] == "2026-08-09_13-00-00"
+    assert counter("snapshots_unchanged") == 1
+
+
+def test_a_changed_report_is_written_again(tmp_path):
+    write_snapshot(*paths(tmp_path, "12"), report("2026-08-09_12-00-00"))
+    daily, latest = paths(tmp_path, "13")
+
+    assert write_snapshot(daily, latest, report("2026-08-09_13-00-00", wins=11))
+
+    assert json.load(open(daily, encoding="utf-8"))["changes"] == [{"wins": 11}]
+
+
+def test_no_temporary_file_is_left_behind(tmp_path):
+    write_snapshot(*paths(tmp_path, "12"), report("2026-08-09_12-00-00"))
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_a_corrupt_latest_is_simply_replaced(tmp_path):
+    daily, latest = paths(tmp_path, "12")
+    open(latest, "w").write("{half a fi")
+
+    assert write_snapshot(daily, latest, report("2026-08-09_12-00-00"))
+    assert json.load(open(latest, encoding="utf-8"))["message"] == "table"
+
+
+def write_day(folder, day, hours):
+    day_dir = folder / day
+    day_dir.mkdir(parents=True, exist_ok=True)
+    for hour in hours:
+        name = f"winrate_solo_{day}_{hour:02d}-00-00"
+        (day_dir / f"{name}.json").write_text(json.dumps(report(name, wins=hour), indent=2))
+
+
+def test_finished_days_are_compacted_and_still_load(tmp_path):
+    folder = tmp_path / "winrate" / "solo"
+    write_day(folder, "2026-08-08", range(24))
+    write_day(folder, "2026-08-09", [0, 1])
+
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 24
+
+    assert sorted(p.name for p in folder.iterdir()) == [
+        "2026-08-08.index.json", "2026-08-08.jsonl.gz", "2026-08-09",
+    ]
+    for hour in (0, 13, 23):
+        name = f"winrate_solo_2026-08-08_{hour:02d}-00-00"
+        assert snapshots.load_snapshot("winrate/solo", name, tmp_path) == report(name, wins=hour)
+
+
+def test_the_archive_is_json_lines(tmp_path):
+    folder = tmp_path / "elo_changes"
+    write_day(folder, "2026-08-08", [1, 2])
+    snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9))
+
+    lines = gzip.decompress((folder / "2026-08-08.jsonl.gz").read_bytes()).decode().splitlines()
+    assert [json.loads(line)["changes"] for line in lines] == [[{"wins": 1}], [{"wins": 2}]]
+
+
+def test_todays_and_unknown_snapshots(tmp_path):
+    folder = tmp_path / "winrate" / "solo"
+    write_day(folder, "2026-08-09", [5])
+    snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9))
+
+    name = "winrate_solo_2026-08-09_05-00-00"
+    assert snapshots.load_snapshot("winrate/solo", name, tmp_path) == report(name, wins=5)
+    assert snapshots.load_snapshot("winrate/solo", "winrate_solo_2026-08-01_05-00-00", tmp_path) is None
+
+
+def test_an_unreadable_snapshot_keeps_its_day_directory(tmp_path):
+    folder = tmp_path / "winrate" / "solo"
+    write_day(folder, "2026-08-08", [1])
+    (folder / "2026-08-08" / "winrate_solo_2026-08-08_02-00-00.json").write_text("{torn")
+
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 1
+    assert [p.name for p in (folder / "2026-08-08").iterdir()] == [
+        "winrate_solo_2026-08-08_02-00-00.json",
+    ]
+    size = (folder / "2026-08-08.jsonl.gz").stat().st_size
+
+    # The readable file is not archived again on later runs.
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 0
+    assert (folder / "2026-08-08.jsonl.gz").stat().st_size == size
+
+
+def test_an_empty_day_is_removed_without_an_archive(tmp_path):
+    folder = tmp_path / "winrate" / "solo"
+    (folder / "2026-08-08").mkdir(parents=True)
+
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 0
+    assert list(folder.iterdir()) == []
+
+
+def test_recompacting_a_day_keeps_what_was_already_archived(tmp_path):
+    folder = tmp_path / "winrate" / "solo"
+    write_day(folder, "2026-08-08", [1, 2])
+    snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9))
+    # A late write for the same day, e.g. a run that straddled midnight.
+    write_day(folder, "2026-08-08", [3])
+
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 1
+
+    assert not (folder / "2026-08-08").exists()
+    for hour in (1, 2, 3):
+        name = f"winrate_solo_2026-08-08_{hour:02d}-00-00"
+        assert snapshots.load_snapshot("winrate/solo", name, tmp_path) == report(name, wins=hour)
+
+
+def test_per_run_metrics_are_compacted_too(tmp_path):
+    day_dir = tmp_path / "metrics" / "2026-08-08"
+    day_dir.mkdir(parents=True)
+    for run_id in ("a", "b"):
+        (day_dir / f"metrics_{run_id}.json").write_text(json.dumps({"run_id": run_id}))
+    (tmp_path / "metrics" / "latest.json").write_text(json.dumps({"run_id": "b"}))
+
+    assert snapshots.compact_snapshots(tmp_path, today=date(2026, 8, 9)) == 2
+
+    assert sorted(p.name for p in (tmp_path / "metrics").iterdir()) == [
+        "2026-08-08.index.json", "2026-08-08.jsonl.gz", "latest.json",
+    ]
@@ -0,0 +1,91 @@
+"""The current_standings query layer. No Postgres here, so most of these pin its
+shape; the last ones run 007's trigger statements and the query in SQLite."""
+
+import re
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from standings import latest_scans_sql
+
+MIGRATION = Path(__file__).resolve().parents[1] / "sql" / "migrations" / "007_current_standings.sql"
+
+
+def test_reads_the_standings_table_not_history():
+    sql = latest_scans_sql(2)
+    assert "public.current_standings" in sql
+    assert "elo_history" not in sql
+
+
+def test_depth_one_is_only_the_latest_row():
+    sql = latest_scans_sql(1)
+    assert "prev_" not in sql
+    assert "UNION ALL" not in sql
+    assert "1 AS scan_number" in sql
+
+
+def test_depth_two_adds_the_previous_row_where_there_is_one():
+    sql = latest_scans_sql(2)
+    assert "cs.prev_tier AS tier" in sql
+    assert "2 AS scan_number" in sql
+    assert "WHERE cs.prev_timestamp IS NOT NULL" in sql
+
+
+@pytest.mark.parametrize("depth", [0, 3])
+def test_only_two_rows_are_kept(depth):
+    with pytest.raises(ValueError):
+        latest_scans_sql(depth)
+
+
+@pytest.fixture
+def standings_db():
+    """SQLite with 007's current_standings table, and a function applying its
+    trigger's statements to one elo_history row."""
+    migration = MIGRATION.read_text(encoding="utf-8")
+    table = migration.split("CREATE TABLE IF NOT EXISTS public.current_standings")[1]
+    table = table.split(");")[0].replace("REFERENCES public.players (id) ON DELETE CASCADE", "")
+    trigger = migration.split("FUNCTION public.track_current_standing()")[1]
+    trigger = trigger.split("BEGIN\n", 1)[1].split("RETURN NULL;")[0]
+    statements = [s for s in re.sub(r"\bNEW\.(\w+)", r":\1", trigger).split(";") if s.strip()]
+
+    db = sqlite3.connect(":memory:")
+    db.execute("ATTACH ':memory:' AS public")
+    db.execute("CREATE TABLE public.players (id INTEGER PRIMARY KEY, summ_id TEXT)")
+    db.execute(f"CREATE TABLE public.current_standings {table})")
+    db.executemany("INSERT INTO public.players VALUES (?, ?)", [(1, "one"), (2, "two")])
+
+    def insert_history(player_key, timestamp, league_points):
+        row = {
+            "player_key": player_key, "queue_type": "RANKED_SOLO_5x5", "tier": "GOLD",
+            "rank": "I", "league_points": league_points, "wins": 1, "losses": 1,
+            "timestamp": timestamp,
+        }
+        for statement in statements:
+            db.execute(statement, row)
+
+    yield db, insert_history
+    db.close()
+
+
+def scans(db, depth):
+    rows = db.execute(latest_scans_sql(depth)).fetchall()
+    return sorted((row[1], row[-1], row[5], row[-2]) for row in rows)
+
+
+def test_the_latest_row_per_player_is_selected(standings_db):
+    db, insert_history = standings_db
+    # Out of order, as a late backfill would arrive.
+    for timestamp, points in [("10:00", 10), ("12:00", 30), ("11:00", 20), ("09:00", 5)]:
+        insert_history(1, f"2026-08-09 {timestamp}", points)
+    insert_history(2, "2026-08-09 08:00", 50)
+
+    assert scans(db, 1) == [
+        ("one", 1, 30, "2026-08-09 12:00"),
+        ("two", 1, 50, "2026-08-09 08:00"),
+    ]
+    assert scans(db, 2) == [
+        ("one", 1, 30, "2026-08-09 12:00"),
+        ("one", 2, 20, "2026-08-09 11:00"),
+        ("two", 1, 50, "2026-08-09 08:00"),
+    ]